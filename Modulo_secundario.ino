@@ -15,6 +15,12 @@ const byte address[6] = "1Node";
 
 bool antennaConnected = false;
 bool htuConnected = false;
+uint16_t secuencia = 0;
+// Distinto en cada arranque: `secuencia` vuelve a 0 al reiniciar y el receptor lo sabe por aqui.
+uint8_t arranque = 0;
+
+// Version 2 del paquete: el receptor detecta huecos y duplicados con `secuencia`.
+#define VERSION_PAQUETE 2
 
 #pragma pack(1)
 struct DataPacket {
@@ -22,12 +28,17 @@ struct DataPacket {
     float temperatura;
     float humedad;
     bool antenaEstado;
+    uint16_t secuencia;
+    uint8_t version;
+    uint8_t arranque;
 };
 #pragma pack()
 
 void setup() {
     Serial.begin(115200);
     SPI.begin(18, 19, 23);
+    // 0 queda para el firmware que no envia este byte.
+    arranque = 1 + esp_random() % 255;
 
     htuConnected = htu.begin();
     if (!htuConnected) {
@@ -65,6 +76,9 @@ void loop() {
     data.temperatura = temperature;
     data.humedad = humidity;
     data.antenaEstado = antennaConnected;
+    data.secuencia = secuencia++;
+    data.version = VERSION_PAQUETE;
+    data.arranque = arranque;
 
     if (antennaConnected) {
         bool sent = radio.write(&data, sizeof(data));
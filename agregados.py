@@ -0,0 +1,213 @@
+import argparse
+import datetime
+import sqlite3
+import time
+
+import retencion
+
+# minutos por cubeta -> tabla. Las consultas eligen el nivel mas grueso que divide el intervalo.
+NIVELES = {
+    15: "agregados_15min",
+    60: "agregados_hora",
+    1440: "agregados_dia",
+}
+
+# Inicio de la cubeta a partir de marca_tiempo ("YYYY-MM-DD HH:MM:SS"), en SQL y en Python.
+EXPRESIONES_CUBETA = {
+    15: "strftime('%Y-%m-%d %H:', marca_tiempo) || printf('%02d', CAST(strftime('%M', marca_tiempo) AS INTEGER) / 15 * 15) || ':00'",
+    60: "strftime('%Y-%m-%d %H:00:00', marca_tiempo)",
+    1440: "date(marca_tiempo) || ' 00:00:00'",
+}
+
+
+def cubeta_15min(marca):
+    return f"{marca[:14]}{int(marca[14:16]) // 15 * 15:02d}:00"
+
+
+def cubeta_hora(marca):
+    return marca[:13] + ":00:00"
+
+
+def cubeta_dia(marca):
+    return marca[:10] + " 00:00:00"
+
+
+CUBETAS = {15: cubeta_15min, 60: cubeta_hora, 1440: cubeta_dia}
+
+SQL_ACUMULAR = """
+    INSERT INTO {tabla} (nodo, cubeta, muestras,
+                         temperatura_suma, temperatura_min, temperatura_max, temperatura_ultima,
+                         humedad_suma, humedad_min, humedad_max, humedad_ultima, ultima_marca)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(nodo, cubeta) DO UPDATE SET
+    muestras = muestras + excluded.muestras,
+    temperatura_suma = temperatura_suma + excluded.temperatura_suma,
+    temperatura_min = MIN(temperatura_min, excluded.temperatura_min),
+    temperatura_max = MAX(temperatura_max, excluded.temperatura_max),
+    temperatura_ultima = CASE WHEN excluded.ultima_marca >= ultima_marca
+                              THEN excluded.temperatura_ultima ELSE temperatura_ultima END,
+    humedad_suma = humedad_suma + excluded.humedad_suma,
+    humedad_min = MIN(humedad_min, excluded.humedad_min),
+    humedad_max = MAX(humedad_max, excluded.humedad_max),
+    humedad_ultima = CASE WHEN excluded.ultima_marca >= ultima_marca
+                          THEN excluded.humedad_ultima ELSE humedad_ultima END,
+    ultima_marca = MAX(ultima_marca, excluded.ultima_marca)
+"""
+
+# Lee la vista sensores, que durante una migracion tambien cubre la tabla antigua.
+# La ultima lectura de cada cubeta sale de ROW_NUMBER en lugar de unir la vista consigo misma.
+SQL_RECONSTRUIR = """
+    WITH fuente AS (
+        SELECT nodo, {cubeta} AS cubeta, marca_tiempo, temperatura, humedad,
+               ROW_NUMBER() OVER (PARTITION BY nodo, {cubeta} ORDER BY marca_tiempo DESC) AS orden
+        FROM sensores
+        WHERE marca_tiempo >= :desde AND arrastrado = 0
+    )
+    INSERT OR REPLACE INTO {tabla}
+    SELECT nodo, cubeta, COUNT(*),
+           SUM(temperatura), MIN(temperatura), MAX(temperatura), MAX(CASE WHEN orden = 1 THEN temperatura END),
+           SUM(humedad), MIN(humedad), MAX(humedad), MAX(CASE WHEN orden = 1 THEN humedad END),
+           MAX(marca_tiempo)
+    FROM fuente
+    GROUP BY nodo, cubeta
+"""
+
+# La misma cuenta para una sola cubeta de un nodo.
+SQL_RECALCULAR = """
+    INSERT INTO {tabla}
+    SELECT nodo, :cubeta, COUNT(*),
+           SUM(temperatura), MIN(temperatura), MAX(temperatura), MAX(CASE WHEN orden = 1 THEN temperatura END),
+           SUM(humedad), MIN(humedad), MAX(humedad), MAX(CASE WHEN orden = 1 THEN humedad END),
+           MAX(marca_tiempo)
+    FROM (SELECT nodo, marca_tiempo, temperatura, humedad,
+                 ROW_NUMBER() OVER (ORDER BY marca_tiempo DESC) AS orden
+          FROM sensores
+          WHERE nodo = :nodo AND marca_tiempo >= :cubeta AND marca_tiempo < :fin AND arrastrado = 0)
+    GROUP BY nodo
+"""
+
+
+def crear_tablas(conn):
+    existentes = {fila[0] for fila in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    nuevas = False
+    for tabla in NIVELES.values():
+        if tabla not in existentes:
+            nuevas = True
+        conn.execute(f'''CREATE TABLE IF NOT EXISTS {tabla} (
+                            nodo INTEGER,
+                            cubeta TEXT,
+                            muestras INTEGER,
+                            temperatura_suma REAL,
+                            temperatura_min REAL,
+                            temperatura_max REAL,
+                            temperatura_ultima REAL,
+                            humedad_suma REAL,
+                            humedad_min REAL,
+                            humedad_max REAL,
+                            humedad_ultima REAL,
+                            ultima_marca TEXT,
+                            PRIMARY KEY (nodo, cubeta)) WITHOUT ROWID''')
+    return nuevas
+
+
+def _sumar(grupos, nuevo):
+    # nuevo y los valores de grupos van en el orden de SQL_ACUMULAR: [nodo, cubeta, muestras,
+    # t_suma, t_min, t_max, t_ultima, h_suma, h_min, h_max, h_ultima, marca].
+    clave = (nuevo[0], nuevo[1])
+    actual = grupos.get(clave)
+    if actual is None:
+        grupos[clave] = nuevo
+        return
+    actual[2] += nuevo[2]
+    actual[3] += nuevo[3]
+    actual[4] = min(actual[4], nuevo[4])
+    actual[5] = max(actual[5], nuevo[5])
+    actual[7] += nuevo[7]
+    actual[8] = min(actual[8], nuevo[8])
+    actual[9] = max(actual[9], nuevo[9])
+    if nuevo[11] >= actual[11]:
+        actual[6], actual[10], actual[11] = nuevo[6], nuevo[10], nuevo[11]
+
+
+def acumular(conn, filas, excluir=()):
+    # filas: (marca_tiempo, nodo, temperatura, humedad, ...), lecturas reales que no estaban en sensores.
+    # Se suman por cubeta en Python y cada nivel sale del anterior, asi que se hace un upsert por cubeta.
+    # excluir: (nodo, minutos, cubeta) que se recalculan aparte y no deben sumarse.
+    grupos = {}
+    cubetas = {}
+    for marca, nodo, temperatura, humedad, *_ in filas:
+        cubeta = cubetas.get(marca)
+        if cubeta is None:
+            cubeta = cubetas[marca] = cubeta_15min(marca)
+        _sumar(grupos, [nodo, cubeta, 1, temperatura, temperatura, temperatura, temperatura,
+                        humedad, humedad, humedad, humedad, marca])
+    for minutos, tabla in NIVELES.items():
+        if minutos != 15:
+            anteriores, grupos = grupos, {}
+            cubeta = CUBETAS[minutos]
+            for valores in anteriores.values():
+                _sumar(grupos, [valores[0], cubeta(valores[1]), *valores[2:]])
+        filas_nivel = grupos.values()
+        if excluir:
+            filas_nivel = [valores for valores in filas_nivel if (valores[0], minutos, valores[1]) not in excluir]
+        conn.executemany(SQL_ACUMULAR.format(tabla=tabla), filas_nivel)
+
+
+def afectadas(claves):
+    # claves: (nodo, marca_tiempo) -> {(nodo, minutos, cubeta)} en todos los niveles.
+    return {(nodo, minutos, cubeta(marca)) for nodo, marca in claves for minutos, cubeta in CUBETAS.items()}
+
+
+def recalcular(conn, cubetas):
+    # Para lecturas reescritas: la suma incremental no sabe restar el valor anterior, asi que
+    # cada cubeta afectada se vuelve a calcular desde sensores.
+    for nodo, minutos, cubeta in cubetas:
+        tabla = NIVELES[minutos]
+        fin = (datetime.datetime.fromisoformat(cubeta) + datetime.timedelta(minutes=minutos)).isoformat(" ")
+        conn.execute(f"DELETE FROM {tabla} WHERE nodo = ? AND cubeta = ?", (nodo, cubeta))
+        conn.execute(SQL_RECALCULAR.format(tabla=tabla), {"nodo": nodo, "cubeta": cubeta, "fin": fin})
+
+
+def reconstruir(conn, desde=None):
+    if desde and len(desde) == 10:
+        desde += " 00:00:00"
+    corte = retencion.frontera(conn)
+    if corte is not None and (not desde or desde < retencion.marca_de(corte)):
+        # Lo anterior a la frontera ya no esta en lecturas: sus agregados se conservan.
+        desde = retencion.marca_de(corte)
+    with conn:
+        for minutos, tabla in NIVELES.items():
+            # Se recalcula desde el inicio de la cubeta que contiene `desde`.
+            desde_nivel = CUBETAS[minutos](desde) if desde else ""
+            conn.execute(f"DELETE FROM {tabla} WHERE cubeta >= ?", (desde_nivel,))
+            conn.execute(SQL_RECONSTRUIR.format(tabla=tabla, cubeta=EXPRESIONES_CUBETA[minutos]),
+                         {"desde": desde_nivel})
+
+
+def nivel_para(bucket_minutos):
+    elegido = None
+    for minutos in sorted(NIVELES):
+        if minutos <= bucket_minutos and bucket_minutos % minutos == 0:
+            elegido = minutos
+    return elegido
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reconstruye las tablas de agregados a partir de sensores.")
+    parser.add_argument("--db", default="datos_sensores.db")
+    parser.add_argument("--desde", help="fecha o marca 'YYYY-MM-DD HH:MM:SS' desde la que recalcular (por defecto, todo)")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    inicio = time.perf_counter()
+    crear_tablas(conn)
+    reconstruir(conn, args.desde)
+    for tabla in NIVELES.values():
+        total = conn.execute(f"SELECT COUNT(*) FROM {tabla}").fetchone()[0]
+        print(f"{tabla}: {total} filas")
+    print(f"Agregados reconstruidos en {time.perf_counter() - inicio:.1f} s")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
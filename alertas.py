@@ -0,0 +1,194 @@
+import json
+import math
+import os
+from collections import namedtuple
+
+from nodos import RUTA_CONFIG
+
+# Metricas que pueden vigilar las reglas. punto_rocio (C) y vpd (deficit de presion de vapor,
+# kPa) se derivan de temperatura y humedad, solo para los nodos que tienen reglas sobre ellas.
+METRICAS = ("temperatura", "humedad", "punto_rocio", "vpd")
+INDICE_METRICA = {metrica: i for i, metrica in enumerate(METRICAS)}
+
+INICIO = "inicio"
+FIN = "fin"
+
+Evento = namedtuple("Evento", ["recibida", "nodo", "regla", "metrica", "estado", "valor", "mensaje"])
+
+# Sin configuracion se vigilan los mismos rangos ideales que colorea el mapa en tiempo real.
+REGLAS_POR_DEFECTO = [
+    {"nombre": "temperatura", "metrica": "temperatura", "minimo": 18, "maximo": 25, "histeresis": 0.5, "duracion": 60},
+    {"nombre": "humedad", "metrica": "humedad", "minimo": 40, "maximo": 70, "histeresis": 2, "duracion": 60},
+    {"nombre": "vpd", "metrica": "vpd", "minimo": 0.4, "maximo": 1.6, "histeresis": 0.05, "duracion": 300},
+    {"nombre": "cambio_temperatura", "metrica": "temperatura", "limite": 1.0, "ventana": 300, "histeresis": 0.2},
+]
+
+
+def punto_rocio(temperatura, humedad):
+    # Magnus-Tetens (Sonntag 1990), valido de -45 a 60 C.
+    gamma = math.log(max(humedad, 0.01) / 100) + 17.62 * temperatura / (243.12 + temperatura)
+    return 243.12 * gamma / (17.62 - gamma)
+
+
+def vpd(temperatura, humedad):
+    saturacion = 0.6108 * math.exp(17.27 * temperatura / (temperatura + 237.3))
+    return saturacion * (1 - humedad / 100)
+
+
+class ReglaRango:
+    # Fuera de [minimo, maximo] durante `duracion` segundos seguidos activa la alerta; se resuelve
+    # al volver al rango con `histeresis` de margen, para no oscilar en el borde.
+    def __init__(self, nombre, metrica, minimo=None, maximo=None, histeresis=0.0, duracion=0.0):
+        self.nombre = nombre
+        self.metrica = metrica
+        self.indice = INDICE_METRICA[metrica]
+        self.minimo = -math.inf if minimo is None else minimo
+        self.maximo = math.inf if maximo is None else maximo
+        self.histeresis = histeresis
+        self.duracion = duracion
+
+    def nuevo_estado(self):
+        # [activa, fuera desde]
+        return [False, None]
+
+    def evaluar(self, estado, valor, t):
+        if estado[0]:
+            if self.minimo + self.histeresis <= valor <= self.maximo - self.histeresis:
+                estado[0] = False
+                estado[1] = None
+                return FIN
+            return None
+        if self.minimo <= valor <= self.maximo:
+            estado[1] = None
+            return None
+        if estado[1] is None:
+            estado[1] = t
+        if t - estado[1] >= self.duracion:
+            estado[0] = True
+            return INICIO
+        return None
+
+    def describir(self, valor):
+        lado = "alta" if valor > self.maximo else "baja" if valor < self.minimo else "en rango"
+        return f"{self.metrica} {lado}: {valor:.2f} (rango {self.minimo:g} a {self.maximo:g})"
+
+
+class ReglaTasa:
+    # Tasa de cambio en unidades por minuto, suavizada con una media exponencial de constante
+    # `ventana` segundos: solo guarda la muestra anterior y la tasa acumulada.
+    def __init__(self, nombre, metrica, limite, ventana=300.0, histeresis=0.0):
+        self.nombre = nombre
+        self.metrica = metrica
+        self.indice = INDICE_METRICA[metrica]
+        self.limite = limite
+        self.ventana = ventana
+        self.histeresis = histeresis
+
+    def nuevo_estado(self):
+        # [activa, t anterior, valor anterior, tasa]
+        return [False, None, None, 0.0]
+
+    def evaluar(self, estado, valor, t):
+        anterior = estado[1]
+        dt = 0.0 if anterior is None else t - anterior
+        if dt <= 0:
+            if anterior is None:
+                estado[1] = t
+                estado[2] = valor
+            return None
+        tasa = estado[3] + ((valor - estado[2]) * 60 / dt - estado[3]) * dt / (self.ventana + dt)
+        estado[1] = t
+        estado[2] = valor
+        estado[3] = tasa
+        if estado[0]:
+            if abs(tasa) <= self.limite - self.histeresis:
+                estado[0] = False
+                return FIN
+        elif abs(tasa) > self.limite:
+            estado[0] = True
+            return INICIO
+        return None
+
+    def describir(self, valor):
+        return f"{self.metrica} cambia mas de {self.limite:g} por minuto (ultimo valor {valor:.2f})"
+
+
+def crear_regla(definicion):
+    definicion = dict(definicion)
+    if "limite" in definicion:
+        return ReglaTasa(**definicion)
+    return ReglaRango(**definicion)
+
+
+class ReglasAlertas:
+    # Reglas por defecto mas las de cada nodo en nodos.json; una regla de nodo reemplaza a la
+    # de mismo nombre. {"alertas": [...], "nodos": [{"id": 1, "alertas": [...]}, ...]}
+    def __init__(self, por_defecto=REGLAS_POR_DEFECTO, por_nodo=None):
+        self.por_defecto = [crear_regla(definicion) for definicion in por_defecto]
+        self.por_nodo = {}
+        for nodo, definiciones in (por_nodo or {}).items():
+            propias = {regla.nombre: regla for regla in map(crear_regla, definiciones)}
+            self.por_nodo[nodo] = [propias.pop(regla.nombre, regla) for regla in self.por_defecto] + list(propias.values())
+
+    def para_nodo(self, nodo):
+        return self.por_nodo.get(nodo, self.por_defecto)
+
+    def rango(self, nodo, nombre):
+        # (minimo, maximo) de la regla de rango `nombre`, para colorear el mapa.
+        for regla in self.para_nodo(nodo):
+            if regla.nombre == nombre and isinstance(regla, ReglaRango):
+                return regla.minimo, regla.maximo
+        return -math.inf, math.inf
+
+
+def cargar_reglas(ruta_config=RUTA_CONFIG):
+    if not os.path.exists(ruta_config):
+        return ReglasAlertas()
+    with open(ruta_config, encoding="utf-8") as f:
+        config = json.load(f)
+    por_nodo = {int(n["id"]): n["alertas"] for n in config.get("nodos", []) if isinstance(n, dict) and "alertas" in n}
+    return ReglasAlertas(config.get("alertas", REGLAS_POR_DEFECTO), por_nodo)
+
+
+class MotorAlertas:
+    # Evalua cada trama nada mas recibirla. El estado de cada (nodo, regla) es una lista corta
+    # y cada regla solo mira la muestra actual y su propio estado: O(1) por trama.
+    def __init__(self, reglas=None):
+        self.reglas = reglas or ReglasAlertas()
+        self.nodos = {}
+        self.evaluadas = 0
+        self.generados = 0
+
+    def _preparar(self, nodo):
+        reglas = self.reglas.para_nodo(nodo)
+        derivadas = any(regla.indice >= 2 for regla in reglas)
+        preparado = (derivadas, [(regla, regla.nuevo_estado()) for regla in reglas])
+        self.nodos[nodo] = preparado
+        return preparado
+
+    def restaurar(self, activas):
+        # activas: (nodo, regla) que seguian abiertas en la BD al parar; asi su FIN se registra.
+        for nodo, nombre in activas:
+            for regla, estado in (self.nodos.get(nodo) or self._preparar(nodo))[1]:
+                if regla.nombre == nombre:
+                    estado[0] = True
+
+    def evaluar(self, nodo, temperatura, humedad, t):
+        self.evaluadas += 1
+        derivadas, reglas = self.nodos.get(nodo) or self._preparar(nodo)
+        if derivadas:
+            valores = (temperatura, humedad, punto_rocio(temperatura, humedad), vpd(temperatura, humedad))
+        else:
+            valores = (temperatura, humedad)
+        eventos = None
+        for regla, estado in reglas:
+            valor = valores[regla.indice]
+            cambio = regla.evaluar(estado, valor, t)
+            if cambio is not None:
+                if eventos is None:
+                    eventos = []
+                eventos.append(Evento(t, nodo, regla.nombre, regla.metrica, cambio, valor, regla.describir(valor)))
+        if eventos is None:
+            return ()
+        self.generados += len(eventos)
+        return eventos
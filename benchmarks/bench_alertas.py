@@ -0,0 +1,94 @@
+import argparse
+import contextlib
+import io
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from alertas import MotorAlertas
+from escritor_bd import EscritorSensores
+from recepcion import Acumulador
+from tramas import Trama
+
+MINIMO_TRAMAS_S = 10000
+
+
+def tramas_simuladas(nodos, cantidad, semilla=1):
+    # Paseo aleatorio por nodo, una trama por nodo y segundo; de vez en cuando un nodo sale
+    # de rango un rato para que haya alertas que abrir y cerrar.
+    rng = random.Random(semilla)
+    estado = {nodo: [21.0, 55.0] for nodo in range(1, nodos + 1)}
+    t = time.time() - cantidad // nodos
+    tramas = []
+    secuencia = 0
+    while len(tramas) < cantidad:
+        for nodo, valores in estado.items():
+            valores[0] += rng.gauss(0, 0.05) + (21.5 - valores[0]) * 0.002
+            valores[1] += rng.gauss(0, 0.2) + (55 - valores[1]) * 0.002
+            if rng.random() < 0.0005:
+                valores[0] += rng.choice((-6, 6))
+            tramas.append((Trama(nodo, valores[0], valores[1], True, secuencia), t))
+        secuencia = (secuencia + 1) % 65536
+        t += 1
+    return tramas[:cantidad]
+
+
+def medir_motor(tramas):
+    motor = MotorAlertas()
+    inicio = time.perf_counter()
+    for trama, recibida in tramas:
+        motor.evaluar(trama.nodo, trama.temperatura, trama.humedad, recibida)
+    return time.perf_counter() - inicio, motor
+
+
+def medir_ingesta(tramas, alertas):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        escritor = EscritorSensores(db_file)
+        acumulador = Acumulador(escritor, verboso=False, alertas=MotorAlertas() if alertas else None)
+        inicio = time.perf_counter()
+        # Los avisos de alerta se imprimen siempre; aqui solo estorban.
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i, (trama, recibida) in enumerate(tramas):
+                acumulador.al_recibir(trama, recibida)
+                if i % 1000 == 0:
+                    escritor.revisar()
+        escritor.cerrar()
+        duracion = time.perf_counter() - inicio
+        conn = sqlite3.connect(db_file)
+        eventos = conn.execute("SELECT COUNT(*) FROM eventos").fetchone()[0]
+        activas = conn.execute("SELECT COUNT(*) FROM alertas_activas").fetchone()[0]
+        conn.close()
+    return duracion, eventos, activas
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste del motor de alertas por trama recibida.")
+    parser.add_argument("--nodos", type=int, default=200)
+    parser.add_argument("--tramas", type=int, default=1000000)
+    parser.add_argument("--ingesta", type=int, default=200000, help="tramas para la medida con escritor")
+    args = parser.parse_args()
+
+    tramas = tramas_simuladas(args.nodos, args.tramas)
+    duracion, motor = medir_motor(tramas)
+    por_segundo = len(tramas) / duracion
+    print(f"{args.nodos} nodos, {len(tramas)} tramas: motor {por_segundo:.0f} tramas/s "
+          f"({duracion / len(tramas) * 1e6:.2f} us por trama), {motor.generados} eventos")
+
+    muestra = tramas[:args.ingesta]
+    sin_alertas, _, _ = medir_ingesta(muestra, False)
+    con_alertas, eventos, activas = medir_ingesta(muestra, True)
+    print(f"Acumulador + escritor, {len(muestra)} tramas: sin alertas {len(muestra) / sin_alertas:.0f} tramas/s, "
+          f"con alertas {len(muestra) / con_alertas:.0f} tramas/s ({eventos} eventos, {activas} abiertas al final)")
+
+    if por_segundo < MINIMO_TRAMAS_S:
+        print(f"FALLO: el motor no llega a {MINIMO_TRAMAS_S} tramas/s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+RUTA_BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PESADOS = ("matplotlib", "numpy", "PIL")
+ICONOS = ("tiempo_real.png", "grafica.jfif", "grafica_2.jfif", "guardar.png", "salida.jpg")
+
+# Cada medida en un interprete nuevo: la cache de modulos del proceso falsearia los tiempos.
+IMPORTAR = """
+import json, sys, time
+inicio = time.perf_counter()
+import {modulo}
+print(json.dumps({{"segundos": time.perf_counter() - inicio,
+                  "pesados": [m for m in {pesados!r} if m in sys.modules]}}))
+"""
+
+PRIMERA_PINTURA = """
+import json, os, sys, time
+import interfaz_1
+interfaz_1.RUTA_IMG = {img!r}
+interfaz_1.RUTA_ICONOS = {iconos!r}
+app = interfaz_1.InterfazSensores()
+app.update()
+pintado = time.time() - {lanzado}
+inicio = time.perf_counter()
+app.mostrar_frame(interfaz_1.Graficas)
+app.update()
+graficas = time.perf_counter() - inicio
+app.destroy()
+print(json.dumps({{"primera_pintura": pintado, "primera_navegacion": graficas,
+                  "pesados_en_menu": "matplotlib" in sys.modules}}))
+"""
+
+
+def ejecutar(codigo, cwd=RUTA_BASE):
+    resultado = subprocess.run([sys.executable, "-c", codigo], cwd=cwd, capture_output=True, text=True,
+                               env=dict(os.environ, PYTHONPATH=RUTA_BASE), timeout=300)
+    if resultado.returncode != 0:
+        raise RuntimeError(resultado.stderr[-1000:])
+    return json.loads(resultado.stdout.strip().splitlines()[-1])
+
+
+def medir_importacion(modulo, repeticiones):
+    medidas = [ejecutar(IMPORTAR.format(modulo=modulo, pesados=PESADOS)) for _ in range(repeticiones)]
+    return statistics.median(m["segundos"] for m in medidas), medidas[0]["pesados"]
+
+
+def crear_iconos(ruta):
+    # Fotos del tamano de las de img/ para que el escalado cueste lo mismo que en la Pi.
+    from PIL import Image
+    os.makedirs(ruta, exist_ok=True)
+    for i, nombre in enumerate(ICONOS):
+        formato = "png" if nombre.endswith(".png") else "jpeg"
+        Image.new("RGB", (1600, 1200), color=(40 * i, 120, 200)).save(os.path.join(ruta, nombre), format=formato)
+
+
+def medir_primera_pintura(repeticiones):
+    from benchmarks.generador import Invernadero, poblar_bd
+
+    with tempfile.TemporaryDirectory() as tmp:
+        poblar_bd(os.path.join(tmp, "datos_sensores.db"), Invernadero(8), dias=2)
+        img = os.path.join(tmp, "img")
+        iconos = os.path.join(tmp, "iconos")
+        crear_iconos(img)
+        medidas = []
+        # La primera vez escala los iconos; las siguientes los leen ya escalados.
+        for _ in range(repeticiones + 1):
+            codigo = PRIMERA_PINTURA.format(img=img, iconos=iconos, lanzado=time.time())
+            medidas.append(ejecutar(codigo, cwd=tmp))
+    return medidas[0], medidas[1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de importacion y de primera pintura de interfaz_1.")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    segundos, pesados = medir_importacion("interfaz_1", args.repeticiones)
+    diferidos, _ = medir_importacion("matplotlib.pyplot, matplotlib.backends.backend_tkagg, PIL.ImageTk, "
+                                     "graficas_vivas", args.repeticiones)
+    print(f"{'import interfaz_1':>34}: {segundos * 1000:7.0f} ms  modulos pesados: {', '.join(pesados) or 'ninguno'}")
+    print(f"{'diferido (matplotlib, PIL, NumPy)':>34}: {diferidos * 1000:7.0f} ms  ya no se paga antes del menu")
+
+    if not os.environ.get("DISPLAY") and sys.platform.startswith("linux"):
+        print("Sin pantalla (DISPLAY vacio): se omite la primera pintura. En la Pi o con xvfb-run si se mide.")
+    else:
+        fria, calientes = medir_primera_pintura(args.repeticiones)
+        pintura = statistics.median(m["primera_pintura"] for m in calientes)
+        navegacion = statistics.median(m["primera_navegacion"] for m in calientes)
+        print(f"{'primera pintura, iconos sin cache':>34}: {fria['primera_pintura'] * 1000:7.0f} ms")
+        print(f"{'primera pintura':>34}: {pintura * 1000:7.0f} ms  (desde que se lanza el proceso)")
+        print(f"{'primera navegacion a Graficas':>34}: {navegacion * 1000:7.0f} ms")
+        if any(m["pesados_en_menu"] for m in calientes):
+            print("FALLO: matplotlib cargado antes de pintar el menu")
+            return 1
+
+    if pesados:
+        print(f"FALLO: importar interfaz_1 carga {', '.join(pesados)}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,68 @@
+import argparse
+import os
+import random
+import sqlite3
+import tempfile
+import time
+
+import agregados
+from escritor_bd import SQL_INSERTAR, SQL_ULTIMA_LECTURA, EscritorSensores, inicializar_bd
+
+
+def intervalos(nodos, minutos):
+    base = time.mktime((2025, 1, 1, 0, 0, 0, 0, 0, -1))
+    for minuto in range(minutos):
+        marca = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(base + minuto * 60))
+        yield [(marca, nodo, round(18 + random.random() * 10, 2), round(40 + random.random() * 30, 2), 0)
+               for nodo in range(nodos)]
+
+
+def escribir_original(db_file, lotes):
+    # Patron anterior de guardar_datos: conexion nueva, un execute por nodo, commit y cierre.
+    # Cada fila actualiza tambien el tablero y los agregados, como en EscritorSensores.
+    for filas in lotes:
+        conn = sqlite3.connect(db_file)
+        cursor = conn.cursor()
+        for fila in filas:
+            cursor.execute(SQL_INSERTAR, fila)
+            cursor.execute(SQL_ULTIMA_LECTURA, fila[:4])
+            agregados.acumular(conn, [fila])
+        conn.commit()
+        conn.close()
+
+
+def escribir_lotes(db_file, lotes):
+    with EscritorSensores(db_file) as escritor:
+        for filas in lotes:
+            escritor.agregar(filas)
+
+
+def medir(funcion, nodos, minutos):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(db_file)
+        inicializar_bd(conn)
+        conn.close()
+
+        lotes = list(intervalos(nodos, minutos))
+        inicio = time.perf_counter()
+        funcion(db_file, lotes)
+        duracion = time.perf_counter() - inicio
+    return nodos * minutos / duracion
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filas por segundo del escritor de sensores.")
+    parser.add_argument("--nodos", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--minutos", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"{'nodos':>5} {'original filas/s':>17} {'lotes filas/s':>14} {'mejora':>7}")
+    for nodos in args.nodos:
+        original = medir(escribir_original, nodos, args.minutos)
+        lotes = medir(escribir_lotes, nodos, args.minutos)
+        print(f"{nodos:>5} {original:>17.0f} {lotes:>14.0f} {lotes / original:>6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
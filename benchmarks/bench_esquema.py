@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+from benchmarks.bench_ultimas_lecturas import INICIO
+
+# Esquema anterior: marca_tiempo TEXT en la clave primaria, valores REAL y un indice aparte por nodo.
+ESQUEMA_TEXTO = """
+    CREATE TABLE sensores (
+        marca_tiempo TEXT, nodo INTEGER, temperatura REAL, humedad REAL,
+        arrastrado INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (marca_tiempo, nodo));
+    CREATE INDEX idx_sensores_nodo_tiempo ON sensores (nodo, marca_tiempo);
+"""
+
+ESQUEMA_ENTERO = """
+    CREATE TABLE lecturas (
+        nodo INTEGER, ts INTEGER, temperatura INTEGER, humedad INTEGER,
+        arrastrado INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (nodo, ts)) WITHOUT ROWID;
+"""
+
+LLENAR_TEXTO = """
+    WITH RECURSIVE m(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM m WHERE i + 1 < ?),
+                   n(nodo) AS (SELECT 1 UNION ALL SELECT nodo + 1 FROM n WHERE nodo < ?)
+    INSERT INTO sensores (marca_tiempo, nodo, temperatura, humedad)
+    SELECT datetime(?, '+' || i || ' minutes'), nodo,
+           18 + (abs(random()) % 1000) / 100.0, 40 + (abs(random()) % 3000) / 100.0
+    FROM m, n
+"""
+
+LLENAR_ENTERO = """
+    WITH RECURSIVE m(i) AS (SELECT 0 UNION ALL SELECT i + 1 FROM m WHERE i + 1 < ?),
+                   n(nodo) AS (SELECT 1 UNION ALL SELECT nodo + 1 FROM n WHERE nodo < ?)
+    INSERT INTO lecturas (nodo, ts, temperatura, humedad)
+    SELECT nodo, CAST(strftime('%s', ?) AS INTEGER) + i * 60,
+           1800 + abs(random()) % 1000, 4000 + abs(random()) % 3000
+    FROM m, n
+"""
+
+# Un dia de un nodo y de todos los nodos, como piden las graficas y la exportacion.
+CONSULTAS_TEXTO = {
+    "dia, un nodo": ("SELECT marca_tiempo, temperatura, humedad FROM sensores "
+                     "WHERE nodo = :nodo AND marca_tiempo >= :desde AND marca_tiempo < :hasta "
+                     "ORDER BY marca_tiempo"),
+    "dia, todos": ("SELECT nodo, marca_tiempo, temperatura, humedad FROM sensores "
+                   "WHERE marca_tiempo >= :desde AND marca_tiempo < :hasta ORDER BY nodo, marca_tiempo"),
+}
+
+CONSULTAS_ENTERO = {
+    "dia, un nodo": ("SELECT ts, temperatura / 100.0, humedad / 100.0 FROM lecturas "
+                     "WHERE nodo = :nodo AND ts >= :ts_desde AND ts < :ts_hasta ORDER BY ts"),
+    "dia, todos": ("SELECT nodo, ts, temperatura / 100.0, humedad / 100.0 FROM lecturas "
+                   # Igual que consultas.filtro_por_nodos: recorrer la clave nodo a nodo.
+                   "WHERE nodo IN (SELECT value FROM json_each(:nodos)) AND ts >= :ts_desde AND ts < :ts_hasta "
+                   "ORDER BY nodo, ts"),
+}
+
+
+def construir(db_file, esquema, llenar, minutos, nodos):
+    conn = sqlite3.connect(db_file)
+    conn.executescript(esquema)
+    conn.execute(llenar, (minutos, nodos, INICIO))
+    conn.commit()
+    conn.execute("VACUUM")
+    conn.close()
+    return os.path.getsize(db_file)
+
+
+def medir(db_file, consulta, parametros, repeticiones):
+    conn = sqlite3.connect(db_file)
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        conn.execute(consulta, parametros).fetchall()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    conn.close()
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tamano y latencia del esquema TEXT anterior frente a lecturas (nodo, ts).")
+    parser.add_argument("--nodos", type=int, default=40)
+    parser.add_argument("--meses", type=int, nargs="+", default=[1, 12, 60])
+    parser.add_argument("--repeticiones", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'meses':>5} {'filas':>11} {'MB texto':>9} {'MB entero':>10} "
+          f"{'consulta':>14} {'texto ms':>9} {'entero ms':>10} {'mejora':>7}")
+    for meses in args.meses:
+        minutos = meses * 30 * 1440
+        with tempfile.TemporaryDirectory() as tmp:
+            db_texto = os.path.join(tmp, "texto.db")
+            db_entero = os.path.join(tmp, "entero.db")
+            tam_texto = construir(db_texto, ESQUEMA_TEXTO, LLENAR_TEXTO, minutos, args.nodos)
+            tam_entero = construir(db_entero, ESQUEMA_ENTERO, LLENAR_ENTERO, minutos, args.nodos)
+
+            # El ultimo dia completo, que es el que se consulta casi siempre.
+            conn = sqlite3.connect(db_entero)
+            ts_hasta = conn.execute("SELECT MAX(ts) FROM lecturas").fetchone()[0] // 86400 * 86400
+            conn.close()
+            ts_desde = ts_hasta - 86400
+            desde, hasta = sqlite3.connect(":memory:").execute(
+                "SELECT datetime(?, 'unixepoch'), datetime(?, 'unixepoch')", (ts_desde, ts_hasta)).fetchone()
+            parametros = {"nodo": args.nodos // 2 + 1, "desde": desde, "hasta": hasta,
+                          "ts_desde": ts_desde, "ts_hasta": ts_hasta,
+                          "nodos": json.dumps(list(range(1, args.nodos + 1)))}
+
+            for nombre in CONSULTAS_TEXTO:
+                t_texto = medir(db_texto, CONSULTAS_TEXTO[nombre], parametros, args.repeticiones)
+                t_entero = medir(db_entero, CONSULTAS_ENTERO[nombre], parametros, args.repeticiones)
+                print(f"{meses:5d} {minutos * args.nodos:11d} {tam_texto / 1e6:9.1f} {tam_entero / 1e6:10.1f} "
+                      f"{nombre:>14} {t_texto:9.2f} {t_entero:10.2f} {t_texto / t_entero:6.1f}x")
+
+
+if __name__ == "__main__":
+    main()
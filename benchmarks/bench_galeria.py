@@ -0,0 +1,94 @@
+import argparse
+import datetime
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+from galeria import TAMANO_VISOR, CacheLRU, IndiceGraficas, imagen_escalada, ruta_escalada
+
+
+def crear_graficas(ruta, nodos, dias, tamano):
+    # PNG parecidos a los exportados: fondo blanco, rejilla y dos series.
+    inicio = datetime.date(2025, 1, 1)
+    ancho, alto = tamano
+    for d in range(dias):
+        fecha = inicio + datetime.timedelta(days=d)
+        for nodo in range(1, nodos + 1):
+            img = Image.new("RGB", tamano, "white")
+            dibujo = ImageDraw.Draw(img)
+            for x in range(0, ancho, 100):
+                dibujo.line([(x, 0), (x, alto)], fill=(220, 220, 220))
+            for color in ("red", "blue"):
+                puntos = [(x, alto // 2 + random.randint(-200, 200)) for x in range(80, ancho - 80, 40)]
+                dibujo.line(puntos, fill=color, width=3)
+            img.save(os.path.join(ruta, f"grafica_nodo{nodo}_{fecha}.png"))
+
+
+def listado_original(ruta):
+    lista = [f for f in os.listdir(ruta) if f.endswith(('.png', '.jpg', '.jpeg'))]
+    lista.sort(reverse=True)
+    return lista
+
+
+def apertura_original(ruta):
+    img = Image.open(ruta)
+    return img.resize(TAMANO_VISOR, Image.LANCZOS)
+
+
+def medir_ms(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Galeria: listado y apertura de graficas con y sin cache.")
+    parser.add_argument("--nodos", type=int, default=4)
+    parser.add_argument("--dias", type=int, default=365)
+    parser.add_argument("--muestras", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        ruta_graficas = os.path.join(tmp, "graficas")
+        ruta_cache = os.path.join(tmp, "cache")
+        os.makedirs(ruta_graficas)
+        print(f"Generando {args.nodos * args.dias} graficas...")
+        crear_graficas(ruta_graficas, args.nodos, args.dias, (1400, 800))
+
+        indice = IndiceGraficas(ruta_graficas)
+        inicio = time.perf_counter()
+        indice.actualizar()
+        primera = (time.perf_counter() - inicio) * 1000
+        print(f"{'listado original':>26}: {medir_ms(lambda: listado_original(ruta_graficas), 20):8.2f} ms")
+        print(f"{'indice (primera vez)':>26}: {primera:8.2f} ms")
+        print(f"{'indice sin cambios':>26}: {medir_ms(indice.actualizar, 20):8.3f} ms")
+        nodo = indice.nodos()[0]
+        print(f"{'filtro por nodo':>26}: {medir_ms(lambda: indice.filtrar(nodo), 20):8.3f} ms")
+
+        muestras = random.sample(indice.graficas, min(args.muestras, len(indice.graficas)))
+        original = [medir_ms(lambda g=g: apertura_original(indice.ruta(g)), 1) for g in muestras]
+        fria = [medir_ms(lambda g=g: imagen_escalada(indice.ruta(g), TAMANO_VISOR, g.mtime_ns, ruta_cache), 1)
+                for g in muestras]
+        caliente = [medir_ms(lambda g=g: imagen_escalada(indice.ruta(g), TAMANO_VISOR, g.mtime_ns, ruta_cache), 1)
+                    for g in muestras]
+        lru = CacheLRU(8)
+        lru.guardar(muestras[0], object())
+        memoria = medir_ms(lambda: lru.obtener(muestras[0]), 100)
+        print(f"{'abrir + LANCZOS (original)':>26}: {statistics.median(original):8.2f} ms")
+        print(f"{'cache en disco, fria':>26}: {statistics.median(fria):8.2f} ms")
+        print(f"{'cache en disco, caliente':>26}: {statistics.median(caliente):8.2f} ms")
+        print(f"{'LRU en memoria':>26}: {memoria:8.4f} ms")
+        escalada = ruta_escalada(indice.ruta(muestras[0]), muestras[0].mtime_ns, TAMANO_VISOR, ruta_cache)
+        print(f"Tamano escalada: {os.path.getsize(escalada) // 1024} KiB, "
+              f"original: {os.path.getsize(indice.ruta(muestras[0])) // 1024} KiB")
+
+
+if __name__ == "__main__":
+    main()
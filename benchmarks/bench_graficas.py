@@ -0,0 +1,90 @@
+import argparse
+import datetime
+import os
+import sqlite3
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+import agregados
+from benchmarks.bench_ultimas_lecturas import INICIO, crecer
+from escritor_bd import inicializar_bd
+from series import cargar_series
+
+
+def ruta_anterior(db_file, nodos, intervalo):
+    # Camino previo: historial completo por nodo, strptime fila a fila y adelgazado en Python.
+    lineas = {}
+    for nodo in nodos:
+        conn = sqlite3.connect(db_file)
+        datos = conn.execute("SELECT marca_tiempo, temperatura, humedad FROM sensores WHERE nodo = ? "
+                             "ORDER BY marca_tiempo DESC", (nodo,)).fetchall()
+        conn.close()
+        datos = sorted(((datetime.datetime.strptime(marca, "%Y-%m-%d %H:%M:%S"), t, h) for marca, t, h in datos),
+                       key=lambda x: x[0])
+        filtrados = []
+        ultima_hora = None
+        for dt, temp, hum in datos:
+            if ultima_hora is None or (dt - ultima_hora).total_seconds() >= intervalo * 60:
+                filtrados.append((dt, temp, hum))
+                ultima_hora = dt
+        if filtrados:
+            horas_dt, temperaturas, _ = zip(*filtrados)
+            lineas[nodo] = (list(horas_dt), list(temperaturas))
+    return lineas
+
+
+def ruta_numpy(db_file, nodos, intervalo, desde, hasta):
+    series = cargar_series(desde, hasta, intervalo, nodos, db_file)
+    return {nodo: (serie.marcas, serie.temperatura) for nodo, serie in series.items()}
+
+
+def dibujar(lineas):
+    fig, ax = plt.subplots(figsize=(14, 8))
+    for nodo, (marcas, valores) in lineas.items():
+        ax.plot(marcas, valores, label=f"Nodo {nodo}")
+    fig.canvas.draw()
+    plt.close(fig)
+
+
+def medir(nombre, preparar):
+    inicio = time.perf_counter()
+    lineas = preparar()
+    preparado = time.perf_counter()
+    dibujar(lineas)
+    fin = time.perf_counter()
+    puntos = sum(len(marcas) for marcas, _ in lineas.values())
+    print(f"{nombre:>22}: datos {preparado - inicio:7.3f} s  dibujo {fin - preparado:6.3f} s  ({puntos} puntos)")
+    return fin - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Grafica comparativa de una ventana de N dias y M nodos.")
+    parser.add_argument("--dias", type=int, default=30)
+    parser.add_argument("--nodos", type=int, default=40)
+    parser.add_argument("--intervalo", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(db_file)
+        inicializar_bd(conn)
+        crecer(conn, args.nodos, 0, args.dias * 1440)
+        agregados.reconstruir(conn)
+        conn.close()
+
+        nodos = list(range(1, args.nodos + 1))
+        desde = datetime.datetime.fromisoformat(INICIO)
+        hasta = desde + datetime.timedelta(days=args.dias)
+        print(f"{args.dias} dias x {args.nodos} nodos, intervalo {args.intervalo} min")
+        anterior = medir("anterior (listas)", lambda: ruta_anterior(db_file, nodos, args.intervalo))
+        nueva = medir("numpy + agregados", lambda: ruta_numpy(db_file, nodos, args.intervalo, desde, hasta))
+        medir("numpy remuestreo 5 min", lambda: ruta_numpy(db_file, nodos, 5, desde, hasta))
+        print(f"Aceleracion: {anterior / nueva:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
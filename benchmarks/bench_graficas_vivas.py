@@ -0,0 +1,94 @@
+import argparse
+import datetime
+import os
+import sqlite3
+import statistics
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+import agregados
+from benchmarks.bench_ultimas_lecturas import INICIO, crecer
+from consultas import FORMATO_MARCA
+from escritor_bd import EscritorSensores, inicializar_bd
+from exportacion import rango_dia
+from graficas_vivas import GraficaViva
+from series import cargar_series
+
+
+def redibujo_completo(fig, db_file, nodos, desde, hasta, bucket):
+    # Camino anterior: borrar la figura, volver a pedir el dia entero y dibujar todo.
+    fig.clf()
+    ax = fig.add_subplot(111)
+    series = cargar_series(desde, hasta, bucket, nodos, db_file)
+    for nodo, serie in series.items():
+        ax.plot(serie.marcas, serie.temperatura, label=f"Nodo {nodo}")
+    ax.legend(ncol=max(1, len(nodos) // 10), fontsize="small")
+    fig.canvas.draw()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresco incremental de la grafica comparativa frente a redibujo completo.")
+    parser.add_argument("--nodos", type=int, default=40)
+    parser.add_argument("--horas", type=int, default=12, help="historial ya presente en el dia mostrado")
+    parser.add_argument("--refrescos", type=int, default=30)
+    parser.add_argument("--bucket", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(db_file)
+        inicializar_bd(conn)
+        crecer(conn, args.nodos, 0, args.horas * 60)
+        agregados.reconstruir(conn)
+        conn.close()
+
+        nodos = list(range(1, args.nodos + 1))
+        dia = INICIO[:10]
+        desde, hasta = rango_dia(dia)
+
+        fig, ax = plt.subplots(figsize=(14, 8))
+        viva = GraficaViva(fig.canvas, bucket_minutos=args.bucket, db_file=db_file)
+        for nodo in nodos:
+            viva.agregar_linea(ax, nodo, "temperatura", "-", label=f"Nodo {nodo}")
+        viva.cargar(desde, hasta)
+        fig.canvas.draw()
+
+        escritor = EscritorSensores(db_file)
+        minuto = datetime.datetime.fromisoformat(INICIO) + datetime.timedelta(hours=args.horas)
+        incremental = []
+        completo = []
+        figura_completa = plt.figure(figsize=(14, 8))
+        for _ in range(args.refrescos):
+            marca = minuto.strftime(FORMATO_MARCA)
+            escritor.agregar([(marca, nodo, 20.0 + nodo / 10, 50.0, 0) for nodo in nodos])
+            escritor.flush()
+            minuto += datetime.timedelta(minutes=1)
+
+            inicio = time.perf_counter()
+            viva.sondear()
+            incremental.append((time.perf_counter() - inicio) * 1000)
+
+            inicio = time.perf_counter()
+            redibujo_completo(figura_completa, db_file, nodos, desde, hasta, args.bucket)
+            completo.append((time.perf_counter() - inicio) * 1000)
+
+        inicio = time.perf_counter()
+        viva.sondear()
+        sin_cambios = (time.perf_counter() - inicio) * 1000
+        escritor.cerrar()
+        viva.cerrar()
+
+        print(f"{args.nodos} nodos, {args.horas} h de historial, cubetas de {args.bucket} min, "
+              f"{args.refrescos} refrescos (blit: {viva.blit})")
+        print(f"{'incremental':>18}: mediana {statistics.median(incremental):7.2f} ms  max {max(incremental):7.2f} ms")
+        print(f"{'redibujo completo':>18}: mediana {statistics.median(completo):7.2f} ms  max {max(completo):7.2f} ms")
+        print(f"{'sin cambios':>18}: {sin_cambios:7.3f} ms")
+        print(f"Aceleracion: {statistics.median(completo) / statistics.median(incremental):.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+import argparse
+import math
+import os
+import resource
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import historico
+import retencion
+from benchmarks.generador import Invernadero
+
+
+def bloques_simulados(invernadero, nodo, mes, tamano=historico.BLOQUE):
+    # Un mes de un nodo, troceado como lo trocea exportar().
+    inicio = retencion.inicio_mes(mes)
+    filas = invernadero.lecturas(inicio, (retencion.fin_mes(mes) - inicio) // 60, nodos=[nodo])
+    for i in range(0, len(filas), tamano):
+        trozo = filas[i:i + tamano]
+        yield {columna: trozo[f"f{j}"].astype(historico.TIPOS[columna])
+               for j, columna in enumerate(historico.COLUMNAS)}
+
+
+def simular(destino, formato, nodos, meses):
+    invernadero = Invernadero(nodos)
+    filas = 0
+    for nodo in invernadero.nodos:
+        for mes in meses:
+            ruta = historico.ruta_particion(destino, nodo, mes, formato)
+            filas += historico.escribir_particion(ruta, bloques_simulados(invernadero, nodo, mes), formato)
+    return filas
+
+
+def tamano_carpeta(ruta):
+    return sum(os.path.getsize(os.path.join(raiz, nombre)) for raiz, _, nombres in os.walk(ruta) for nombre in nombres)
+
+
+def memoria_pico_mb():
+    # ru_maxrss va en KiB en Linux y en bytes en macOS.
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico / 1024 / 1024 if sys.platform == "darwin" else pico / 1024
+
+
+def resumen(db_file):
+    conn = sqlite3.connect(db_file)
+    fila = conn.execute("SELECT COUNT(*), SUM(ts), SUM(temperatura), SUM(humedad) FROM lecturas").fetchone()
+    conn.close()
+    return fila
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rendimiento del volcado por columnas y de la carga masiva.")
+    parser.add_argument("--filas", type=int, default=100_000_000)
+    parser.add_argument("--nodos", type=int, default=200)
+    parser.add_argument("--formato", action="append", choices=sorted(historico.ESCRITORES),
+                        help="por defecto todos los disponibles")
+    parser.add_argument("--directorio", default=None, help="donde dejar los archivos (hacen falta varios GB)")
+    args = parser.parse_args()
+
+    formatos = args.formato or [f for f in ("parquet", "feather", "npz") if f == "npz" or historico.hay_pyarrow()]
+    # Meses enteros de lecturas por minuto hasta cubrir --filas; terminan en el mes pasado.
+    meses_necesarios = math.ceil(args.filas / (args.nodos * 30 * 1440))
+    ultimo = retencion.mes_de(retencion.inicio_mes(retencion.mes_de(retencion.hora_local())) - 1)
+    meses = [ultimo]
+    while len(meses) < meses_necesarios:
+        meses.insert(0, retencion.mes_de(retencion.inicio_mes(meses[0]) - 1))
+    print(f"{args.nodos} nodos x {len(meses)} meses ({meses[0]} a {meses[-1]}), formatos: {', '.join(formatos)}")
+    print(f"{'':>10} {'filas':>12} {'simular':>10} {'importar':>10} {'exportar':>10} {'B/fila':>7} {'BD B/fila':>9}")
+
+    fallos = 0
+    tmp = tempfile.mkdtemp(dir=args.directorio)
+    try:
+        for formato in formatos:
+            simulado = os.path.join(tmp, f"simulado_{formato}")
+            volcado = os.path.join(tmp, f"volcado_{formato}")
+            db_file = os.path.join(tmp, f"{formato}.db")
+
+            inicio = time.perf_counter()
+            filas = simular(simulado, formato, args.nodos, meses)
+            t_simular = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            _, importadas, _ = historico.importar(simulado, db_file, reconstruir_agregados=False)
+            t_importar = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            _, exportadas, _ = historico.exportar(db_file, volcado, formato)
+            t_exportar = time.perf_counter() - inicio
+
+            bytes_fila = tamano_carpeta(volcado) / exportadas
+            bd_fila = os.path.getsize(db_file) / importadas
+            print(f"{formato:>10} {filas:12d} {filas / t_simular:8.0f}/s {importadas / t_importar:8.0f}/s "
+                  f"{exportadas / t_exportar:8.0f}/s {bytes_fila:7.2f} {bd_fila:9.2f}")
+
+            # La vuelta completa tiene que dejar exactamente las mismas lecturas.
+            copia = os.path.join(tmp, f"{formato}_copia.db")
+            historico.importar(volcado, copia, reconstruir_agregados=False)
+            if not filas == importadas == exportadas or resumen(copia) != resumen(db_file):
+                print(f"FALLO: {formato} no devuelve las mismas lecturas")
+                fallos += 1
+            for ruta in (simulado, volcado):
+                shutil.rmtree(ruta)
+            for ruta in (db_file, copia):
+                os.remove(ruta)
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    print(f"Memoria pico del proceso: {memoria_pico_mb():.0f} MB (no depende de --filas)")
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,63 @@
+import argparse
+import sys
+import timeit
+
+import numpy as np
+
+from interfaz_1 import ANCHO_MAPA, PERIODO_CUADRO_MS, imagen_rgb
+from mapa_calor import MARGENES, Interpolador, colorear
+from nodos import cargar_plano
+
+RANGO = (18.0, 25.0)
+
+
+def medir(funcion, repeticiones):
+    return min(timeit.repeat(funcion, number=1, repeat=repeticiones))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste del plano interpolado: pesos, refresco y reproduccion.")
+    parser.add_argument("--nodos", type=int, nargs="+", default=[4, 20, 100, 200])
+    parser.add_argument("--cuadros", type=int, default=288, help="cuadros del dia (288 = cubetas de 5 min)")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'nodos':>6} {'pesos ms':>9} {'refresco ms':>12} {'dia ms':>8} {'cuadro ms':>10} {'cuadros/s':>10}")
+    lentos = []
+    for cantidad in args.nodos:
+        nodos = list(range(1, cantidad + 1))
+        plano = cargar_plano(nodos, ruta_config="")
+        interpolador = Interpolador(plano, nodos)
+        tamano = (ANCHO_MAPA, max(1, round(ANCHO_MAPA * interpolador.filas / interpolador.columnas)))
+        valores = rng.normal(22, 3, cantidad).astype(np.float32)
+        # Un dia con huecos: cada nodo pierde un 2% de los cuadros.
+        dia = rng.normal(22, 3, (args.cuadros, cantidad)).astype(np.float32)
+        dia[rng.random(dia.shape) < 0.02] = np.nan
+
+        t_pesos = medir(lambda: Interpolador(plano, nodos), args.repeticiones)
+        # En vivo: producto matriz-vector, color y escalado de un mapa.
+        t_refresco = medir(lambda: imagen_rgb(colorear(interpolador.interpolar(valores), RANGO,
+                                                       MARGENES["temperatura"]), tamano), args.repeticiones)
+        # Reproduccion: todos los cuadros de un campo en el planificador.
+        t_dia = medir(lambda: colorear(interpolador.interpolar_serie(dia), RANGO, MARGENES["temperatura"]),
+                      args.repeticiones)
+        rgb = colorear(interpolador.interpolar_serie(dia[:10]), RANGO, MARGENES["temperatura"])
+        # Lo que queda en el hilo de Tk por cuadro: escalar los dos mapas (falta el paste en la PhotoImage).
+        t_cuadro = medir(lambda: [imagen_rgb(rgb[i % 10], tamano) for i in range(2)], args.repeticiones)
+
+        cuadros_s = 1 / t_cuadro
+        print(f"{cantidad:6d} {t_pesos * 1000:9.1f} {t_refresco * 1000:12.2f} {t_dia * 1000:8.0f} "
+              f"{t_cuadro * 1000:10.2f} {cuadros_s:10.0f}")
+        # Margen de 3x para el paste en Tk y el resto del bucle de eventos.
+        if cuadros_s < 3 * 1000 / PERIODO_CUADRO_MS:
+            lentos.append(cantidad)
+
+    if lentos:
+        print(f"FALLO: sin margen para {1000 // PERIODO_CUADRO_MS} cuadros/s con {lentos} nodos")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,81 @@
+import argparse
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import timeit
+
+import metricas
+from benchmarks.bench_alertas import tramas_simuladas
+from escritor_bd import EscritorSensores
+from recepcion import Acumulador
+
+
+def ingesta(tramas):
+    with tempfile.TemporaryDirectory() as tmp:
+        escritor = EscritorSensores(os.path.join(tmp, "bench.db"))
+        acumulador = Acumulador(escritor, verboso=False)
+        inicio = timeit.default_timer()
+        for i, (trama, recibida) in enumerate(tramas):
+            acumulador.al_recibir(trama, recibida)
+            if i % 1000 == 0:
+                escritor.revisar()
+        escritor.cerrar()
+        return timeit.default_timer() - inicio
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste de la instrumentacion desactivada y activada.")
+    parser.add_argument("--nodos", type=int, default=200)
+    parser.add_argument("--tramas", type=int, default=200000)
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    contador = metricas.contador("bench_contador_total", "prueba")
+    histograma = metricas.histograma("bench_histograma_segundos", "prueba")
+
+    def medir_vacio():
+        with histograma.medir():
+            pass
+
+    n = 1000000
+    tramas = tramas_simuladas(args.nodos, args.tramas)
+    desactivadas = {
+        "inc": timeit.timeit(contador.inc, number=n) / n * 1e9,
+        "medir": timeit.timeit(medir_vacio, number=n) / n * 1e9,
+        "ingesta": min(ingesta(tramas) for _ in range(args.repeticiones)),
+    }
+    metricas.activar()
+    activadas = {
+        "inc": timeit.timeit(contador.inc, number=n) / n * 1e9,
+        "medir": timeit.timeit(medir_vacio, number=n) / n * 1e9,
+        "ingesta": min(ingesta(tramas) for _ in range(args.repeticiones)),
+    }
+
+    print(f"{'':>26} {'desactivadas':>13} {'activadas':>10}")
+    print(f"{'Contador.inc (ns)':>26} {desactivadas['inc']:13.0f} {activadas['inc']:10.0f}")
+    print(f"{'Histograma.medir (ns)':>26} {desactivadas['medir']:13.0f} {activadas['medir']:10.0f}")
+    print(f"{'Ingesta (tramas/s)':>26} {len(tramas) / desactivadas['ingesta']:13.0f} "
+          f"{len(tramas) / activadas['ingesta']:10.0f}")
+
+    texto = metricas.texto_prometheus()
+    commits = [linea for linea in texto.splitlines() if linea.startswith("invernadero_commit_segundos_count")]
+    print(f"Exportacion Prometheus: {len(texto.splitlines())} lineas; {commits[0] if commits else 'sin commits'}")
+
+    salida = io.StringIO()
+    with contextlib.redirect_stdout(salida), tempfile.TemporaryDirectory() as tmp:
+        ruta = os.path.join(tmp, "perfil.pstats")
+        with metricas.perfilar(ruta):
+            ingesta(tramas[:20000])
+        perfil_guardado = os.path.getsize(ruta) > 0
+    print(f"Perfil con --profile: {'guardado' if perfil_guardado else 'NO guardado'}")
+
+    if not commits or not perfil_guardado:
+        print("FALLO: faltan las metricas del escritor o el perfil")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
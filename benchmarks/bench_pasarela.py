@@ -0,0 +1,131 @@
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from escritor_bd import EscritorSensores
+from pasarela import MAX_REGISTROS_UDP, Pasarela, codificar
+from recepcion import Acumulador
+from tramas import Trama
+
+PERIODO_ENVIO = 0.5
+
+
+async def receptor_simulado(puerto, receptor, nodos, args, oidas, enviadas):
+    # Cada nodo transmite una vez por segundo; este receptor oye cada trama con probabilidad
+    # 1 - perdida y, como ClientePasarela, envia lo oido cada PERIODO_ENVIO.
+    rng = random.Random(receptor)
+    loop = asyncio.get_running_loop()
+    if args.udp:
+        transporte, _ = await loop.create_datagram_endpoint(asyncio.DatagramProtocol,
+                                                            remote_addr=("127.0.0.1", puerto))
+    else:
+        _, writer = await asyncio.open_connection("127.0.0.1", puerto)
+
+    pendientes = []
+    await asyncio.sleep(rng.random() * PERIODO_ENVIO)
+    proximo = loop.time()
+    for segundo in range(args.segundos):
+        for nodo in nodos:
+            if rng.random() >= args.perdida:
+                pendientes.append((Trama(nodo, 20 + nodo % 10, 50.0, True, segundo % 65536), time.time()))
+                oidas.add((nodo, segundo))
+        for mitad in (0, 1):
+            lote = pendientes[len(pendientes) // 2:] if mitad else pendientes[:len(pendientes) // 2]
+            tamano = MAX_REGISTROS_UDP if args.udp else 1000
+            for inicio in range(0, len(lote), tamano):
+                datos = codificar(receptor, lote[inicio:inicio + tamano])
+                if args.udp:
+                    transporte.sendto(datos)
+                else:
+                    writer.write(datos)
+            if not args.udp:
+                await writer.drain()
+            enviadas[receptor] = enviadas.get(receptor, 0) + len(lote)
+            if not args.rafaga:
+                proximo += PERIODO_ENVIO
+                await asyncio.sleep(max(0.0, proximo - loop.time()))
+        pendientes = []
+    if args.udp:
+        transporte.close()
+    else:
+        writer.close()
+        await writer.wait_closed()
+
+
+async def ejecutar(pasarela, args):
+    puerto = await pasarela.servir("127.0.0.1", 0, udp=args.udp)
+    # Cada receptor cubre `nodos` nodos y cada nodo lo oyen `oyentes` receptores contiguos.
+    total_nodos = args.receptores * args.nodos // args.oyentes
+    paso = total_nodos // args.receptores
+    oidas = set()
+    enviadas = {}
+    profundidad = [0]
+
+    async def vigilar():
+        while True:
+            profundidad[0] = max(profundidad[0], pasarela.cola.qsize())
+            await asyncio.sleep(0.05)
+
+    vigia = asyncio.create_task(vigilar())
+    inicio = time.perf_counter()
+    await asyncio.gather(*(
+        receptor_simulado(puerto, receptor,
+                          [(receptor * paso + i) % total_nodos + 1 for i in range(args.nodos)],
+                          args, oidas, enviadas)
+        for receptor in range(1, args.receptores + 1)))
+    envio = time.perf_counter() - inicio
+    # Lo recibido tiene que terminar de pasar por la cola y el escritor.
+    while pasarela.procesadas < pasarela.recibidas - pasarela.descartadas:
+        await asyncio.sleep(0.01)
+    total = time.perf_counter() - inicio
+    vigia.cancel()
+    pasarela.cerrar_servidores()
+    return total_nodos, oidas, sum(enviadas.values()), envio, total, profundidad[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Carga de varios receptores simulados contra la pasarela en localhost.")
+    parser.add_argument("--receptores", type=int, default=10)
+    parser.add_argument("--nodos", type=int, default=200, help="nodos que oye cada receptor")
+    parser.add_argument("--oyentes", type=int, default=2, help="receptores que oyen cada nodo")
+    parser.add_argument("--segundos", type=int, default=10)
+    parser.add_argument("--perdida", type=float, default=0.05, help="probabilidad de que un receptor no oiga una trama")
+    parser.add_argument("--udp", action="store_true")
+    parser.add_argument("--rafaga", action="store_true", help="enviar sin esperar, para medir la capacidad maxima")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        escritor = EscritorSensores(db_file)
+        acumulador = Acumulador(escritor, verboso=False)
+        pasarela = Pasarela(acumulador.al_recibir, al_tick=acumulador.al_tick)
+        pasarela.iniciar()
+        total_nodos, oidas, enviadas, envio, total, profundidad = asyncio.run(ejecutar(pasarela, args))
+        pasarela.detener()
+        escritor.cerrar()
+        conn = sqlite3.connect(db_file)
+        guardadas = conn.execute("SELECT COUNT(*) FROM tramas_recibidas").fetchone()[0]
+        conn.close()
+
+    estadisticas = pasarela.estadisticas()
+    print(f"{args.receptores} receptores x {args.nodos} nodos ({total_nodos} nodos, {args.oyentes} oyentes por nodo), "
+          f"{args.segundos} s {'en rafaga' if args.rafaga else 'a 1 Hz'} por {'UDP' if args.udp else 'TCP'}")
+    print(f"Tramas enviadas: {enviadas} ({enviadas / envio:.0f}/s), procesadas {estadisticas['procesadas']} "
+          f"en {total:.2f} s ({estadisticas['procesadas'] / total:.0f}/s)")
+    print(f"Descartadas por cola llena: {estadisticas['descartadas']}  cola maxima: {profundidad} lotes")
+    print(f"Unicas (nodo, secuencia): {len(oidas)}  duplicadas descartadas: {acumulador.duplicadas}  "
+          f"guardadas: {guardadas}  perdidas por secuencia: {acumulador.perdidas}")
+    # Por TCP la cola llena frena a los receptores en lugar de descartar: no debe faltar ninguna.
+    if not args.udp and guardadas != len(oidas):
+        print("FALLO: el numero de tramas guardadas no coincide con las tramas unicas")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
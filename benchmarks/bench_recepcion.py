@@ -0,0 +1,78 @@
+import argparse
+import random
+import time
+
+from benchmarks.radio_simulada import Emisor, RadioSimulada
+from receptor import MotorRecepcion, TAMANO_PAYLOAD
+from tramas import FORMATO_BINARIO, DecodificadorTramas
+
+
+def payload_binario(nodo, ronda):
+    return FORMATO_BINARIO.pack(nodo, 20 + random.random() * 8, 40 + random.random() * 30, True)
+
+
+def bucle_original(radio, decodificar, duracion):
+    recibidas = 0
+    fin = time.monotonic() + duracion
+    while time.monotonic() < fin:
+        if radio.available():
+            if decodificar(radio.read(TAMANO_PAYLOAD)):
+                recibidas += 1
+        time.sleep(1)
+    return recibidas
+
+
+def medir(modo, nodos, frecuencia, duracion):
+    radio = RadioSimulada()
+    decodificar = DecodificadorTramas()
+    emisor = Emisor(radio, payload_binario, range(1, nodos + 1), frecuencia, duracion)
+
+    inicio = time.monotonic()
+    if modo == "original":
+        emisor.start()
+        recibidas = bucle_original(radio, decodificar, duracion)
+    else:
+        procesadas = []
+        motor = MotorRecepcion(radio, decodificar, lambda trama, recibida: procesadas.append(trama),
+                               irq_externa=(modo == "irq"))
+        if modo == "irq":
+            radio.al_irq = motor.notificar_irq
+        motor.iniciar()
+        emisor.start()
+        emisor.join()
+        time.sleep(0.1)
+        motor.detener()
+        recibidas = len(procesadas)
+    emisor.join()
+    transcurrido = time.monotonic() - inicio
+
+    enviadas = radio.enviadas
+    perdida = 100.0 * (enviadas - recibidas) / enviadas if enviadas else 0.0
+    return {
+        "modo": modo,
+        "nodos": nodos,
+        "enviadas": enviadas,
+        "recibidas": recibidas,
+        "pps": recibidas / transcurrido,
+        "perdida_pct": perdida,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reproduce rafagas de tramas sobre un RF24 simulado.")
+    parser.add_argument("--nodos", type=int, nargs="+", default=[4, 20, 40])
+    parser.add_argument("--frecuencia", type=float, default=1.0, help="tramas por segundo y nodo")
+    parser.add_argument("--duracion", type=float, default=10.0)
+    parser.add_argument("--modos", nargs="+", default=["original", "sondeo", "irq"])
+    args = parser.parse_args()
+
+    print(f"{'modo':>9} {'nodos':>5} {'enviadas':>8} {'recibidas':>9} {'pps':>8} {'perdida %':>9}")
+    for nodos in args.nodos:
+        for modo in args.modos:
+            r = medir(modo, nodos, args.frecuencia, args.duracion)
+            print(f"{r['modo']:>9} {r['nodos']:>5} {r['enviadas']:>8} {r['recibidas']:>9} "
+                  f"{r['pps']:>8.1f} {r['perdida_pct']:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+import argparse
+import datetime
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+import agregados
+import retencion
+from benchmarks.bench_ultimas_lecturas import INICIO, crecer
+from escritor_bd import inicializar_bd
+from series import cargar_series
+
+
+def tamano(db_file):
+    return sum(os.path.getsize(ruta) for ruta in (db_file, db_file + "-wal") if os.path.exists(ruta))
+
+
+def medir(db_file, desde, hasta, bucket, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        series = cargar_series(desde, hasta, bucket, None, db_file)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), series
+
+
+def iguales(a, b):
+    return a.keys() == b.keys() and all(
+        all(np.array_equal(x, y) for x, y in zip(a[nodo], b[nodo])) for nodo in a)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tamano del archivo caliente y latencia antes y despues de archivar.")
+    parser.add_argument("--nodos", type=int, default=40)
+    parser.add_argument("--dias", type=int, default=180, help="historial generado, terminando hoy")
+    parser.add_argument("--retencion", type=int, default=30)
+    parser.add_argument("--bucket", type=int, default=5)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    hoy = datetime.date.today()
+    final = int((datetime.datetime.combine(hoy, datetime.time()) - datetime.datetime.fromisoformat(INICIO))
+                .total_seconds() // 60)
+    dia_reciente = (f"{hoy - datetime.timedelta(days=1)} 00:00:00", f"{hoy} 00:00:00")
+    antiguo = hoy - datetime.timedelta(days=args.dias - 10)
+    dia_antiguo = (f"{antiguo} 00:00:00", f"{antiguo + datetime.timedelta(days=1)} 00:00:00")
+    # Cruza el mes: dos archivos y, si la retencion es corta, tambien la tabla caliente.
+    rango = (f"{antiguo} 00:00:00", f"{antiguo + datetime.timedelta(days=40)} 00:00:00")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(db_file)
+        inicializar_bd(conn)
+        crecer(conn, args.nodos, final - args.dias * 1440, final)
+        agregados.reconstruir(conn)
+        retencion.checkpoint(conn)
+
+        antes = {"tamano": tamano(db_file)}
+        antes["reciente"], _ = medir(db_file, *dia_reciente, args.bucket, args.repeticiones)
+        antes["antiguo"], serie_antigua = medir(db_file, *dia_antiguo, args.bucket, args.repeticiones)
+        antes["rango"], serie_rango = medir(db_file, *rango, args.bucket, 1)
+
+        inicio = time.perf_counter()
+        total = 0
+        quedan = True
+        while quedan:
+            movidas, quedan = retencion.archivar_dia(conn, db_file, args.retencion)
+            total += movidas
+        archivado = time.perf_counter() - inicio
+        paginas = retencion.compactar(conn)
+        retencion.checkpoint(conn)
+        conn.close()
+
+        despues = {"tamano": tamano(db_file)}
+        despues["reciente"], _ = medir(db_file, *dia_reciente, args.bucket, args.repeticiones)
+        despues["antiguo"], serie_archivada = medir(db_file, *dia_antiguo, args.bucket, args.repeticiones)
+        despues["rango"], serie_rango_archivada = medir(db_file, *rango, args.bucket, 1)
+        meses = retencion.meses_archivados(db_file)
+        tamano_archivos = sum(os.path.getsize(retencion.ruta_mes(db_file, mes)) for mes in meses)
+
+        print(f"{args.nodos} nodos x {args.dias} dias, retencion {args.retencion} dias, cubetas de {args.bucket} min")
+        print(f"{total} lecturas archivadas en {archivado:.1f} s, {paginas} paginas liberadas, "
+              f"{len(meses)} archivos ({tamano_archivos / 1e6:.1f} MB)")
+        print(f"{'':>22} {'antes':>10} {'despues':>10}")
+        print(f"{'BD caliente (MB)':>22} {antes['tamano'] / 1e6:10.1f} {despues['tamano'] / 1e6:10.1f}")
+        for clave, nombre in (("reciente", "ayer (ms)"), ("antiguo", "dia archivado (ms)"), ("rango", "40 dias (ms)")):
+            print(f"{nombre:>22} {antes[clave]:10.2f} {despues[clave]:10.2f}")
+
+    if not (iguales(serie_antigua, serie_archivada) and iguales(serie_rango, serie_rango_archivada)):
+        print("FALLO: las series leidas de los archivos no coinciden")
+        return 1
+    print("OK: las series de los dias archivados coinciden")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
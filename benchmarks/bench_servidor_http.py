@@ -0,0 +1,119 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import agregados
+from benchmarks.bench_ultimas_lecturas import crecer
+from escritor_bd import inicializar_bd
+from servidor_http import ServicioDatos, crear_servidor, serializar
+
+RUTAS = ["/ultimas", "/series?bucket=15", "/series?bucket=60&nodos=1,2,3", "/resumen"]
+
+
+def pedir(url, etag=None):
+    peticion = urllib.request.Request(url, headers={"If-None-Match": etag} if etag else {})
+    try:
+        with urllib.request.urlopen(peticion) as respuesta:
+            return respuesta.status, respuesta.headers.get("ETag"), respuesta.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers.get("ETag"), e.read()
+
+
+def carga(base, clientes, peticiones):
+    # Cada cliente recorre las rutas; devuelve peticiones por segundo.
+    def cliente(_):
+        for i in range(peticiones):
+            estado, _, _ = pedir(base + RUTAS[i % len(RUTAS)])
+            assert estado == 200, estado
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(clientes) as pool:
+        list(pool.map(cliente, range(clientes)))
+    return clientes * peticiones / (time.perf_counter() - inicio)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP contra una BD de prueba: cache, ETag y peticiones/s.")
+    parser.add_argument("--nodos", type=int, default=20)
+    parser.add_argument("--dias", type=int, default=7)
+    parser.add_argument("--clientes", type=int, default=8)
+    parser.add_argument("--peticiones", type=int, default=100, help="por cliente")
+    args = parser.parse_args()
+
+    fallos = []
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(db_file)
+        inicializar_bd(conn)
+        crecer(conn, args.nodos, 0, args.dias * 1440)
+        agregados.reconstruir(conn)
+
+        servicio = ServicioDatos(db_file, ttl=0.2)
+        servidor = crear_servidor(servicio, "127.0.0.1", 0)
+        threading.Thread(target=servidor.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{servidor.server_address[1]}"
+
+        # Lo que costaria cada peticion sin cache: consulta y serializacion completas.
+        inicio = time.perf_counter()
+        for ruta in RUTAS:
+            ruta, _, consulta = ruta.partition("?")
+            funcion = servicio.rutas[ruta]
+            serializar(*funcion(**servicio.argumentos(ruta, dict(p.split("=") for p in consulta.split("&") if p))), "json")
+        sin_cache = len(RUTAS) / (time.perf_counter() - inicio)
+
+        por_segundo = carga(base, args.clientes, args.peticiones)
+        cache = servicio.cache
+        total = args.clientes * args.peticiones
+        print(f"{args.nodos} nodos x {args.dias} dias, {args.clientes} clientes x {args.peticiones} peticiones")
+        print(f"Sin cache: {sin_cache:.0f} respuestas/s; por HTTP con cache: {por_segundo:.0f} peticiones/s")
+        print(f"Consultas a la BD: {cache.fallos} para {total} peticiones ({cache.aciertos} aciertos)")
+        if cache.fallos != len(RUTAS):
+            fallos.append(f"se esperaban {len(RUTAS)} consultas, hubo {cache.fallos}")
+
+        estado, etag, cuerpo = pedir(base + "/ultimas")
+        if pedir(base + "/ultimas", etag)[0] != 304:
+            fallos.append("If-None-Match con el ETag vigente no devolvio 304")
+        if len(json.loads(cuerpo)["filas"]) != args.nodos:
+            fallos.append("/ultimas no trae un nodo por fila")
+
+        estado, _, cuerpo = pedir(base + "/series?bucket=60&nodos=1&formato=csv")
+        filas = list(csv.reader(io.StringIO(cuerpo.decode())))
+        if estado != 200 or filas[0][:2] != ["nodo", "marca"] or len(filas) != 25:
+            fallos.append(f"CSV de /series inesperado: {estado}, {len(filas)} filas")
+        if pedir(base + "/series?bucket=1&desde=2020-01-01&hasta=2030-01-01")[0] != 400:
+            fallos.append("un rango de cubetas excesivo no devolvio 400")
+        if pedir(base + "/nada")[0] != 404:
+            fallos.append("una ruta desconocida no devolvio 404")
+
+        # Un dato nuevo desde otra conexion cambia data_version: pasado el ttl, nuevo ETag.
+        conn.execute("UPDATE ultimas_lecturas SET temperatura = temperatura + 1 WHERE nodo = 1")
+        conn.commit()
+        time.sleep(0.3)
+        estado, etag_nuevo, _ = pedir(base + "/ultimas", etag)
+        if estado != 200 or etag_nuevo == etag:
+            fallos.append("tras escribir en la BD se siguio sirviendo la respuesta anterior")
+
+        servidor.shutdown()
+        servidor.server_close()
+        servicio.cerrar()
+        conn.close()
+
+    for fallo in fallos:
+        print("FALLO:", fallo)
+    if not fallos:
+        print("OK: una consulta por ruta, 304 con ETag, CSV y invalidacion por data_version")
+    return 1 if fallos else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
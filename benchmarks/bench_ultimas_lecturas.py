@@ -0,0 +1,102 @@
+import argparse
+import datetime
+import os
+import sqlite3
+import tempfile
+import time
+
+from consultas import UltimasLecturas
+from escritor_bd import inicializar_bd
+
+INICIO = "2025-01-01 00:00:00"
+
+
+def crecer(conn, nodos, minuto_inicial, minuto_final):
+    # Genera las filas dentro de SQLite para poder llegar a 10M sin pasar por Python.
+    conn.execute("""
+        WITH RECURSIVE
+          m(i) AS (SELECT ? UNION ALL SELECT i + 1 FROM m WHERE i + 1 < ?),
+          n(nodo) AS (SELECT 1 UNION ALL SELECT nodo + 1 FROM n WHERE nodo < ?)
+        INSERT INTO lecturas (nodo, ts, temperatura, humedad)
+        SELECT nodo, CAST(strftime('%s', ?) AS INTEGER) + i * 60,
+               1800 + abs(random()) % 1000, 4000 + abs(random()) % 3000
+        FROM m, n
+    """, (minuto_inicial, minuto_final, nodos, INICIO))
+    conn.execute("DELETE FROM ultimas_lecturas")
+    conn.commit()
+    inicializar_bd(conn)
+
+
+def refresco_original(db_file, nodos):
+    # Patron anterior de actualizar_mapa: historial completo por nodo para usar solo datos[0].
+    for nodo in range(1, nodos + 1):
+        conn = sqlite3.connect(db_file)
+        datos = conn.execute("SELECT marca_tiempo, temperatura, humedad FROM sensores WHERE nodo = ? "
+                             "ORDER BY marca_tiempo DESC", (nodo,)).fetchall()
+        conn.close()
+        [datetime.datetime.strptime(marca, "%Y-%m-%d %H:%M:%S").strftime("%H:%M") for marca, _, _ in datos]
+
+
+def refresco_agrupado(db_file, nodos):
+    conn = sqlite3.connect(db_file)
+    conn.execute("""
+        SELECT s.nodo, s.marca_tiempo, s.temperatura, s.humedad
+        FROM sensores s
+        JOIN (SELECT nodo, MAX(marca_tiempo) AS ultima FROM sensores GROUP BY nodo) u
+          ON s.nodo = u.nodo AND s.marca_tiempo = u.ultima
+    """).fetchall()
+    conn.close()
+
+
+def refresco_tabla(db_file, nodos):
+    conn = sqlite3.connect(db_file)
+    conn.execute("SELECT nodo, marca_tiempo, temperatura, humedad FROM ultimas_lecturas").fetchall()
+    conn.close()
+
+
+def cronometrar(funcion, repeticiones=5):
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    return mejor * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latencia de refresco del tablero segun el tamano de la BD.")
+    parser.add_argument("--filas", type=int, nargs="+", default=[1_000, 100_000, 1_000_000, 10_000_000])
+    parser.add_argument("--nodos", type=int, default=40)
+    parser.add_argument("--max-original", type=int, default=1_000_000,
+                        help="no medir el patron original por encima de este numero de filas")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "bench.db")
+        conn = sqlite3.connect(db_file)
+        inicializar_bd(conn)
+        cache = UltimasLecturas(db_file)
+
+        minutos = 0
+        print(f"{'filas':>10} {'original ms':>12} {'agrupada ms':>12} {'tabla ms':>9} {'cache ms':>9}")
+        for filas in sorted(args.filas):
+            objetivo = max(1, filas // args.nodos)
+            if objetivo > minutos:
+                crecer(conn, args.nodos, minutos, objetivo)
+                minutos = objetivo
+            cache.obtener()
+
+            original = "-"
+            if filas <= args.max_original:
+                original = f"{cronometrar(lambda: refresco_original(db_file, args.nodos), 1):.1f}"
+            agrupada = cronometrar(lambda: refresco_agrupado(db_file, args.nodos))
+            tabla = cronometrar(lambda: refresco_tabla(db_file, args.nodos))
+            en_cache = cronometrar(cache.obtener)
+            print(f"{minutos * args.nodos:>10} {original:>12} {agrupada:>12.2f} {tabla:>9.3f} {en_cache:>9.4f}")
+
+        cache.cerrar()
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import calendar
+import datetime
+import heapq
+import math
+import random
+import sqlite3
+
+import numpy as np
+
+import agregados
+from escritor_bd import inicializar_bd
+from tramas import FORMATO_BINARIO, FORMATO_V2, VERSION_V2
+
+
+class Invernadero:
+    # Clima sintetico de un invernadero: ciclo diario de temperatura (minimo al amanecer,
+    # maximo a media tarde), humedad que baja cuando sube la temperatura, un desfase fijo por
+    # zona y ruido AR(1) por nodo. Las tramas llegan con `jitter` segundos de desorden, se
+    # pierden sueltas con probabilidad `perdida` y cada nodo sufre `cortes_dia` cortes al dia
+    # de `duracion_corte` segundos en los que no se le oye.
+    def __init__(self, nodos=20, semilla=1, periodo=1.0, jitter=0.2, perdida=0.02,
+                 cortes_dia=0.5, duracion_corte=600, formato="v2"):
+        if not 1 <= nodos <= 255:
+            raise ValueError("DataPacket.id es un byte: de 1 a 255 nodos")
+        self.nodos = list(range(1, nodos + 1))
+        self.semilla = semilla
+        self.periodo = periodo
+        self.jitter = jitter
+        self.perdida = perdida
+        self.cortes_dia = cortes_dia
+        self.duracion_corte = duracion_corte
+        self.formato = formato
+        rng = random.Random(semilla)
+        self.zonas = {nodo: rng.uniform(-2.0, 2.0) for nodo in self.nodos}
+        self.fases = {nodo: rng.uniform(0, periodo) for nodo in self.nodos}
+        self.arranques = {nodo: rng.randint(1, 255) for nodo in self.nodos}
+
+    def clima(self, nodo, hora, ruido=0.0):
+        # hora: hora local en horas (float). Devuelve (temperatura, humedad).
+        ciclo = math.sin(2 * math.pi * (hora - 9) / 24)
+        temperatura = 21.5 + 5.0 * ciclo + self.zonas[nodo] + ruido
+        humedad = min(99.0, max(5.0, 60.0 - 15.0 * ciclo - 2.0 * self.zonas[nodo] - 3.0 * ruido))
+        return temperatura, humedad
+
+    def payload(self, nodo, temperatura, humedad, secuencia):
+        if self.formato == "v1":
+            return FORMATO_BINARIO.pack(nodo, temperatura, humedad, True)
+        return FORMATO_V2.pack(nodo, temperatura, humedad, True, secuencia % 65536, VERSION_V2,
+                               self.arranques[nodo])
+
+    def tramas(self, inicio, duracion):
+        # (t, nodo, payload) en orden de llegada entre inicio e inicio + duracion (epoch).
+        rng = random.Random(self.semilla)
+        ruido = dict.fromkeys(self.nodos, 0.0)
+        secuencias = dict.fromkeys(self.nodos, 0)
+        corte_hasta = dict.fromkeys(self.nodos, 0.0)
+        prob_corte = self.cortes_dia * self.periodo / 86400
+        pendientes = [(inicio + self.fases[nodo] + rng.uniform(0, self.jitter), nodo, 0) for nodo in self.nodos]
+        heapq.heapify(pendientes)
+        while pendientes:
+            t, nodo, ronda = heapq.heappop(pendientes)
+            if t >= inicio + duracion:
+                continue
+            siguiente = inicio + self.fases[nodo] + (ronda + 1) * self.periodo + rng.uniform(0, self.jitter)
+            heapq.heappush(pendientes, (siguiente, nodo, ronda + 1))
+            secuencia = secuencias[nodo]
+            secuencias[nodo] += 1
+            ruido[nodo] = 0.98 * ruido[nodo] + rng.gauss(0, 0.05)
+            if t < corte_hasta[nodo]:
+                continue
+            if rng.random() < prob_corte:
+                corte_hasta[nodo] = t + self.duracion_corte
+                continue
+            if rng.random() < self.perdida:
+                continue
+            local = datetime.datetime.fromtimestamp(t)
+            temperatura, humedad = self.clima(nodo, local.hour + local.minute / 60 + local.second / 3600, ruido[nodo])
+            yield t, nodo, self.payload(nodo, temperatura, humedad, secuencia)
+
+    def lecturas(self, ts_inicio, minutos, intervalo=60, nodos=None):
+        # Filas de lecturas ya consolidadas (una por nodo e intervalo), en arreglos NumPy y
+        # con la convencion de la tabla: ts local contado como UTC, valores en centesimas.
+        # `nodos` limita la salida a unos nodos, para generar historiales grandes por partes.
+        # Los minutos sin trama repiten el valor anterior con arrastrado = 1, como filas_intervalo.
+        rng = np.random.default_rng(self.semilla)
+        pasos = minutos * 60 // intervalo
+        ts = ts_inicio + np.arange(pasos, dtype=np.int64) * intervalo
+        hora = (ts % 86400) / 3600
+        ciclo = np.sin(2 * np.pi * (hora - 9) / 24)
+        partes = []
+        for nodo in nodos or self.nodos:
+            # Mismo AR(1) que tramas(), con el ruido de un intervalo entero por paso.
+            ruido = np.empty(pasos)
+            choques = rng.normal(0, 0.05 * math.sqrt(intervalo / self.periodo), pasos)
+            acumulado = 0.0
+            for i in range(pasos):
+                acumulado = 0.98 * acumulado + choques[i]
+                ruido[i] = acumulado
+            temperatura = 21.5 + 5.0 * ciclo + self.zonas[nodo] + ruido
+            humedad = np.clip(60.0 - 15.0 * ciclo - 2.0 * self.zonas[nodo] - 3.0 * ruido, 5.0, 99.0)
+
+            oido = rng.random(pasos) >= self.perdida ** max(1, intervalo / self.periodo)
+            for inicio_corte in np.flatnonzero(rng.random(pasos) < self.cortes_dia * intervalo / 86400):
+                oido[inicio_corte:inicio_corte + max(1, self.duracion_corte // intervalo)] = False
+            oido[0] = True
+            # Arrastre: cada posicion toma el indice del ultimo intervalo oido.
+            origen = np.maximum.accumulate(np.where(oido, np.arange(pasos), 0))
+            partes.append(np.rec.fromarrays([
+                np.full(pasos, nodo), ts,
+                np.round(temperatura[origen] * 100).astype(np.int64),
+                np.round(humedad[origen] * 100).astype(np.int64),
+                (~oido).astype(np.int64)]))
+        return np.concatenate(partes)
+
+
+def ts_local(fecha):
+    # Medianoche local de `fecha` en la convencion de lecturas.ts.
+    return calendar.timegm(datetime.datetime.combine(fecha, datetime.time()).timetuple())
+
+
+def poblar_bd(db_file, invernadero, dias, fin=None):
+    # Escribe `dias` dias de lecturas terminando en `fin` (por defecto, hoy a medianoche) y
+    # deja ultimas_lecturas y los agregados como los dejaria el receptor.
+    fin = fin or datetime.date.today()
+    ts_inicio = ts_local(fin - datetime.timedelta(days=dias))
+    filas = invernadero.lecturas(ts_inicio, dias * 1440)
+    conn = sqlite3.connect(db_file)
+    try:
+        inicializar_bd(conn)
+        with conn:
+            conn.executemany("INSERT OR REPLACE INTO lecturas (nodo, ts, temperatura, humedad, arrastrado) "
+                             "VALUES (?, ?, ?, ?, ?)", filas.tolist())
+            conn.execute("DELETE FROM ultimas_lecturas")
+        inicializar_bd(conn)
+        agregados.reconstruir(conn)
+    finally:
+        conn.close()
+    return len(filas)
@@ -0,0 +1,100 @@
+import sys
+import threading
+import time
+import types
+from collections import deque
+
+PROFUNDIDAD_FIFO = 3
+TIEMPO_AIRE = 0.0003
+
+
+class RadioSimulada:
+    # Imita la API de RF24 usada por recepcion.py con una FIFO RX de 3 niveles.
+    def __init__(self, ce_pin=None, csn_pin=None, tam_payload=32):
+        self.tam_payload = tam_payload
+        self.fifo = deque()
+        self.lock = threading.Lock()
+        self.al_irq = None
+        self.enviadas = 0
+        self.perdidas_fifo = 0
+
+    def begin(self):
+        return True
+
+    def setPALevel(self, nivel):
+        pass
+
+    def setDataRate(self, tasa):
+        pass
+
+    def setChannel(self, canal):
+        pass
+
+    def openReadingPipe(self, pipe, direccion):
+        pass
+
+    def startListening(self):
+        pass
+
+    def maskIRQ(self, tx_ok, tx_fail, rx_ready):
+        pass
+
+    def whatHappened(self):
+        return False, False, False
+
+    def getPayloadSize(self):
+        return self.tam_payload
+
+    def available(self):
+        with self.lock:
+            return bool(self.fifo)
+
+    def read(self, longitud):
+        with self.lock:
+            payload = self.fifo.popleft() if self.fifo else b""
+        return payload[:longitud].ljust(longitud, b"\x00")
+
+    def transmitir(self, payload):
+        with self.lock:
+            self.enviadas += 1
+            if len(self.fifo) >= PROFUNDIDAD_FIFO:
+                self.perdidas_fifo += 1
+                return False
+            self.fifo.append(bytes(payload))
+        if self.al_irq:
+            self.al_irq()
+        return True
+
+
+class Emisor(threading.Thread):
+    # Cada periodo todos los nodos transmiten en rafaga, como ocurre con varios ESP32 en paralelo.
+    def __init__(self, radio, generar_payload, nodos, frecuencia_hz, duracion):
+        super().__init__(daemon=True)
+        self.radio = radio
+        self.generar_payload = generar_payload
+        self.nodos = nodos
+        self.periodo = 1.0 / frecuencia_hz
+        self.duracion = duracion
+
+    def run(self):
+        inicio = time.monotonic()
+        ronda = 0
+        while time.monotonic() - inicio < self.duracion:
+            for nodo in self.nodos:
+                self.radio.transmitir(self.generar_payload(nodo, ronda))
+                time.sleep(TIEMPO_AIRE)
+            ronda += 1
+            espera = inicio + ronda * self.periodo - time.monotonic()
+            if espera > 0:
+                time.sleep(espera)
+
+
+def instalar_modulo_rf24():
+    # Registra un modulo RF24 falso para importar recepcion.py sin hardware.
+    modulo = types.ModuleType("RF24")
+    modulo.RF24 = RadioSimulada
+    modulo.RF24_PA_LOW = 1
+    modulo.RF24_1MBPS = 0
+    modulo.RF24_250KBPS = 2
+    sys.modules["RF24"] = modulo
+    return modulo
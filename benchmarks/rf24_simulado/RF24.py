@@ -0,0 +1,72 @@
+# Sustituto del modulo RF24 para ejecutar recepcion.py sin hardware y sin tocarlo:
+#
+#   PYTHONPATH=benchmarks/rf24_simulado python recepcion.py --silencioso
+#
+# Al llamar a begin() un hilo emite en tiempo real las tramas de benchmarks.generador.Invernadero
+# sobre una RadioSimulada. Se configura con variables de entorno:
+#   RF24_NODOS (20), RF24_PERIODO (1.0 s), RF24_JITTER (0.2 s), RF24_PERDIDA (0.02),
+#   RF24_CORTES_DIA (0.5), RF24_SEMILLA (1), RF24_FORMATO (v2 o v1), RF24_VELOCIDAD (1.0,
+#   mas rapido que el reloj si es mayor) y RF24_INFORME (ruta donde dejar, al salir, un JSON
+#   con las tramas emitidas y las perdidas en la FIFO).
+import atexit
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from benchmarks.generador import Invernadero
+from benchmarks.radio_simulada import RadioSimulada
+
+RF24_PA_MIN = 0
+RF24_PA_LOW = 1
+RF24_PA_HIGH = 2
+RF24_PA_MAX = 3
+RF24_1MBPS = 0
+RF24_2MBPS = 1
+RF24_250KBPS = 2
+
+
+def _entorno(nombre, defecto, tipo=float):
+    return tipo(os.environ.get(nombre, defecto))
+
+
+class RF24(RadioSimulada):
+    def __init__(self, ce_pin=None, csn_pin=None):
+        super().__init__(ce_pin, csn_pin)
+        self.invernadero = Invernadero(
+            nodos=_entorno("RF24_NODOS", 20, int), semilla=_entorno("RF24_SEMILLA", 1, int),
+            periodo=_entorno("RF24_PERIODO", 1.0), jitter=_entorno("RF24_JITTER", 0.2),
+            perdida=_entorno("RF24_PERDIDA", 0.02), cortes_dia=_entorno("RF24_CORTES_DIA", 0.5),
+            formato=os.environ.get("RF24_FORMATO", "v2"))
+        self.velocidad = _entorno("RF24_VELOCIDAD", 1.0)
+        self.aceptadas = 0
+        self._hilo = None
+
+    def begin(self):
+        self._hilo = threading.Thread(target=self._emitir, name="rf24-simulado", daemon=True)
+        self._hilo.start()
+        informe = os.environ.get("RF24_INFORME")
+        if informe:
+            atexit.register(self._informar, informe)
+        return True
+
+    def _emitir(self):
+        inicio = time.time()
+        # Un dia de tramas como maximo; el receptor se para con Ctrl+C antes.
+        for t, _, payload in self.invernadero.tramas(inicio, 86400):
+            espera = inicio + (t - inicio) / self.velocidad - time.time()
+            if espera > 0:
+                time.sleep(espera)
+            if self.transmitir(payload):
+                self.aceptadas += 1
+
+    def isChipConnected(self):
+        return True
+
+    def _informar(self, ruta):
+        with open(ruta, "w", encoding="utf-8") as f:
+            json.dump({"enviadas": self.enviadas, "aceptadas_fifo": self.aceptadas,
+                       "perdidas_fifo": self.perdidas_fifo}, f)
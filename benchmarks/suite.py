@@ -0,0 +1,254 @@
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import signal
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use("Agg")
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from alertas import MotorAlertas
+from benchmarks.generador import Invernadero, poblar_bd
+from consultas import UltimasLecturas, consultar_series
+from escritor_bd import EscritorSensores
+from exportacion import exportar_dias, rango_dia
+from graficas_vivas import GraficaViva
+from recepcion import Acumulador
+from series import cargar_series
+from tramas import DecodificadorTramas
+
+RUTA_BASE = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CASOS = ("ingesta", "recepcion", "consultas", "guardar_grafica", "graficas")
+# Sufijo del nombre de cada resultado -> True si mas es mejor. El resto es informativo.
+SENTIDOS = {"_por_s": True, "_ms": False, "_pct": False}
+
+
+def mediana_ms(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return round(statistics.median(tiempos), 3)
+
+
+def caso_ingesta(args, db_file):
+    # Decodificacion, deduplicado, alertas y escritura de las tramas de args.segundos segundos
+    # de invernadero, sin hilos ni esperas: el techo de lo que puede guardar el receptor.
+    invernadero = Invernadero(args.nodos, semilla=args.semilla, jitter=args.jitter, perdida=args.perdida)
+    tramas = list(invernadero.tramas(time.time() - args.segundos_ingesta, args.segundos_ingesta))
+    decodificar = DecodificadorTramas()
+    with tempfile.TemporaryDirectory() as tmp:
+        escritor = EscritorSensores(os.path.join(tmp, "ingesta.db"))
+        acumulador = Acumulador(escritor, verboso=False, alertas=MotorAlertas())
+        inicio = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i, (recibida, _, payload) in enumerate(tramas):
+                trama = decodificar(payload)
+                if trama is not None:
+                    acumulador.al_recibir(trama, recibida)
+                if i % 1000 == 0:
+                    escritor.revisar()
+            escritor.cerrar()
+        duracion = time.perf_counter() - inicio
+    return {"tramas": len(tramas), "tramas_por_s": round(len(tramas) / duracion),
+            "perdidas_detectadas": acumulador.perdidas}
+
+
+def caso_recepcion(args, db_file):
+    # recepcion.py sin modificar, con el RF24 simulado, durante args.segundos_recepcion.
+    with tempfile.TemporaryDirectory() as tmp:
+        informe = os.path.join(tmp, "rf24.json")
+        entorno = dict(os.environ, PYTHONPATH=os.path.join(RUTA_BASE, "benchmarks", "rf24_simulado"),
+                       RF24_NODOS=str(args.nodos), RF24_SEMILLA=str(args.semilla), RF24_JITTER=str(args.jitter),
+                       RF24_PERDIDA=str(args.perdida), RF24_VELOCIDAD=str(args.velocidad), RF24_INFORME=informe)
+        proceso = subprocess.Popen([sys.executable, os.path.join(RUTA_BASE, "recepcion.py"), "--silencioso"],
+                                   cwd=tmp, env=entorno, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        time.sleep(args.segundos_recepcion)
+        proceso.send_signal(signal.SIGINT)
+        _, errores = proceso.communicate(timeout=60)
+        if proceso.returncode != 0:
+            raise RuntimeError(f"recepcion.py termino con {proceso.returncode}: {errores.decode()[-500:]}")
+        with open(informe, encoding="utf-8") as f:
+            radio = json.load(f)
+        conn = sqlite3.connect(os.path.join(tmp, "datos_sensores.db"))
+        guardadas = conn.execute("SELECT COUNT(*) FROM tramas_recibidas").fetchone()[0]
+        conn.close()
+    return {"emitidas": radio["enviadas"], "guardadas": guardadas,
+            "guardadas_por_s": round(guardadas / args.segundos_recepcion),
+            "perdida_fifo_pct": round(100 * radio["perdidas_fifo"] / max(1, radio["enviadas"]), 2),
+            "perdida_pct": round(100 * (radio["enviadas"] - guardadas) / max(1, radio["enviadas"]), 2)}
+
+
+def caso_consultas(args, db_file):
+    # Lo que antes hacia obtener_datos: el dia de un nodo y de todos, crudo y agregado.
+    desde, hasta = rango_dia(args.dia)
+    nodos = list(range(1, min(args.nodos, 4) + 1))
+
+    def ultimas_en_frio():
+        ultimas = UltimasLecturas(db_file)
+        ultimas.obtener_con_alertas()
+        ultimas.cerrar()
+
+    r = args.repeticiones
+    return {
+        "dia_nodo_crudo_ms": mediana_ms(lambda: consultar_series(desde, hasta, 1, [1], db_file), r),
+        "dia_todos_15min_ms": mediana_ms(lambda: consultar_series(desde, hasta, 15, None, db_file), r),
+        "dia_nodos_numpy_5min_ms": mediana_ms(lambda: cargar_series(desde, hasta, 5, nodos, db_file), r),
+        "semana_todos_hora_ms": mediana_ms(lambda: cargar_series(
+            f"{args.dia - datetime.timedelta(days=6)} 00:00:00", hasta, 60, None, db_file), r),
+        "ultimas_lecturas_ms": mediana_ms(ultimas_en_frio, r),
+    }
+
+
+def caso_guardar_grafica(args, db_file):
+    # Camino de guardar_grafica: una PNG por nodo del dia, en el pool de procesos.
+    with tempfile.TemporaryDirectory() as tmp:
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            generadas, _ = exportar_dias([args.dia], 30, forzar=True, db_file=db_file, ruta_graficas=tmp)
+            completa = time.perf_counter() - inicio
+            inicio = time.perf_counter()
+            _, omitidas = exportar_dias([args.dia], 30, db_file=db_file, ruta_graficas=tmp)
+            sin_cambios = time.perf_counter() - inicio
+    return {"graficas": len(generadas), "dia_completo_ms": round(completa * 1000, 3),
+            "por_grafica_ms": round(completa * 1000 / max(1, len(generadas)), 3),
+            "sin_cambios_ms": round(sin_cambios * 1000, 3), "omitidas": omitidas}
+
+
+def caso_graficas(args, db_file):
+    # Pantalla Graficas con el backend Agg: consulta del dia de un nodo, lineas y dibujo.
+    desde, hasta = rango_dia(args.dia)
+    fig = Figure(figsize=(14, 8))
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.subplots()
+    ax2 = ax.twinx()
+    viva = GraficaViva(canvas, bucket_minutos=5, db_file=db_file)
+    viva.agregar_linea(ax, 1, "temperatura", "ro-", banda="red")
+    viva.agregar_linea(ax2, 1, "humedad", "bo-", banda="blue")
+
+    def nodo_completo():
+        viva.mostrar(viva.consultar(desde, hasta, [1], 5))
+        canvas.draw()
+
+    inicio = time.perf_counter()
+    viva.mostrar(viva.consultar(desde, hasta, [1], 5))
+    canvas.draw()
+    primera = (time.perf_counter() - inicio) * 1000
+
+    # Comparacion de todos los nodos, como CompararNodos.
+    fig_todos = Figure(figsize=(14, 8))
+    canvas_todos = FigureCanvasAgg(fig_todos)
+    ax_todos = fig_todos.subplots()
+    todos = GraficaViva(canvas_todos, bucket_minutos=5, db_file=db_file)
+    for nodo in range(1, args.nodos + 1):
+        todos.agregar_linea(ax_todos, nodo, "temperatura", "-")
+
+    def comparacion():
+        todos.mostrar(todos.consultar(desde, hasta, todos.nodos(), 5))
+        canvas_todos.draw()
+
+    return {"primera_ms": round(primera, 3), "nodo_ms": mediana_ms(nodo_completo, args.repeticiones),
+            "comparacion_ms": mediana_ms(comparacion, args.repeticiones)}
+
+
+def commit_actual():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=RUTA_BASE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def ejecutar(args):
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        db_file = os.path.join(tmp, "suite.db")
+        inicio = time.perf_counter()
+        filas = poblar_bd(db_file, Invernadero(args.nodos, semilla=args.semilla, perdida=args.perdida),
+                          args.dias, args.dia + datetime.timedelta(days=1))
+        print(f"BD sintetica: {args.nodos} nodos x {args.dias} dias, {filas} filas en "
+              f"{time.perf_counter() - inicio:.1f} s")
+        for caso in args.casos:
+            inicio = time.perf_counter()
+            resultados[caso] = globals()[f"caso_{caso}"](args, db_file)
+            print(f"{caso:>16} ({time.perf_counter() - inicio:5.1f} s): {resultados[caso]}")
+    return {
+        "commit": commit_actual(),
+        "fecha": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "maquina": f"{platform.system()} {platform.machine()}",
+        "parametros": {clave: str(valor) if isinstance(valor, datetime.date) else valor
+                       for clave, valor in vars(args).items() if clave not in ("salida", "comparar")},
+        "resultados": resultados,
+    }
+
+
+def comparar(ruta_base, ruta_nueva, umbral):
+    # Devuelve el numero de resultados que empeoran mas que `umbral` (fraccion).
+    with open(ruta_base, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(ruta_nueva, encoding="utf-8") as f:
+        nueva = json.load(f)
+    print(f"{base.get('commit')} -> {nueva.get('commit')}")
+    print(f"{'resultado':>40} {'antes':>12} {'despues':>12} {'cambio':>8}")
+    peores = 0
+    for caso, valores in nueva["resultados"].items():
+        for nombre, valor in valores.items():
+            anterior = base["resultados"].get(caso, {}).get(nombre)
+            sentido = next((mas for sufijo, mas in SENTIDOS.items() if nombre.endswith(sufijo)), None)
+            if anterior is None or sentido is None or not anterior:
+                continue
+            cambio = valor / anterior - 1
+            empeora = -cambio if sentido else cambio
+            marca = "  PEOR" if empeora > umbral else "  mejor" if empeora < -umbral else ""
+            peores += empeora > umbral
+            print(f"{caso + '.' + nombre:>40} {anterior:12g} {valor:12g} {cambio:+8.1%}{marca}")
+    return peores
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Suite de rendimiento sobre un invernadero sintetico. "
+                                                 "Guarda un JSON que se puede comparar entre commits.")
+    parser.add_argument("--casos", nargs="+", choices=CASOS, default=list(CASOS))
+    parser.add_argument("--nodos", type=int, default=40)
+    parser.add_argument("--dias", type=int, default=7, help="historial de la BD sintetica")
+    parser.add_argument("--dia", type=datetime.date.fromisoformat,
+                        default=datetime.date.today() - datetime.timedelta(days=1),
+                        help="ultimo dia del historial y dia que se consulta y dibuja")
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--jitter", type=float, default=0.2, help="desorden de llegada de las tramas (s)")
+    parser.add_argument("--perdida", type=float, default=0.02, help="probabilidad de perder cada trama")
+    parser.add_argument("--segundos-ingesta", type=int, default=3600, help="segundos de tramas para ingesta")
+    parser.add_argument("--segundos-recepcion", type=float, default=10.0)
+    parser.add_argument("--velocidad", type=float, default=5.0, help="aceleracion del reloj del RF24 simulado")
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--salida", help="archivo JSON de resultados")
+    parser.add_argument("--comparar", nargs=2, metavar=("ANTES", "DESPUES"),
+                        help="comparar dos JSON de resultados en lugar de medir")
+    parser.add_argument("--umbral", type=float, default=0.10, help="empeoramiento tolerado al comparar")
+    args = parser.parse_args()
+
+    if args.comparar:
+        return 1 if comparar(*args.comparar, args.umbral) else 0
+    resultado = ejecutar(args)
+    if args.salida:
+        with open(args.salida, "w", encoding="utf-8") as f:
+            json.dump(resultado, f, indent=2)
+        print(f"Resultados en {args.salida}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
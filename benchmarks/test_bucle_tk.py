@@ -0,0 +1,140 @@
+import datetime
+import statistics
+import time
+
+import pytest
+
+tk = pytest.importorskip("tkinter")
+Image = pytest.importorskip("PIL.Image")
+
+from benchmarks.generador import Invernadero, poblar_bd  # noqa: E402
+
+LIMITE_MS = 16
+NODOS = 20
+GRAFICAS_GUARDADAS = 12
+# Tiempo entre acciones del guion: da para que llegue el resultado de cada una.
+PAUSA_MS = 600
+
+
+class Latido:
+    # Un after() periodico: el retraso respecto a la hora prevista es lo que estuvo bloqueado el bucle.
+    def __init__(self, root, periodo_ms=5):
+        self.root = root
+        self.periodo_ms = periodo_ms
+        self.retrasos = []
+        self.previsto = None
+        self.accion = "inicio"
+        self.peor = (0.0, None)
+
+    def iniciar(self):
+        self.previsto = time.perf_counter() + self.periodo_ms / 1000
+        self.root.after(self.periodo_ms, self._latir)
+
+    def _latir(self):
+        ahora = time.perf_counter()
+        retraso = (ahora - self.previsto) * 1000
+        self.retrasos.append(retraso)
+        if retraso > self.peor[0]:
+            self.peor = (retraso, self.accion)
+        self.previsto = ahora + self.periodo_ms / 1000
+        self.root.after(self.periodo_ms, self._latir)
+
+
+def esperar(app, condicion, limite=60):
+    fin = time.monotonic() + limite
+    while not condicion():
+        assert time.monotonic() < fin, "la interfaz no termino de cargar"
+        app.update()
+        time.sleep(0.01)
+
+
+def ocioso(app):
+    # Sin tareas en el planificador ni dibujos en curso.
+    lienzos = [frame.canvas for frame in app.frames.values() if hasattr(frame, "canvas")]
+    return not app.tareas.activas and not any(lienzo.dibujando or lienzo.id_dibujo for lienzo in lienzos)
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    try:
+        tk.Tk().destroy()
+    except tk.TclError as e:
+        pytest.skip(f"se necesita un display (por ejemplo xvfb-run python -m pytest): {e}")
+    monkeypatch.chdir(tmp_path)
+    # El historial termina anteayer: sin datos de ayer la exportacion del arranque no tiene trabajo.
+    poblar_bd(str(tmp_path / "datos_sensores.db"), Invernadero(NODOS), dias=3,
+              fin=datetime.date.today() - datetime.timedelta(days=1))
+    graficas = tmp_path / "graficas"
+    graficas.mkdir()
+    for i in range(GRAFICAS_GUARDADAS):
+        fecha = datetime.date.today() - datetime.timedelta(days=2 + i // 4)
+        Image.effect_noise((2800, 1600), 64).convert("RGB").save(graficas / f"grafica_nodo{i % 4 + 1}_{fecha}.png")
+
+    import interfaz_1
+    monkeypatch.setattr(interfaz_1, "RUTA_GRAFICAS", str(graficas))
+    monkeypatch.setattr(interfaz_1, "RUTA_CACHE", str(tmp_path / "cache" / "galeria"))
+    monkeypatch.setattr(interfaz_1, "RUTA_ICONOS", str(tmp_path / "cache" / "iconos"))
+    app = interfaz_1.InterfazSensores()
+    yield app
+    app.destroy()
+
+
+def test_bucle_principal_no_se_bloquea(app):
+    import interfaz_1
+
+    # Construir cada pantalla (widgets y figura) se hace una vez en el hilo de Tk y queda fuera
+    # de la medida, igual que las tareas del arranque (exportacion de ayer e importaciones diferidas).
+    esperar(app, lambda: app.tareas.completadas >= 2 and ocioso(app))
+    app.mostrar_frame(interfaz_1.Graficas)
+    graficas = app.frames[interfaz_1.Graficas]
+    esperar(app, lambda: not graficas.pendiente and ocioso(app))
+    app.mostrar_frame(interfaz_1.CompararNodos)
+    esperar(app, lambda: not app.frames[interfaz_1.CompararNodos].pendiente and ocioso(app))
+    app.mostrar_frame(interfaz_1.ImagenesGuardadas)
+    imagenes = app.frames[interfaz_1.ImagenesGuardadas]
+    esperar(app, lambda: imagenes.lista_imagenes and ocioso(app))
+    app.mostrar_frame(interfaz_1.MenuPrincipal)
+    esperar(app, lambda: ocioso(app))
+
+    def nodo(numero):
+        graficas.nodo_var.set(numero)
+        graficas.mostrar_grafica()
+
+    # Lo que hace alguien en la pantalla: cambiar de pantalla, de nodo, de intervalo y de imagen.
+    guion = [("Graficas", lambda: app.mostrar_frame(interfaz_1.Graficas))]
+    guion += [(f"nodo {n}", lambda n=n: nodo(n)) for n in (2, 3, 4, 5)]
+    guion += [("intervalo 5", lambda: graficas.set_intervalo(5)),
+              ("intervalo 60", lambda: graficas.set_intervalo(60)),
+              ("ImagenesGuardadas", lambda: app.mostrar_frame(interfaz_1.ImagenesGuardadas))]
+    guion += [("siguiente imagen", imagenes.siguiente_imagen) for _ in range(6)]
+    guion += [("anterior imagen", imagenes.anterior_imagen) for _ in range(2)]
+    guion += [("Graficas", lambda: app.mostrar_frame(interfaz_1.Graficas)),
+              ("nodo 1", lambda: nodo(1)),
+              ("CompararNodos", lambda: app.mostrar_frame(interfaz_1.CompararNodos))]
+
+    latido = Latido(app)
+
+    def paso(i=0):
+        if i == len(guion):
+            esperar_fin()
+            return
+        latido.accion, accion = guion[i]
+        accion()
+        app.after(PAUSA_MS, paso, i + 1)
+
+    def esperar_fin():
+        if ocioso(app):
+            app.quit()
+        else:
+            app.after(50, esperar_fin)
+
+    latido.iniciar()
+    app.after(PAUSA_MS, paso)
+    app.mainloop()
+
+    retrasos = sorted(latido.retrasos)
+    peor, accion = latido.peor
+    assert len(retrasos) > len(guion) * PAUSA_MS / 20, "el latido casi no se ejecuto"
+    assert peor <= LIMITE_MS, (f"el bucle principal se bloqueo {peor:.1f} ms tras '{accion}' "
+                               f"(mediana {statistics.median(retrasos):.2f} ms, p99 "
+                               f"{retrasos[int(len(retrasos) * 0.99) - 1]:.2f} ms)")
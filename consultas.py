@@ -0,0 +1,193 @@
+import datetime
+import sqlite3
+import threading
+from collections import namedtuple
+
+import metricas
+import retencion
+from agregados import NIVELES, nivel_para
+from escritor_bd import inicializar_bd
+
+DB_FILE = "datos_sensores.db"
+FORMATO_MARCA = "%Y-%m-%d %H:%M:%S"
+EPOCA = datetime.datetime(1970, 1, 1)
+
+LATENCIA_CONSULTA = metricas.histograma("invernadero_consulta_segundos", "Duracion de las lecturas de la BD",
+                                        "consulta")
+
+# Columnas paralelas, una entrada por cubeta de tiempo.
+Serie = namedtuple("Serie", ["marcas", "temperatura", "temperatura_min", "temperatura_max",
+                             "humedad", "humedad_min", "humedad_max", "muestras"])
+
+# lecturas.ts es la hora local contada como si fuera UTC (lo que da strftime('%s')), lo que
+# basta para agrupar en cubetas alineadas a la hora local y volver a convertirlas con EPOCA.
+# Los valores estan en centesimas.
+SQL_SERIES = """
+    SELECT nodo, (ts / :segundos) * :segundos AS cubeta,
+           AVG(temperatura) / 100.0, MIN(temperatura) / 100.0, MAX(temperatura) / 100.0,
+           AVG(humedad) / 100.0, MIN(humedad) / 100.0, MAX(humedad) / 100.0, COUNT(*)
+    FROM lecturas
+    WHERE ts >= :ts_desde AND ts < :ts_hasta AND arrastrado = 0 {filtro_nodos}
+    GROUP BY nodo, cubeta
+    ORDER BY nodo, cubeta
+"""
+
+# Misma forma de resultado, pero leyendo el agregado precalculado mas grueso que sirve.
+SQL_SERIES_AGREGADOS = """
+    SELECT nodo, (CAST(strftime('%s', cubeta) AS INTEGER) / :segundos) * :segundos AS grupo,
+           SUM(temperatura_suma) / SUM(muestras), MIN(temperatura_min), MAX(temperatura_max),
+           SUM(humedad_suma) / SUM(muestras), MIN(humedad_min), MAX(humedad_max), SUM(muestras)
+    FROM {tabla}
+    WHERE cubeta >= :desde AND cubeta < :hasta {filtro_nodos}
+    GROUP BY nodo, grupo
+    ORDER BY nodo, grupo
+"""
+
+SQL_COLUMNAS = """
+    SELECT nodo, ts, temperatura / 100.0, humedad / 100.0
+    FROM lecturas
+    WHERE ts >= :ts_desde AND ts < :ts_hasta AND arrastrado = 0 {filtro_nodos}
+    ORDER BY nodo, ts
+"""
+
+
+class UltimasLecturas:
+    # Cache en proceso de la tabla ultimas_lecturas. PRAGMA data_version solo cambia
+    # cuando otra conexion (el receptor) confirma una transaccion, asi que mientras
+    # no haya datos nuevos no se vuelve a consultar la tabla.
+    # Puede usarse desde los hilos de trabajo de la interfaz; la conexion se serializa con un lock.
+    def __init__(self, db_file=DB_FILE):
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        inicializar_bd(self.conn)
+        self.lock = threading.Lock()
+        self.version = None
+        self.lecturas = {}
+        self.alertas = {}
+
+    def obtener(self):
+        return self.obtener_con_alertas()[0]
+
+    def obtener_con_alertas(self):
+        # alertas: {nodo: [(regla, desde, mensaje), ...]} de la tabla alertas_activas.
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version != self.version:
+                with LATENCIA_CONSULTA.medir("ultimas"):
+                    cursor = self.conn.execute("SELECT nodo, marca_tiempo, temperatura, humedad FROM ultimas_lecturas")
+                    self.lecturas = {nodo: (marca, temp, hum) for nodo, marca, temp, hum in cursor}
+                    alertas = {}
+                    for nodo, regla, desde, mensaje in self.conn.execute(
+                            "SELECT nodo, regla, desde, mensaje FROM alertas_activas ORDER BY desde"):
+                        alertas.setdefault(nodo, []).append((regla, desde, mensaje))
+                self.alertas = alertas
+                self.version = version
+            return self.lecturas, self.alertas
+
+    def cerrar(self):
+        self.conn.close()
+
+
+def formatear_marca(valor):
+    if isinstance(valor, str):
+        return valor
+    if isinstance(valor, datetime.datetime):
+        return valor.strftime(FORMATO_MARCA)
+    return f"{valor} 00:00:00"
+
+
+def a_segundos(valor):
+    return int((datetime.datetime.fromisoformat(formatear_marca(valor)) - EPOCA).total_seconds())
+
+
+def serie_vacia():
+    return Serie([], [], [], [], [], [], [], [])
+
+
+def filtro_por_nodos(parametros, nodos):
+    if nodos is None:
+        # Las claves empiezan por nodo: se recorre nodo a nodo en lugar de toda la tabla.
+        return "AND nodo IN (SELECT nodo FROM ultimas_lecturas)"
+    parametros.update({f"n{i}": nodo for i, nodo in enumerate(nodos)})
+    return f"AND nodo IN ({', '.join(f':n{i}' for i in range(len(nodos)))})"
+
+
+def parametros_rango(desde, hasta):
+    return {
+        "desde": formatear_marca(desde) if desde is not None else "",
+        "hasta": formatear_marca(hasta) if hasta is not None else "9999",
+        "ts_desde": a_segundos(desde) if desde is not None else 0,
+        "ts_hasta": a_segundos(hasta) if hasta is not None else 2 ** 62,
+    }
+
+
+def construir_consulta(desde=None, hasta=None, bucket_minutos=1, nodos=None):
+    parametros = parametros_rango(desde, hasta)
+    parametros["segundos"] = max(1, int(bucket_minutos)) * 60
+    filtro_nodos = filtro_por_nodos(parametros, nodos)
+
+    nivel = nivel_para(parametros["segundos"] // 60)
+    if nivel is None:
+        sql = SQL_SERIES.format(filtro_nodos=filtro_nodos)
+    else:
+        sql = SQL_SERIES_AGREGADOS.format(tabla=NIVELES[nivel], filtro_nodos=filtro_nodos)
+    return sql, parametros
+
+
+def consultar_series(desde=None, hasta=None, bucket_minutos=1, nodos=None, db_file=DB_FILE):
+    with LATENCIA_CONSULTA.medir("series"):
+        return _consultar_series(desde, hasta, bucket_minutos, nodos, db_file)
+
+
+def _consultar_series(desde, hasta, bucket_minutos, nodos, db_file):
+    if nodos is not None:
+        nodos = list(nodos)
+        if not nodos:
+            return {}
+    sql, parametros = construir_consulta(desde, hasta, bucket_minutos, nodos)
+
+    conn = sqlite3.connect(db_file)
+    try:
+        if nivel_para(parametros["segundos"] // 60) is None:
+            # Lecturas crudas: el rango puede empezar en los archivos mensuales.
+            cursores = retencion.consultar_tramos(conn, db_file, sql, parametros)
+        else:
+            cursores = [conn.execute(sql, parametros)]
+        series = {}
+        for cursor in cursores:
+            for nodo, cubeta, *valores in cursor:
+                serie = series.get(nodo)
+                if serie is None:
+                    serie = series[nodo] = serie_vacia()
+                serie.marcas.append(EPOCA + datetime.timedelta(seconds=cubeta))
+                for columna, valor in zip(serie[1:], valores):
+                    columna.append(valor)
+    finally:
+        conn.close()
+    return series
+
+
+def consultar_serie(nodo, desde=None, hasta=None, bucket_minutos=1, db_file=DB_FILE):
+    return consultar_series(desde, hasta, bucket_minutos, [nodo], db_file).get(nodo, serie_vacia())
+
+
+def ultimo_dia_con_datos(nodo=None, db_file=DB_FILE):
+    conn = sqlite3.connect(db_file)
+    try:
+        if nodo is None:
+            ultima = conn.execute("SELECT MAX(marca_tiempo) FROM ultimas_lecturas").fetchone()[0]
+        else:
+            ultima = conn.execute("SELECT marca_tiempo FROM ultimas_lecturas WHERE nodo = ?", (nodo,)).fetchone()
+            ultima = ultima and ultima[0]
+    finally:
+        conn.close()
+    if not ultima:
+        return None
+    return datetime.date.fromisoformat(ultima[:10])
+
+
+def preparar_bd(db_file=DB_FILE):
+    conn = sqlite3.connect(db_file)
+    try:
+        inicializar_bd(conn)
+    finally:
+        conn.close()
@@ -0,0 +1,320 @@
+import sqlite3
+import time
+
+import agregados
+import metricas
+import migracion
+import retencion
+
+# Filas de sensores: (marca_tiempo, nodo, temperatura, humedad, arrastrado). arrastrado = 1
+# indica que el nodo no envio nada en ese intervalo y se repitio su ultimo valor.
+# Se guardan en lecturas: ts en segundos de la hora local (la convencion de strftime('%s'))
+# y los valores en centesimas.
+SQL_INSERTAR = """
+    INSERT INTO lecturas (nodo, ts, temperatura, humedad, arrastrado)
+    VALUES (?2, CAST(strftime('%s', ?1) AS INTEGER), CAST(round(?3 * 100) AS INTEGER),
+            CAST(round(?4 * 100) AS INTEGER), ?5)
+    ON CONFLICT(nodo, ts) DO UPDATE SET
+    temperatura = excluded.temperatura,
+    humedad = excluded.humedad,
+    arrastrado = excluded.arrastrado
+"""
+
+# Igual, pero sin tocar las filas que ya existen: rowcount dice cuantas eran nuevas.
+SQL_INSERTAR_NUEVA = """
+    INSERT OR IGNORE INTO lecturas (nodo, ts, temperatura, humedad, arrastrado)
+    VALUES (?2, CAST(strftime('%s', ?1) AS INTEGER), CAST(round(?3 * 100) AS INTEGER),
+            CAST(round(?4 * 100) AS INTEGER), ?5)
+"""
+
+SQL_ULTIMA_LECTURA = """
+    INSERT INTO ultimas_lecturas (marca_tiempo, nodo, temperatura, humedad)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT(nodo) DO UPDATE SET
+    marca_tiempo = excluded.marca_tiempo,
+    temperatura = excluded.temperatura,
+    humedad = excluded.humedad
+    WHERE excluded.marca_tiempo >= ultimas_lecturas.marca_tiempo
+"""
+
+# Registro de solo anadir con cada trama recibida; permite reconstruir los intervalos
+# que no llegaron a consolidarse si el receptor se detiene.
+SQL_REGISTRAR_TRAMA = """
+    INSERT INTO tramas_recibidas (recibida, nodo, secuencia, temperatura, humedad, antena, arranque)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_GUARDAR_ESTADO = """
+    INSERT INTO estado_ingesta (clave, valor) VALUES (?, ?)
+    ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor
+"""
+
+# Eventos del motor de alertas (alertas.Evento). alertas_activas es el resumen que lee la
+# interfaz: una fila por (nodo, regla) mientras la alerta sigue abierta.
+SQL_REGISTRAR_EVENTO = """
+    INSERT INTO eventos (recibida, nodo, regla, metrica, estado, valor, mensaje)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+"""
+
+SQL_ABRIR_ALERTA = """
+    INSERT INTO alertas_activas (nodo, regla, desde, metrica, valor, mensaje)
+    VALUES (?, ?, ?, ?, ?, ?)
+    ON CONFLICT(nodo, regla) DO UPDATE SET
+    desde = excluded.desde, metrica = excluded.metrica, valor = excluded.valor, mensaje = excluded.mensaje
+"""
+
+# Dias de tramas crudas que se conservan despues de consolidarlas.
+RETENCION_TRAMAS = 2
+PERIODO_RETENCION = 3600
+PERIODO_CHECKPOINT = 15 * 60
+# Tope del WAL tras cada checkpoint, para no dejar archivos grandes en la SD.
+LIMITE_WAL = 4 * 1024 * 1024
+
+LATENCIA_COMMIT = metricas.histograma("invernadero_commit_segundos", "Duracion de cada transaccion del escritor")
+
+
+def inicializar_bd(conn):
+    cursor = conn.cursor()
+    # Solo surte efecto en una BD nueva o en el proximo VACUUM; permite devolver paginas con incremental_vacuum.
+    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL;")
+    cursor.execute("PRAGMA journal_mode=WAL;")
+    cursor.execute('''CREATE TABLE IF NOT EXISTS estado_ingesta (
+                        clave TEXT PRIMARY KEY,
+                        valor)''')
+    # Clave (nodo, ts) sin rowid: las consultas de un nodo en un rango leen filas contiguas.
+    cursor.execute('''CREATE TABLE IF NOT EXISTS lecturas (
+                        nodo INTEGER,
+                        ts INTEGER,
+                        temperatura INTEGER,
+                        humedad INTEGER,
+                        arrastrado INTEGER NOT NULL DEFAULT 0,
+                        PRIMARY KEY (nodo, ts)) WITHOUT ROWID''')
+    # sensores queda como vista con el formato anterior; si existe la tabla antigua se migra.
+    migracion.preparar(conn)
+    # Una fila por nodo con su lectura mas reciente, para que el tablero no recorra el historial.
+    cursor.execute('''CREATE TABLE IF NOT EXISTS ultimas_lecturas (
+                        nodo INTEGER PRIMARY KEY,
+                        marca_tiempo TEXT,
+                        temperatura REAL,
+                        humedad REAL)''')
+    if cursor.execute("SELECT 1 FROM ultimas_lecturas LIMIT 1").fetchone() is None:
+        # Con un unico MAX() SQLite toma las demas columnas de la fila del maximo.
+        cursor.execute("""
+            INSERT INTO ultimas_lecturas (nodo, marca_tiempo, temperatura, humedad)
+            SELECT nodo, MAX(marca_tiempo), temperatura, humedad
+            FROM sensores
+            WHERE arrastrado = 0
+            GROUP BY nodo
+        """)
+    cursor.execute('''CREATE TABLE IF NOT EXISTS tramas_recibidas (
+                        recibida REAL,
+                        nodo INTEGER,
+                        secuencia INTEGER,
+                        temperatura REAL,
+                        humedad REAL,
+                        antena INTEGER,
+                        arranque INTEGER)''')
+    # Registros creados antes de que las tramas v2 trajeran el byte de arranque.
+    if "arranque" not in {fila[1] for fila in cursor.execute("PRAGMA table_info(tramas_recibidas)")}:
+        cursor.execute("ALTER TABLE tramas_recibidas ADD COLUMN arranque INTEGER")
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_tramas_recibida ON tramas_recibidas (recibida)")
+    cursor.execute('''CREATE TABLE IF NOT EXISTS eventos (
+                        id INTEGER PRIMARY KEY,
+                        recibida REAL,
+                        nodo INTEGER,
+                        regla TEXT,
+                        metrica TEXT,
+                        estado TEXT,
+                        valor REAL,
+                        mensaje TEXT)''')
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_eventos_recibida ON eventos (recibida)")
+    cursor.execute('''CREATE TABLE IF NOT EXISTS alertas_activas (
+                        nodo INTEGER,
+                        regla TEXT,
+                        desde REAL,
+                        metrica TEXT,
+                        valor REAL,
+                        mensaje TEXT,
+                        PRIMARY KEY (nodo, regla)) WITHOUT ROWID''')
+    # Primera vez sobre una BD con historial: los agregados se rellenan a partir de sensores.
+    if agregados.crear_tablas(conn):
+        agregados.reconstruir(conn)
+    conn.commit()
+
+
+class EscritorSensores:
+    # Una sola conexion WAL abierta durante toda la sesion; las filas se agrupan
+    # en transacciones de hasta `max_filas` o `max_espera` segundos.
+    def __init__(self, db_file, max_filas=500, max_espera=1.0, dias_retencion=retencion.DIAS_RETENCION):
+        self.db_file = db_file
+        self.max_filas = max_filas
+        self.max_espera = max_espera
+        self.pendientes = []
+        self.tramas_pendientes = []
+        self.eventos_pendientes = []
+        self.estado_pendiente = {}
+        self.primera_pendiente = None
+        self.filas_escritas = 0
+        self.tramas_escritas = 0
+        self.transacciones = 0
+        self.dias_retencion = dias_retencion
+        self.archivando = False
+        self.proxima_retencion = time.monotonic()
+        self.proximo_checkpoint = time.monotonic() + PERIODO_CHECKPOINT
+
+        # La conexion se crea en el hilo principal y la usa el hilo escritor.
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        inicializar_bd(self.conn)
+        self.conn.execute("PRAGMA synchronous=NORMAL;")
+        self.conn.execute(f"PRAGMA journal_size_limit={LIMITE_WAL};")
+        self.migrando = migracion.pendiente(self.conn)
+        metricas.contador("invernadero_filas_escritas_total", "Filas de intervalo confirmadas en lecturas",
+                          funcion=lambda: self.filas_escritas)
+        metricas.contador("invernadero_transacciones_total", "Transacciones confirmadas por el escritor",
+                          funcion=lambda: self.transacciones)
+        metricas.medidor("invernadero_filas_pendientes", "Filas y tramas esperando al proximo commit",
+                         funcion=lambda: len(self.pendientes) + len(self.tramas_pendientes))
+
+    def _encolar(self, destino, elementos):
+        if self.primera_pendiente is None:
+            self.primera_pendiente = time.monotonic()
+        destino.extend(elementos)
+        if len(self.pendientes) + len(self.tramas_pendientes) >= self.max_filas:
+            self.flush()
+        else:
+            self.revisar()
+
+    def agregar(self, filas):
+        if filas:
+            self._encolar(self.pendientes, filas)
+
+    def registrar_tramas(self, tramas):
+        # tramas: (recibida, nodo, secuencia, temperatura, humedad, antena, arranque)
+        if tramas:
+            self._encolar(self.tramas_pendientes, tramas)
+
+    def registrar_eventos(self, eventos):
+        if eventos:
+            self._encolar(self.eventos_pendientes, eventos)
+
+    def alertas_activas(self):
+        return self.conn.execute("SELECT nodo, regla FROM alertas_activas").fetchall()
+
+    def guardar_estado(self, clave, valor):
+        # Se escribe en la misma transaccion que las filas pendientes.
+        if self.primera_pendiente is None:
+            self.primera_pendiente = time.monotonic()
+        self.estado_pendiente[clave] = valor
+
+    def leer_estado(self, clave, defecto=None):
+        fila = self.conn.execute("SELECT valor FROM estado_ingesta WHERE clave = ?", (clave,)).fetchone()
+        return defecto if fila is None else fila[0]
+
+    def tramas_desde(self, recibida):
+        return self.conn.execute("SELECT recibida, nodo, secuencia, temperatura, humedad, antena, arranque "
+                                 "FROM tramas_recibidas WHERE recibida >= ? ORDER BY recibida",
+                                 (recibida,)).fetchall()
+
+    def migrar(self, lote=5000):
+        # Un lote de la migracion del esquema anterior por llamada, entre escrituras normales.
+        if not self.migrando:
+            return 0
+        copiadas, terminada = migracion.migrar_lote(self.conn, lote)
+        if terminada:
+            self.migrando = False
+            print("Migracion del historial a lecturas terminada.")
+        return copiadas
+
+    def mantener(self):
+        # Trabajo de fondo entre lotes, un paso por llamada: migracion, archivo de los dias
+        # fuera de retencion, vacuum incremental y checkpoint del WAL.
+        if self.migrando:
+            self.migrar()
+            return
+        ahora = time.monotonic()
+        if self.dias_retencion is not None and (self.archivando or ahora >= self.proxima_retencion):
+            movidas, self.archivando = retencion.archivar_dia(self.conn, self.db_file, self.dias_retencion)
+            if movidas:
+                print(f"{movidas} lecturas archivadas (antes de {retencion.marca_de(retencion.frontera(self.conn))})")
+            if not self.archivando:
+                self.proxima_retencion = ahora + PERIODO_RETENCION
+                retencion.compactar(self.conn)
+        if ahora >= self.proximo_checkpoint:
+            retencion.checkpoint(self.conn)
+            self.proximo_checkpoint = ahora + PERIODO_CHECKPOINT
+
+    def _insertar(self, filas):
+        # Devuelve las (nodo, marca_tiempo) que ya estaban en lecturas y se han reescrito.
+        # Lo normal es que todas sean nuevas y basta un executemany; si no, se repite fila a fila.
+        self.conn.execute("SAVEPOINT insertar")
+        if self.conn.executemany(SQL_INSERTAR_NUEVA, filas).rowcount == len(filas):
+            self.conn.execute("RELEASE insertar")
+            return set()
+        self.conn.execute("ROLLBACK TO insertar")
+        reescritas = set()
+        for fila in filas:
+            if not self.conn.execute(SQL_INSERTAR_NUEVA, fila).rowcount:
+                self.conn.execute(SQL_INSERTAR, fila)
+                reescritas.add((fila[1], fila[0]))
+        self.conn.execute("RELEASE insertar")
+        return reescritas
+
+    def revisar(self):
+        if self.primera_pendiente is not None and time.monotonic() - self.primera_pendiente >= self.max_espera:
+            self.flush()
+
+    def flush(self):
+        if self.primera_pendiente is None:
+            return 0
+        filas = self.pendientes
+        tramas = self.tramas_pendientes
+        eventos = self.eventos_pendientes
+        # Solo las lecturas reales actualizan el tablero y los agregados; las arrastradas no.
+        # Las filas llegan en orden cronologico: la ultima de cada nodo es la mas reciente.
+        frescas = [fila for fila in filas if not fila[4]]
+        ultimas = {fila[1]: fila[:4] for fila in frescas}
+        # executemany reutiliza la misma sentencia preparada para todo el lote.
+        with LATENCIA_COMMIT.medir(), self.conn:
+            self.conn.executemany(SQL_REGISTRAR_TRAMA, tramas)
+            self.conn.executemany(SQL_REGISTRAR_EVENTO, eventos)
+            # En orden: una alerta puede abrirse y cerrarse (o al reves) dentro del mismo lote.
+            for evento in eventos:
+                if evento.estado == "inicio":
+                    self.conn.execute(SQL_ABRIR_ALERTA, (evento.nodo, evento.regla, evento.recibida,
+                                                         evento.metrica, evento.valor, evento.mensaje))
+                else:
+                    self.conn.execute("DELETE FROM alertas_activas WHERE nodo = ? AND regla = ?",
+                                      (evento.nodo, evento.regla))
+            reescritas = self._insertar(filas)
+            self.conn.executemany(SQL_ULTIMA_LECTURA, ultimas.values())
+            # Una lectura reescrita ya estaba sumada (o era arrastrada): sus cubetas se recalculan
+            # desde sensores y el resto del lote se suma a los agregados.
+            recalcular = agregados.afectadas(reescritas)
+            agregados.acumular(self.conn, frescas, recalcular)
+            agregados.recalcular(self.conn, recalcular)
+            self.conn.executemany(SQL_GUARDAR_ESTADO, self.estado_pendiente.items())
+            corte = self.estado_pendiente.get("ultimo_corte")
+            if corte is not None:
+                self.conn.execute("DELETE FROM tramas_recibidas WHERE recibida < ?",
+                                  (corte - RETENCION_TRAMAS * 86400,))
+        self.pendientes = []
+        self.tramas_pendientes = []
+        self.eventos_pendientes = []
+        self.estado_pendiente = {}
+        self.primera_pendiente = None
+        self.filas_escritas += len(filas)
+        self.tramas_escritas += len(tramas)
+        self.transacciones += 1
+        return len(filas)
+
+    def cerrar(self):
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.cerrar()
@@ -0,0 +1,177 @@
+import argparse
+import datetime
+import hashlib
+import multiprocessing
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from consultas import DB_FILE, preparar_bd
+from nodos import RUTA_BASE
+
+RUTA_GRAFICAS = os.path.join(RUTA_BASE, "graficas")
+# Cambiar al modificar el estilo de la grafica para que se regeneren todas.
+VERSION_RENDER = "1"
+
+
+def rango_dia(fecha):
+    if isinstance(fecha, str):
+        fecha = datetime.date.fromisoformat(fecha)
+    siguiente = fecha + datetime.timedelta(days=1)
+    return f"{fecha} 00:00:00", f"{siguiente} 00:00:00"
+
+
+def ruta_grafica(nodo, fecha, ruta_graficas=RUTA_GRAFICAS):
+    return os.path.join(ruta_graficas, f"grafica_nodo{nodo}_{fecha}.png")
+
+
+def huella(nodo, fecha, intervalo, serie):
+    h = hashlib.sha256(f"{VERSION_RENDER}|{nodo}|{fecha}|{intervalo}".encode())
+    for columna in serie:
+        h.update(columna.tobytes())
+    return h.hexdigest()
+
+
+def huella_guardada(ruta_png):
+    try:
+        with open(ruta_png + ".sha256", encoding="ascii") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def renderizar_grafica(nodo, fecha, intervalo, serie, ruta_png, firma):
+    # Se ejecuta en un proceso del pool: API orientada a objetos con Agg, sin el estado global de pyplot.
+    from matplotlib import dates as mdates
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(14, 8))
+    FigureCanvasAgg(fig)
+    ax1 = fig.subplots()
+    ax2 = ax1.twinx()
+
+    horas_dt = serie.marcas
+    ax1.plot(horas_dt, serie.temperatura, 'ro-', label=f"Temperatura Nodo {nodo} (C)")
+    ax2.plot(horas_dt, serie.humedad, 'bo-', label=f"Humedad Nodo {nodo} (%)")
+    ax1.fill_between(horas_dt, serie.temperatura_min, serie.temperatura_max, color="red", alpha=0.15)
+    ax2.fill_between(horas_dt, serie.humedad_min, serie.humedad_max, color="blue", alpha=0.15)
+
+    ax1.set_xlabel("Hora", fontsize=15)
+    ax1.set_ylabel("Temperatura (C)", color="red", fontsize=18)
+    ax2.set_ylabel("Humedad (%)", color="blue", fontsize=18)
+
+    ax1.tick_params(axis='y', labelsize=14, labelcolor="red")
+    ax2.tick_params(axis='y', labelsize=14, labelcolor="blue")
+    ax1.tick_params(axis='x', labelsize=12, rotation=45)
+
+    ax1.xaxis.set_major_locator(mdates.MinuteLocator(interval=intervalo))
+    ax1.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+
+    ax1.set_title(f"Datos del nodo {nodo} - {fecha}", fontsize=20)
+    ax1.grid(True)
+
+    lineas_1, etiquetas_1 = ax1.get_legend_handles_labels()
+    lineas_2, etiquetas_2 = ax2.get_legend_handles_labels()
+    ax1.legend(lineas_1 + lineas_2, etiquetas_1 + etiquetas_2, loc='upper left')
+
+    fig.autofmt_xdate()
+
+    # Se escribe a un temporal y se renombra para que la galeria nunca lea un PNG a medias.
+    temporal = ruta_png + ".tmp"
+    fig.savefig(temporal, format="png", bbox_inches='tight')
+    os.replace(temporal, ruta_png)
+    with open(ruta_png + ".sha256", "w", encoding="ascii") as f:
+        f.write(firma)
+    return ruta_png
+
+
+def trabajos_del_dia(fecha, intervalo=30, forzar=False, db_file=DB_FILE, ruta_graficas=RUTA_GRAFICAS):
+    # Una consulta para todos los nodos del dia; solo se devuelven las graficas cuyo contenido cambio.
+    # series (NumPy) se importa aqui para que la interfaz pueda usar rango_dia sin cargarlo al arrancar.
+    from series import cargar_series
+
+    desde, hasta = rango_dia(fecha)
+    trabajos = []
+    omitidas = 0
+    for nodo, serie in cargar_series(desde, hasta, intervalo, db_file=db_file).items():
+        if not len(serie.marcas):
+            continue
+        ruta_png = ruta_grafica(nodo, fecha, ruta_graficas)
+        firma = huella(nodo, fecha, intervalo, serie)
+        if not forzar and os.path.exists(ruta_png) and huella_guardada(ruta_png) == firma:
+            omitidas += 1
+            continue
+        trabajos.append((nodo, str(fecha), intervalo, serie, ruta_png, firma))
+    return trabajos, omitidas
+
+
+def crear_pool(procesos=None):
+    # spawn: los hijos no heredan el estado de Tk ni los hilos del proceso de la interfaz.
+    return ProcessPoolExecutor(max_workers=procesos, mp_context=multiprocessing.get_context("spawn"))
+
+
+def exportar_dias(fechas, intervalo=30, forzar=False, procesos=None, db_file=DB_FILE,
+                  ruta_graficas=RUTA_GRAFICAS):
+    os.makedirs(ruta_graficas, exist_ok=True)
+    trabajos = []
+    omitidas = 0
+    for fecha in fechas:
+        del_dia, omitidas_dia = trabajos_del_dia(fecha, intervalo, forzar, db_file, ruta_graficas)
+        trabajos.extend(del_dia)
+        omitidas += omitidas_dia
+
+    generadas = []
+    if trabajos:
+        with crear_pool(procesos) as pool:
+            futuros = [pool.submit(renderizar_grafica, *trabajo) for trabajo in trabajos]
+            for futuro in futuros:
+                try:
+                    generadas.append(futuro.result())
+                except Exception as e:
+                    print("Error al exportar grafica:", e)
+    return generadas, omitidas
+
+
+def exportar_dia(fecha=None, intervalo=30, forzar=False, procesos=None, db_file=DB_FILE):
+    if fecha is None:
+        fecha = datetime.date.today()
+    return exportar_dias([fecha], intervalo, forzar, procesos, db_file)
+
+
+def dias_con_datos(db_file=DB_FILE):
+    conn = sqlite3.connect(db_file)
+    try:
+        filas = conn.execute("SELECT DISTINCT substr(cubeta, 1, 10) FROM agregados_dia ORDER BY 1").fetchall()
+    finally:
+        conn.close()
+    return [datetime.date.fromisoformat(fila[0]) for fila in filas]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Exporta las graficas diarias por nodo a graficas/.")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--fecha", action="append", help="dia YYYY-MM-DD (se puede repetir)")
+    parser.add_argument("--todo", action="store_true", help="todos los dias con datos en la BD")
+    parser.add_argument("--intervalo", type=int, default=30)
+    parser.add_argument("--procesos", type=int, default=None)
+    parser.add_argument("--forzar", action="store_true", help="regenerar aunque no haya cambios")
+    args = parser.parse_args()
+
+    preparar_bd(args.db)
+    if args.todo:
+        fechas = dias_con_datos(args.db)
+    elif args.fecha:
+        fechas = [datetime.date.fromisoformat(f) for f in args.fecha]
+    else:
+        fechas = [datetime.date.today() - datetime.timedelta(days=1)]
+
+    inicio = time.perf_counter()
+    generadas, omitidas = exportar_dias(fechas, args.intervalo, args.forzar, args.procesos, args.db)
+    print(f"{len(generadas)} graficas generadas, {omitidas} sin cambios, "
+          f"{len(fechas)} dias en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+import hashlib
+import os
+import re
+from collections import OrderedDict, namedtuple
+
+from exportacion import RUTA_GRAFICAS
+from nodos import RUTA_BASE
+
+RUTA_CACHE = os.path.join(RUTA_BASE, "cache", "galeria")
+TAMANO_VISOR = (1150, 800)
+EXTENSIONES = ('.png', '.jpg', '.jpeg')
+PATRON_NOMBRE = re.compile(r"grafica_nodo(\d+)_(\d{4}-\d{2}-\d{2})\.png$")
+
+Grafica = namedtuple("Grafica", ["nombre", "nodo", "fecha", "mtime_ns"])
+
+
+class IndiceGraficas:
+    # Listado de graficas/ por nodo y fecha. El directorio solo se vuelve a recorrer
+    # cuando cambia su mtime (se creo, borro o renombro algun archivo).
+    def __init__(self, ruta_graficas=RUTA_GRAFICAS):
+        self.ruta_graficas = ruta_graficas
+        self.version = None
+        self.graficas = []
+        self.por_nodo = {}
+        self.por_fecha = {}
+
+    def actualizar(self):
+        try:
+            version = os.stat(self.ruta_graficas).st_mtime_ns
+        except OSError:
+            version = None
+        if version == self.version and self.version is not None:
+            return False
+
+        graficas = []
+        if version is not None:
+            with os.scandir(self.ruta_graficas) as entradas:
+                for entrada in entradas:
+                    if not entrada.name.endswith(EXTENSIONES):
+                        continue
+                    coincidencia = PATRON_NOMBRE.match(entrada.name)
+                    nodo, fecha = (int(coincidencia[1]), coincidencia[2]) if coincidencia else (None, None)
+                    graficas.append(Grafica(entrada.name, nodo, fecha, entrada.stat().st_mtime_ns))
+        # Mas recientes primero, como el listado original.
+        graficas.sort(key=lambda g: g.nombre, reverse=True)
+        graficas.sort(key=lambda g: g.fecha or "", reverse=True)
+
+        self.graficas = graficas
+        self.por_nodo = {}
+        self.por_fecha = {}
+        for grafica in graficas:
+            self.por_nodo.setdefault(grafica.nodo, []).append(grafica)
+            self.por_fecha.setdefault(grafica.fecha, []).append(grafica)
+        self.version = version
+        return True
+
+    def filtrar(self, nodo=None, fecha=None):
+        if nodo is not None and fecha is not None:
+            return [g for g in self.por_nodo.get(nodo, []) if g.fecha == fecha]
+        if nodo is not None:
+            return list(self.por_nodo.get(nodo, []))
+        if fecha is not None:
+            return list(self.por_fecha.get(fecha, []))
+        return list(self.graficas)
+
+    def nodos(self):
+        return sorted(nodo for nodo in self.por_nodo if nodo is not None)
+
+    def fechas(self):
+        return sorted((fecha for fecha in self.por_fecha if fecha is not None), reverse=True)
+
+    def ruta(self, grafica):
+        return os.path.join(self.ruta_graficas, grafica.nombre)
+
+
+def ruta_escalada(ruta, mtime_ns, size, ruta_cache=RUTA_CACHE):
+    clave = f"{os.path.abspath(ruta)}|{mtime_ns}|{size[0]}x{size[1]}"
+    return os.path.join(ruta_cache, hashlib.sha1(clave.encode()).hexdigest() + ".png")
+
+
+def imagen_escalada(ruta, size=TAMANO_VISOR, mtime_ns=None, ruta_cache=RUTA_CACHE):
+    # Solo PIL: se llama desde los hilos de trabajo. Si la grafica se regenera cambia su
+    # mtime y con el la clave, asi que nunca se sirve una version vieja.
+    from PIL import Image
+
+    if mtime_ns is None:
+        mtime_ns = os.stat(ruta).st_mtime_ns
+    cacheada = ruta_escalada(ruta, mtime_ns, size, ruta_cache)
+    try:
+        img = Image.open(cacheada)
+        img.load()
+        return img
+    except OSError:
+        pass
+
+    img = Image.open(ruta)
+    img = img.convert("RGB").resize(size, Image.LANCZOS)
+    os.makedirs(ruta_cache, exist_ok=True)
+    temporal = f"{cacheada}.{os.getpid()}.tmp"
+    try:
+        # compress_level bajo: el archivo es algo mayor pero se decodifica mucho antes que el original.
+        img.save(temporal, format="png", compress_level=1)
+        os.replace(temporal, cacheada)
+    except OSError as e:
+        print("No se pudo guardar la imagen escalada:", e)
+    return img
+
+
+def limpiar_cache(vigentes, ruta_cache=RUTA_CACHE):
+    # Borra las versiones escaladas que ya no corresponden a ninguna grafica del indice.
+    if not os.path.isdir(ruta_cache):
+        return 0
+    borrados = 0
+    for nombre in os.listdir(ruta_cache):
+        if nombre not in vigentes and not nombre.endswith(".tmp"):
+            try:
+                os.remove(os.path.join(ruta_cache, nombre))
+                borrados += 1
+            except OSError:
+                pass
+    return borrados
+
+
+def sincronizar(indice, size=TAMANO_VISOR, ruta_cache=RUTA_CACHE):
+    # Hilo de trabajo: refresca el indice y, si cambio, descarta las escaladas huerfanas.
+    if not indice.actualizar():
+        return False
+    limpiar_cache({os.path.basename(ruta_escalada(indice.ruta(g), g.mtime_ns, size, ruta_cache))
+                   for g in indice.graficas}, ruta_cache)
+    return True
+
+
+class CacheLRU:
+    def __init__(self, capacidad=8):
+        self.capacidad = capacidad
+        self.elementos = OrderedDict()
+
+    def obtener(self, clave):
+        valor = self.elementos.get(clave)
+        if valor is not None:
+            self.elementos.move_to_end(clave)
+        return valor
+
+    def guardar(self, clave, valor):
+        self.elementos[clave] = valor
+        self.elementos.move_to_end(clave)
+        while len(self.elementos) > self.capacidad:
+            self.elementos.popitem(last=False)
+
+    def __contains__(self, clave):
+        return clave in self.elementos
+
+    def __len__(self):
+        return len(self.elementos)
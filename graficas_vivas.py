@@ -0,0 +1,299 @@
+import datetime
+import time
+from functools import partial
+
+import numpy as np
+from matplotlib.backend_bases import DrawEvent
+from matplotlib.backends.backend_agg import RendererAgg
+from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
+from consultas import DB_FILE, Serie, UltimasLecturas
+from series import cargar_series
+
+
+class LienzoTk(FigureCanvasTkAgg):
+    # Un dibujo completo de la figura cuesta cientos de ms en la Pi: el render de Agg se hace en
+    # el planificador de tareas y en el hilo de Tk solo queda copiar el buffer a la PhotoImage.
+    # Mientras se dibuja la figura no se puede tocar: lo que la modifica pasa por cuando_libre y
+    # se aplica al terminar el dibujo.
+    # El planificador dibuja en un RendererAgg propio, nunca en el del lienzo, y draw_event se emite
+    # en el hilo de Tk con ese renderer (ahi se guarda el fondo para el blit). Las capas, los
+    # artistas animados, se dibujan despues encima, otra vez en el planificador, y solo entonces el
+    # renderer pasa al lienzo.
+    def __init__(self, figure, master, tareas):
+        self.tareas = tareas
+        self.dibujando = False
+        self.repetir = False
+        self.id_dibujo = None
+        self.diferidas = []
+        self.capas = []
+        super().__init__(figure, master=master)
+
+    def agregar_capa(self, funcion):
+        self.capas.append(funcion)
+
+    def cuando_libre(self, funcion, *args):
+        if self.dibujando:
+            self.diferidas.append((funcion, args))
+        else:
+            funcion(*args)
+
+    def draw_idle(self):
+        # Como en TkAgg el dibujo empieza con Tk ocioso, cuando ya se aplicaron todos los cambios.
+        if self.dibujando:
+            self.repetir = True
+        elif self.id_dibujo is None:
+            self.id_dibujo = self.get_tk_widget().after_idle(self._dibujar)
+
+    def _dibujar(self):
+        self.id_dibujo = None
+        self.dibujando = True
+        w, h = self.get_width_height(physical=True)
+        self.tareas.enviar(("lienzo", id(self)), self._renderizar, (w, h, self.figure.dpi),
+                           al_terminar=self._renderizado, al_fallar=self._fallo)
+
+    def _renderizar(self, clave):
+        renderer = RendererAgg(*clave)
+        with self.callbacks.blocked(signal="draw_event"):
+            self.figure.draw(renderer)
+        return clave, renderer
+
+    def _renderizado(self, resultado):
+        DrawEvent("draw_event", self, resultado[1])._process()
+        if self.capas:
+            self.tareas.enviar(("lienzo", id(self)), self._dibujar_capas, resultado,
+                               al_terminar=self._dibujado, al_fallar=self._fallo)
+        else:
+            self._dibujado(resultado)
+
+    def _dibujar_capas(self, resultado):
+        for capa in self.capas:
+            capa(resultado[1])
+        return resultado
+
+    def _dibujado(self, resultado):
+        # get_renderer reutiliza self.renderer mientras _lastKey coincida con el tamano.
+        self._lastKey, self.renderer = resultado
+        self.blit()
+        self._liberar()
+
+    def _fallo(self, error):
+        print("Error al dibujar la grafica:", error)
+        self._liberar()
+
+    def _liberar(self):
+        self.dibujando = False
+        diferidas, self.diferidas = self.diferidas, []
+        for funcion, args in diferidas:
+            funcion(*args)
+        if self.repetir:
+            self.repetir = False
+            self.draw_idle()
+
+    def resize(self, event):
+        self.cuando_libre(super().resize, event)
+
+
+class GraficaViva:
+    # Mantiene los Line2D creados una sola vez y solo les cambia los datos con set_data.
+    # Cada sondeo pide a la BD las cubetas desde la marca de agua (inicio de la ultima
+    # cubeta, que puede seguir abierta) y redibuja con blitting mientras los limites no cambien.
+    # Pasada la medianoche el sondeo cambia al dia nuevo en cuanto tiene datos y avisa con
+    # `al_cambiar_dia(dia)` para que la pantalla actualice el titulo.
+    def __init__(self, canvas, bucket_minutos=5, db_file=DB_FILE, al_cambiar_dia=None):
+        self.canvas = canvas
+        self.al_cambiar_dia = al_cambiar_dia
+        self.fig = canvas.figure
+        self.bucket_minutos = bucket_minutos
+        self.db_file = db_file
+        self.lineas = {}
+        self.bandas = {}
+        self.series = {}
+        self.desde = self.hasta = None
+        self.marca_agua = None
+        self.fondo = None
+        self.blit = bool(getattr(canvas, "supports_blit", False))
+        self.cambios = UltimasLecturas(db_file)
+        self.lecturas_vistas = None
+        self.ultimo_refresco_ms = 0.0
+        canvas.mpl_connect("draw_event", self._al_dibujar)
+        # En un LienzoTk los animados del dibujo completo van en el planificador, no en el hilo de Tk.
+        self.en_capa = hasattr(canvas, "agregar_capa")
+        if self.en_capa:
+            canvas.agregar_capa(self._dibujar_animados)
+
+    def agregar_linea(self, ax, nodo, campo, *args, banda=None, **kwargs):
+        linea, = ax.plot([], [], *args, animated=self.blit, **kwargs)
+        self.lineas[(nodo, campo)] = linea
+        if banda:
+            self.bandas[(nodo, campo)] = [ax, banda, None]
+        return linea
+
+    def quitar_lineas(self):
+        for linea in self.lineas.values():
+            linea.remove()
+        for _, _, coleccion in self.bandas.values():
+            if coleccion is not None:
+                coleccion.remove()
+        self.lineas = {}
+        self.bandas = {}
+        self.series = {}
+        self.marca_agua = None
+
+    def nodos(self):
+        return sorted({nodo for nodo, _ in self.lineas})
+
+    def ejes(self):
+        ejes = []
+        for linea in self.lineas.values():
+            if linea.axes not in ejes:
+                ejes.append(linea.axes)
+        return ejes
+
+    def tiene_datos(self):
+        return any(len(serie.marcas) for serie in self.series.values())
+
+    def cargar(self, desde, hasta):
+        self.mostrar(self.consultar(desde, hasta, self.nodos(), self.bucket_minutos))
+
+    def sondear(self):
+        peticion = self.peticion_sondeo()
+        return self.aplicar_cambios(peticion()) if peticion else 0
+
+    # consultar y consultar_cambios no tocan artistas: la interfaz los ejecuta en un hilo
+    # de trabajo y pasa el resultado a mostrar / aplicar_cambios en el hilo de Tk.
+    def consultar(self, desde, hasta, nodos, bucket_minutos):
+        lecturas = self.cambios.obtener()
+        return desde, hasta, lecturas, cargar_series(desde, hasta, bucket_minutos, nodos, self.db_file)
+
+    def peticion_sondeo(self):
+        if self.desde is None:
+            return None
+        hoy = datetime.date.today()
+        if self.hasta <= f"{hoy} 00:00:00":
+            # El rango mostrado ya termino: sondearlo no traeria nada nuevo.
+            return partial(self.consultar_dia_nuevo, hoy, self.nodos(), self.bucket_minutos, self.lecturas_vistas)
+        return partial(self.consultar_cambios, self.marca_agua or self.desde, self.hasta, self.nodos(),
+                       self.bucket_minutos, self.lecturas_vistas)
+
+    def consultar_cambios(self, desde, hasta, nodos, bucket_minutos, lecturas_vistas):
+        lecturas = self.cambios.obtener()
+        if lecturas is lecturas_vistas:
+            return None
+        return lecturas, cargar_series(desde, hasta, bucket_minutos, nodos, self.db_file)
+
+    def consultar_dia_nuevo(self, dia, nodos, bucket_minutos, lecturas_vistas):
+        # Mientras hoy no tenga datos de estos nodos se sigue mostrando el dia anterior.
+        if self.cambios.obtener() is lecturas_vistas:
+            return None
+        resultado = self.consultar(f"{dia} 00:00:00", f"{dia + datetime.timedelta(days=1)} 00:00:00",
+                                   nodos, bucket_minutos)
+        if not any(len(serie.marcas) for serie in resultado[3].values()):
+            return None
+        return resultado
+
+    def mostrar(self, resultado):
+        desde, hasta, self.lecturas_vistas, self.series = resultado
+        self.desde, self.hasta = desde, hasta
+        self._actualizar_marca_agua()
+        self._actualizar_artistas(self.series)
+
+        # El eje X cubre todo el rango pedido: los puntos nuevos caen dentro y no obligan a redibujar.
+        inicio, fin = np.datetime64(desde.replace(" ", "T")), np.datetime64(hasta.replace(" ", "T"))
+        for ax in self.ejes():
+            ax.set_xlim(inicio, fin)
+            ax.relim()
+            ax.autoscale_view(scalex=False)
+        self.canvas.draw_idle()
+
+    def aplicar_cambios(self, resultado):
+        if resultado is None:
+            return 0
+        if len(resultado) == 4:
+            # consultar_dia_nuevo: el dia entero sustituye al anterior.
+            self.mostrar(resultado)
+            if self.al_cambiar_dia:
+                self.al_cambiar_dia(self.desde[:10])
+            return len(resultado[3])
+        inicio = time.perf_counter()
+        self.lecturas_vistas, nuevas = resultado
+        if not nuevas:
+            return 0
+
+        for nodo, parcial in nuevas.items():
+            previa = self.series.get(nodo)
+            if previa is None or not len(previa.marcas):
+                self.series[nodo] = parcial
+                continue
+            # La cubeta abierta se reemplaza por su version mas reciente.
+            corte = np.searchsorted(previa.marcas, parcial.marcas[0])
+            self.series[nodo] = Serie(*(np.concatenate((a[:corte], b)) for a, b in zip(previa, parcial)))
+        self._actualizar_marca_agua()
+
+        fuera_de_rango = self._actualizar_artistas(nuevas)
+        if fuera_de_rango or not self.blit or self.fondo is None:
+            for ax in self.ejes():
+                ax.relim()
+                ax.autoscale_view(scalex=False)
+            self.canvas.draw_idle()
+        else:
+            self._blit()
+        self.ultimo_refresco_ms = (time.perf_counter() - inicio) * 1000
+        return len(nuevas)
+
+    def _actualizar_marca_agua(self):
+        finales = [serie.marcas[-1] for serie in self.series.values() if len(serie.marcas)]
+        if finales:
+            self.marca_agua = str(max(finales)).replace("T", " ")
+
+    def _actualizar_artistas(self, series):
+        fuera_de_rango = False
+        for (nodo, campo), linea in self.lineas.items():
+            serie = series.get(nodo)
+            if serie is None:
+                continue
+            serie = self.series[nodo]
+            valores = getattr(serie, campo)
+            linea.set_data(serie.marcas, valores)
+
+            banda = self.bandas.get((nodo, campo))
+            if banda is not None:
+                ax, color, coleccion = banda
+                if coleccion is not None:
+                    coleccion.remove()
+                banda[2] = ax.fill_between(serie.marcas, getattr(serie, campo + "_min"),
+                                           getattr(serie, campo + "_max"), color=color, alpha=0.15,
+                                           animated=self.blit)
+
+            if len(valores):
+                abajo, arriba = linea.axes.get_ylim()
+                if valores.min() < abajo or valores.max() > arriba:
+                    fuera_de_rango = True
+        return fuera_de_rango
+
+    def _dibujar_animados(self, renderer=None):
+        if not self.blit:
+            return
+        renderer = renderer or self.canvas.get_renderer()
+        for _, _, coleccion in self.bandas.values():
+            if coleccion is not None:
+                coleccion.draw(renderer)
+        for linea in self.lineas.values():
+            linea.draw(renderer)
+
+    def _al_dibujar(self, event):
+        # Tras cada dibujo completo se guarda el fondo sin los artistas animados.
+        if not self.blit:
+            return
+        self.fondo = event.renderer.copy_from_bbox(self.fig.bbox)
+        if not self.en_capa:
+            self._dibujar_animados(event.renderer)
+
+    def _blit(self):
+        self.canvas.restore_region(self.fondo)
+        self._dibujar_animados()
+        self.canvas.blit(self.fig.bbox)
+        self.canvas.flush_events()
+
+    def cerrar(self):
+        self.cambios.cerrar()
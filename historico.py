@@ -0,0 +1,383 @@
+import argparse
+import itertools
+import os
+import re
+import sqlite3
+import time
+import zipfile
+
+import numpy as np
+
+import agregados
+import retencion
+from escritor_bd import SQL_ULTIMA_LECTURA, inicializar_bd
+
+# Volcado del historial crudo (lecturas, incluidos los archivos mensuales) a archivos por
+# columnas, uno por nodo y mes: destino/nodo=N/lecturas_YYYY-MM.<formato>. Los valores se
+# guardan como en la tabla: ts en hora local contada como UTC y centesimas enteras.
+# Parquet y Feather necesitan pyarrow; sin el se usa npz, un zip de arrays .npy por bloque.
+COLUMNAS = ("nodo", "ts", "temperatura", "humedad", "arrastrado")
+TIPOS = {"nodo": np.int32, "ts": np.int64, "temperatura": np.int32, "humedad": np.int32, "arrastrado": np.int8}
+DIFERENCIAS = ("ts", "temperatura", "humedad")
+# Los NULL de SQLite se guardan con este valor: npz no tiene nulos.
+NULO = int(np.iinfo(np.int32).min)
+BLOQUE = 65536
+EXTENSIONES = {"parquet": ".parquet", "feather": ".feather", "npz": ".npz"}
+PATRON_NODO = re.compile(r"nodo=(\d+)$")
+PATRON_ARCHIVO = re.compile(r"lecturas_(\d{4}-\d{2})\.(parquet|feather|npz)$")
+
+SQL_NODO_MES = f"""
+    SELECT ts, IFNULL(temperatura, {NULO}), IFNULL(humedad, {NULO}), arrastrado
+    FROM lecturas
+    WHERE nodo = ? AND ts >= ? AND ts < ?
+    ORDER BY ts
+"""
+
+SQL_IMPORTAR = """
+    INSERT OR REPLACE INTO lecturas (nodo, ts, temperatura, humedad, arrastrado)
+    VALUES (?, ?, ?, ?, ?)
+"""
+
+
+def hay_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def formato_por_defecto():
+    return "parquet" if hay_pyarrow() else "npz"
+
+
+def ruta_particion(destino, nodo, mes, formato):
+    return os.path.join(destino, f"nodo={nodo}", f"lecturas_{mes}{EXTENSIONES[formato]}")
+
+
+def bloques_cursor(cursor, nodo, tamano=BLOQUE):
+    # Memoria constante: nunca hay mas de `tamano` filas fuera de SQLite.
+    while True:
+        filas = cursor.fetchmany(tamano)
+        if not filas:
+            return
+        datos = np.array(filas, dtype=np.int64)
+        yield {
+            "nodo": np.full(len(datos), nodo, dtype=TIPOS["nodo"]),
+            "ts": datos[:, 0],
+            "temperatura": datos[:, 1].astype(TIPOS["temperatura"]),
+            "humedad": datos[:, 2].astype(TIPOS["humedad"]),
+            "arrastrado": datos[:, 3].astype(TIPOS["arrastrado"]),
+        }
+
+
+class EscritorColumnas:
+    # Escribe en un temporal y lo renombra al cerrar: un volcado cortado no deja archivos a medias.
+    def __init__(self, ruta):
+        self.ruta = ruta
+        self.temporal = f"{ruta}.{os.getpid()}.tmp"
+        self.filas = 0
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+
+    def escribir(self, bloque):
+        self._escribir(bloque)
+        self.filas += len(bloque["ts"])
+
+    def cerrar(self):
+        self._cerrar()
+        os.replace(self.temporal, self.ruta)
+
+    def descartar(self):
+        try:
+            self._cerrar()
+        finally:
+            if os.path.exists(self.temporal):
+                os.remove(self.temporal)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, *_):
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.descartar()
+
+
+class EscritorParquet(EscritorColumnas):
+    # Un grupo de filas por bloque; zstd sobre columnas ordenadas por ts comprime muy bien.
+    def __init__(self, ruta):
+        super().__init__(ruta)
+        self.escritor = None
+
+    def _escribir(self, bloque):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        tabla = pa.table({columna: bloque[columna] for columna in COLUMNAS})
+        if self.escritor is None:
+            self.escritor = pq.ParquetWriter(self.temporal, tabla.schema, compression="zstd")
+        self.escritor.write_table(tabla)
+
+    def _cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            self.escritor = None
+
+
+class EscritorFeather(EscritorColumnas):
+    def __init__(self, ruta):
+        super().__init__(ruta)
+        self.escritor = None
+
+    def _escribir(self, bloque):
+        import pyarrow as pa
+
+        lote = pa.record_batch([bloque[columna] for columna in COLUMNAS], names=list(COLUMNAS))
+        if self.escritor is None:
+            opciones = pa.ipc.IpcWriteOptions(compression="zstd")
+            self.escritor = pa.ipc.new_file(self.temporal, lote.schema, options=opciones)
+        self.escritor.write_batch(lote)
+
+    def _cerrar(self):
+        if self.escritor is not None:
+            self.escritor.close()
+            self.escritor = None
+
+
+class EscritorNpz(EscritorColumnas):
+    # Un miembro "BBBBBB/columna.npy" por bloque y columna, legible con np.load. ts, temperatura y
+    # humedad van como diferencias con la fila anterior (la primera absoluta) en el entero mas
+    # pequeno que las admite: con lecturas cada minuto casi todas caben en un byte y deflate
+    # rapido (nivel 1) las comprime mejor que los valores enteros a nivel 6.
+    def __init__(self, ruta):
+        super().__init__(ruta)
+        self.zip = zipfile.ZipFile(self.temporal, "w", zipfile.ZIP_DEFLATED, compresslevel=1)
+        self.numero = 0
+
+    def _escribir(self, bloque):
+        for columna in COLUMNAS:
+            valores = bloque[columna]
+            valores = empaquetar(valores) if columna in DIFERENCIAS else valores.astype(TIPOS[columna], copy=False)
+            with self.zip.open(f"{self.numero:06d}/{columna}.npy", "w", force_zip64=True) as f:
+                np.lib.format.write_array(f, np.ascontiguousarray(valores))
+        self.numero += 1
+
+    def _cerrar(self):
+        if self.zip is not None:
+            self.zip.close()
+            self.zip = None
+
+
+def empaquetar(valores):
+    diferencias = np.diff(valores.astype(np.int64), prepend=0)
+    for tipo in (np.int8, np.int16, np.int32):
+        limites = np.iinfo(tipo)
+        if limites.min <= diferencias.min() and diferencias.max() <= limites.max:
+            return diferencias.astype(tipo)
+    return diferencias
+
+
+ESCRITORES = {"parquet": EscritorParquet, "feather": EscritorFeather, "npz": EscritorNpz}
+
+
+def escribir_particion(ruta, bloques, formato=None):
+    # Vuelca un iterable de bloques {columna: array} en un archivo. Devuelve las filas escritas.
+    formato = formato or formato_por_defecto()
+    with ESCRITORES[formato](ruta) as escritor:
+        for bloque in bloques:
+            escritor.escribir(bloque)
+    return escritor.filas
+
+
+def leer_particion(ruta, tamano=BLOQUE):
+    # Generador de bloques {columna: array} en el orden en que se escribieron.
+    if ruta.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        for lote in pq.ParquetFile(ruta).iter_batches(batch_size=tamano):
+            yield {columna: lote.column(columna).to_numpy() for columna in COLUMNAS}
+    elif ruta.endswith(".feather"):
+        import pyarrow as pa
+
+        with pa.memory_map(ruta) as origen:
+            lector = pa.ipc.open_file(origen)
+            for i in range(lector.num_record_batches):
+                lote = lector.get_batch(i)
+                yield {columna: lote.column(columna).to_numpy() for columna in COLUMNAS}
+    else:
+        with np.load(ruta) as archivo:
+            numeros = sorted({nombre.split("/")[0] for nombre in archivo.files})
+            for numero in numeros:
+                bloque = {columna: archivo[f"{numero}/{columna}"] for columna in COLUMNAS}
+                for columna in DIFERENCIAS:
+                    bloque[columna] = np.cumsum(bloque[columna], dtype=np.int64).astype(TIPOS[columna])
+                yield bloque
+
+
+def particiones(origen):
+    # (nodo, mes, ruta) de un volcado, ordenadas como la clave de lecturas.
+    encontradas = []
+    for carpeta in os.listdir(origen):
+        coincidencia = PATRON_NODO.match(carpeta)
+        if not coincidencia:
+            continue
+        for nombre in os.listdir(os.path.join(origen, carpeta)):
+            archivo = PATRON_ARCHIVO.match(nombre)
+            if archivo:
+                encontradas.append((int(coincidencia[1]), archivo[1], os.path.join(origen, carpeta, nombre)))
+    return sorted(encontradas)
+
+
+def limites(conn, db_file):
+    # Primer y ultimo mes con lecturas, contando los archivos mensuales.
+    ts_min, ts_max = conn.execute(
+        "SELECT MIN((SELECT MIN(ts) FROM lecturas WHERE nodo = u.nodo)), "
+        "MAX((SELECT MAX(ts) FROM lecturas WHERE nodo = u.nodo)) FROM ultimas_lecturas u").fetchone()
+    meses = retencion.meses_archivados(db_file)
+    if ts_min is not None:
+        meses += [retencion.mes_de(ts_min), retencion.mes_de(ts_max)]
+    return (min(meses), max(meses)) if meses else (None, None)
+
+
+def meses_entre(desde, hasta):
+    meses = []
+    mes = desde
+    while mes <= hasta:
+        meses.append(mes)
+        mes = retencion.mes_de(retencion.fin_mes(mes))
+    return meses
+
+
+def exportar(db_file, destino, formato=None, desde=None, hasta=None, nodos=None, forzar=False):
+    # Devuelve (archivos escritos, filas, particiones omitidas porque ya estaban volcadas).
+    formato = formato or formato_por_defecto()
+    conn = sqlite3.connect(db_file)
+    try:
+        primero, ultimo = limites(conn, db_file)
+        if primero is None:
+            return [], 0, 0
+        if nodos is None:
+            nodos = [fila[0] for fila in conn.execute("SELECT nodo FROM ultimas_lecturas ORDER BY nodo")]
+        ahora = retencion.hora_local()
+        escritos = []
+        filas = 0
+        omitidas = 0
+        for mes in meses_entre(max(desde or primero, primero), min(hasta or ultimo, ultimo)):
+            # Un mes que ya termino no cambia: si esta volcado no se repite.
+            cerrado = retencion.fin_mes(mes) <= ahora
+            pendientes = [nodo for nodo in nodos
+                          if forzar or not cerrado or not os.path.exists(ruta_particion(destino, nodo, mes, formato))]
+            omitidas += len(nodos) - len(pendientes)
+            if not pendientes:
+                continue
+            # tramos() adjunta el archivo del mes si hace falta y une sus lecturas con las de la tabla caliente.
+            tramos = retencion.tramos(conn, db_file, retencion.inicio_mes(mes), retencion.fin_mes(mes))
+            for ts_desde, ts_hasta in tramos:
+                for nodo in pendientes:
+                    bloques = bloques_cursor(conn.execute(SQL_NODO_MES, (nodo, ts_desde, ts_hasta)), nodo)
+                    primer_bloque = next(bloques, None)
+                    if primer_bloque is None:
+                        continue
+                    ruta = ruta_particion(destino, nodo, mes, formato)
+                    filas += escribir_particion(ruta, itertools.chain([primer_bloque], bloques), formato)
+                    escritos.append(ruta)
+        return escritos, filas, omitidas
+    finally:
+        conn.close()
+
+
+def filas_sqlite(bloque):
+    columnas = []
+    for columna in COLUMNAS:
+        valores = bloque[columna].tolist()
+        if columna in ("temperatura", "humedad") and (bloque[columna] == NULO).any():
+            valores = [None if valor == NULO else valor for valor in valores]
+        columnas.append(valores)
+    return zip(*columnas)
+
+
+def importar(origen, db_file, reconstruir_agregados=True):
+    # Carga un volcado (o datos simulados con el mismo formato) en una BD. En una BD nueva se
+    # desactiva la sincronizacion: si la carga se corta basta con borrarla y repetir.
+    # Los archivos van por (nodo, mes), el orden de la clave, asi cada insercion cae al final
+    # del arbol. Devuelve (archivos, filas, filas omitidas por ser anteriores al archivo).
+    nueva = not os.path.exists(db_file)
+    conn = sqlite3.connect(db_file)
+    try:
+        inicializar_bd(conn)
+        if nueva:
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute("PRAGMA cache_size=-65536")
+        corte = retencion.frontera(conn)
+        archivos = particiones(origen)
+        filas = 0
+        omitidas = 0
+        ts_min = None
+        for nodo, mes, ruta in archivos:
+            ultima = None
+            with conn:
+                for bloque in leer_particion(ruta):
+                    if corte is not None and bloque["ts"][0] < corte:
+                        # Lo anterior a la frontera se lee de los archivos mensuales, no de lecturas.
+                        visibles = bloque["ts"] >= corte
+                        omitidas += int(len(visibles) - visibles.sum())
+                        bloque = {columna: valores[visibles] for columna, valores in bloque.items()}
+                    if not len(bloque["ts"]):
+                        continue
+                    conn.executemany(SQL_IMPORTAR, filas_sqlite(bloque))
+                    filas += len(bloque["ts"])
+                    ts_min = int(bloque["ts"][0]) if ts_min is None else min(ts_min, int(bloque["ts"][0]))
+                    oidas = np.flatnonzero((bloque["arrastrado"] == 0) & (bloque["temperatura"] != NULO))
+                    if len(oidas):
+                        ultima = oidas[-1], bloque
+                if ultima is not None:
+                    i, bloque = ultima
+                    conn.execute(SQL_ULTIMA_LECTURA, (retencion.marca_de(int(bloque["ts"][i])), nodo,
+                                                      bloque["temperatura"][i] / 100, bloque["humedad"][i] / 100))
+        if reconstruir_agregados and ts_min is not None:
+            agregados.reconstruir(conn, None if nueva else retencion.marca_de(ts_min))
+        retencion.checkpoint(conn)
+        return len(archivos), filas, omitidas
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vuelca el historial de lecturas a archivos por columnas "
+                                                 "(nodo y mes) y los vuelve a cargar.")
+    subparsers = parser.add_subparsers(dest="orden", required=True)
+    volcar = subparsers.add_parser("exportar", help="BD -> archivos por nodo y mes")
+    volcar.add_argument("destino")
+    volcar.add_argument("--db", default="datos_sensores.db")
+    volcar.add_argument("--formato", choices=sorted(ESCRITORES), default=None,
+                        help="parquet si esta pyarrow, si no npz")
+    volcar.add_argument("--desde", help="primer mes YYYY-MM")
+    volcar.add_argument("--hasta", help="ultimo mes YYYY-MM")
+    volcar.add_argument("--nodo", type=int, action="append", help="solo este nodo (se puede repetir)")
+    volcar.add_argument("--forzar", action="store_true", help="volver a volcar los meses ya volcados")
+    cargar = subparsers.add_parser("importar", help="archivos -> BD")
+    cargar.add_argument("origen")
+    cargar.add_argument("--db", default="datos_sensores.db")
+    cargar.add_argument("--sin-agregados", action="store_true",
+                        help="no reconstruir los agregados (python agregados.py mas tarde)")
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    if args.orden == "exportar":
+        formato = args.formato or formato_por_defecto()
+        if formato != "npz" and not hay_pyarrow():
+            parser.error(f"{formato} necesita pyarrow (pip install pyarrow); npz no necesita nada")
+        escritos, filas, omitidas = exportar(args.db, args.destino, formato, args.desde, args.hasta,
+                                             args.nodo, args.forzar)
+        print(f"{filas} lecturas en {len(escritos)} archivos {formato} ({omitidas} ya volcados) "
+              f"en {time.perf_counter() - inicio:.1f} s")
+    else:
+        archivos, filas, omitidas = importar(args.origen, args.db, not args.sin_agregados)
+        print(f"{filas} lecturas de {archivos} archivos en {time.perf_counter() - inicio:.1f} s")
+        if omitidas:
+            print(f"{omitidas} lecturas omitidas: anteriores a la frontera del archivo mensual")
+
+
+if __name__ == "__main__":
+    main()
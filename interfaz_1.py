@@ -1,26 +1,53 @@
 import tkinter as tk
-from tkinter import ttk, filedialog, colorchooser
+from tkinter import ttk
 import sqlite3
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 import datetime
+import importlib
+import math
 import os
-import sys
-from PIL import Image, ImageTk
-import threading
+import time
+import argparse
+from functools import partial
+
+import metricas
+from alertas import cargar_reglas
+from consultas import DB_FILE, UltimasLecturas, preparar_bd, ultimo_dia_con_datos
+from exportacion import RUTA_GRAFICAS, exportar_dia, rango_dia
+from galeria import RUTA_CACHE, TAMANO_VISOR, CacheLRU, IndiceGraficas, imagen_escalada, ruta_escalada, sincronizar
+from nodos import RUTA_BASE, cargar_nodos, cargar_plano, dimensiones_rejilla
+from tareas import PlanificadorTareas
 
 
 os.makedirs("graficas", exist_ok=True)
 os.makedirs("img", exist_ok=True)
 
 ICONO_TAMANO = (300, 300)
+RUTA_IMG = os.path.join(RUTA_BASE, "img")
+RUTA_ICONOS = os.path.join(RUTA_BASE, "cache", "iconos")
+# matplotlib, NumPy y PIL tardan segundos en importarse en la Pi: no se cargan hasta que
+# el menu ya esta en pantalla, y entonces en segundo plano.
+MODULOS_DIFERIDOS = ("matplotlib.pyplot", "matplotlib.backends.backend_tkagg", "graficas_vivas", "PIL.ImageTk",
+                     "mapa_calor", "series")
+# Plano: ancho de cada mapa en pixeles y reproduccion del dia en cubetas de 5 minutos a 10 cuadros/s.
+ANCHO_MAPA = 560
+BUCKET_REPRODUCCION = 5
+PERIODO_CUADRO_MS = 100
+
+
+def nodos_con_datos(fecha):
+    conn = sqlite3.connect(DB_FILE)
+    cursor = conn.cursor()
+    cursor.execute("SELECT nodo FROM agregados_dia WHERE cubeta = ?", (rango_dia(fecha)[0],))
+    nodos = [fila[0] for fila in cursor.fetchall()]
+    conn.close()
+    return nodos
 
 
 def verificar_graficas_guardadas(fecha):
     ruta_base = os.path.dirname(os.path.abspath(__file__))
     ruta_graficas = os.path.join(ruta_base, "graficas")
 
-    for nodo in range(1, 5):
+    for nodo in nodos_con_datos(fecha):
         filename = os.path.join(ruta_graficas, f"grafica_nodo{nodo}_{fecha}.png")
         if not os.path.exists(filename):
             return False
@@ -28,164 +55,170 @@ def verificar_graficas_guardadas(fecha):
 
  
 def verificar_y_guardar_dia_anterior():
+    # Se ejecuta en el planificador de tareas, con el menu ya en pantalla.
     ayer = datetime.date.today() - datetime.timedelta(days=1)
     if not verificar_graficas_guardadas(ayer):
-        print(f"?? Las graficas del dia {ayer} no fueron guardadas. Guardando ahora...")
-        guardar_grafica(ayer)
-    else:
-        print(f"? Las graficas del dia {ayer} ya estan guardadas.")
+        print(f"?? Las graficas del dia {ayer} no fueron guardadas. Guardando en segundo plano...")
+        return guardar_grafica(ayer)
+    print(f"? Las graficas del dia {ayer} ya estan guardadas.")
  
  
 
-def obtener_datos(nodo=None):
-    conn = sqlite3.connect("datos_sensores.db")
-    cursor = conn.cursor()
-
-    if nodo is not None:
-        cursor.execute("SELECT marca_tiempo, temperatura, humedad FROM sensores WHERE nodo = ? ORDER BY marca_tiempo DESC", (nodo,))
-    else:
-        cursor.execute("SELECT marca_tiempo, temperatura, humedad FROM sensores")
-
-    datos = cursor.fetchall()
-    conn.close()
-    
-    datos_procesados = []
-    for marca_tiempo, temperatura, humedad in datos:
-        if len(marca_tiempo) == 8 and marca_tiempo.count(":") == 2:
-            hora = marca_tiempo[:5]
-        else:
-            try:
-                hora = datetime.datetime.strptime(marca_tiempo, "%Y-%m-%d %H:%M:%S").strftime("%H:%M")
-            except Exception as e:
-                hora = "??:??"
-                print("Error con marca de tiempo:", marca_tiempo, "| Error:", e)
-        datos_procesados.append((hora, temperatura, humedad))
-
-    return datos_procesados
+def formatear_hora(marca_tiempo):
+    if len(marca_tiempo) == 8 and marca_tiempo.count(":") == 2:
+        return marca_tiempo[:5]
+    try:
+        return datetime.datetime.strptime(marca_tiempo, "%Y-%m-%d %H:%M:%S").strftime("%H:%M")
+    except Exception as e:
+        print("Error con marca de tiempo:", marca_tiempo, "| Error:", e)
+        return "??:??"
+
+
+def color_rango(valor, rango):
+    minimo, maximo = rango
+    return "green" if minimo <= valor <= maximo else "red" if valor > maximo else "blue"
+
+
+def texto_leyenda(titulo, unidad, reglas, nombre, nodos):
+    # Los mismos rangos que usa color_rango: el de por defecto y los nodos con uno propio.
+    def ideal(minimo, maximo):
+        if minimo == -math.inf and maximo == math.inf:
+            return "sin rango"
+        if minimo == -math.inf:
+            return f"<={maximo:g}{unidad}"
+        if maximo == math.inf:
+            return f">={minimo:g}{unidad}"
+        return f"{minimo:g}-{maximo:g}{unidad}"
+
+    minimo, maximo = defecto = reglas.rango(None, nombre)
+    partes = [f"Verde = Ideal ({ideal(minimo, maximo)})"]
+    if maximo != math.inf:
+        partes.append(f"Rojo = Alta (>{maximo:g}{unidad})")
+    if minimo != -math.inf:
+        partes.append(f"Azul = Baja (<{minimo:g}{unidad})")
+    texto = f"{titulo}: {', '.join(partes)}"
+    propios = {}
+    for nodo in nodos:
+        rango = reglas.rango(nodo, nombre)
+        if rango != defecto:
+            propios.setdefault(rango, []).append(str(nodo))
+    for rango, lista in propios.items():
+        texto += f"\n  Nodo{'s' if len(lista) > 1 else ''} {', '.join(lista)}: Ideal ({ideal(*rango)})"
+    return texto
+
+
+# "mostrar": desde que se pide la grafica de un nodo hasta que queda dibujada; "guardar": exportacion del dia.
+LATENCIA_GRAFICA = metricas.histograma("invernadero_grafica_segundos", "Tiempo hasta tener la grafica", "vista")
 
 
 def guardar_grafica(fecha=None, intervalo=30):
-    from matplotlib import dates as mdates
-    conn = sqlite3.connect("datos_sensores.db")
-    cursor = conn.cursor()
-
-    if fecha is None:
-        fecha = datetime.date.today()
+    with LATENCIA_GRAFICA.medir("guardar"):
+        generadas, omitidas = exportar_dia(fecha, intervalo)
+    print(f"Graficas guardadas: {len(generadas)} nuevas, {omitidas} sin cambios")
+    return generadas, omitidas
 
-    for nodo in range(1, 5):
-        query = f"""
-            SELECT marca_tiempo, temperatura, humedad
-            FROM sensores
-            WHERE nodo = ? AND date(marca_tiempo) = ?
-            ORDER BY marca_tiempo ASC
-        """
-        cursor.execute(query, (nodo, fecha))
-        datos = cursor.fetchall()
 
-        if datos:
-            datos_filtrados = []
-            ultima_hora = None
+def importar_diferidos():
+    for modulo in MODULOS_DIFERIDOS:
+        importlib.import_module(modulo)
 
-            for marca_tiempo, temp, hum in datos:
-                try:
-                    dt = datetime.datetime.strptime(marca_tiempo, "%Y-%m-%d %H:%M:%S")
-                except:
-                    continue
 
-                if ultima_hora is None or (dt - ultima_hora).total_seconds() >= intervalo * 60:
-                    datos_filtrados.append((dt, temp, hum))
-                    ultima_hora = dt
-
-            if not datos_filtrados:
-                continue
-
-            horas_dt, temperaturas, humedades = zip(*datos_filtrados)
-
-            fig, ax1 = plt.subplots(figsize=(14, 8))
-            ax2 = ax1.twinx()
-
-            ax1.plot(horas_dt, temperaturas, 'ro-', label=f"Temperatura Nodo {nodo} (C)")
-            ax2.plot(horas_dt, humedades, 'bo-', label=f"Humedad Nodo {nodo} (%)")
-
-            ax1.set_xlabel("Hora", fontsize=15)
-            ax1.set_ylabel("Temperatura (C)", color="red", fontsize=18)
-            ax2.set_ylabel("Humedad (%)", color="blue", fontsize=18)
-
-            ax1.tick_params(axis='y', labelsize=14, labelcolor="red")
-            ax2.tick_params(axis='y', labelsize=14, labelcolor="blue")
-            ax1.tick_params(axis='x', labelsize=12, rotation=45)
-
-            ax1.xaxis.set_major_locator(mdates.MinuteLocator(interval=intervalo))
-            ax1.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
-
-            ax1.set_title(f"Datos del nodo {nodo} - {fecha}", fontsize=20)
-            ax1.grid(True)
-
-            lineas_1, etiquetas_1 = ax1.get_legend_handles_labels()
-            lineas_2, etiquetas_2 = ax2.get_legend_handles_labels()
-            ax1.legend(lineas_1 + lineas_2, etiquetas_1 + etiquetas_2, loc='upper left')
-
-            fig.autofmt_xdate()
-
-            ruta_base = os.path.dirname(os.path.abspath(__file__))
-            ruta_graficas = os.path.join(ruta_base, "graficas")
-            os.makedirs(ruta_graficas, exist_ok=True)
-
-            filename = os.path.join(ruta_graficas, f"grafica_nodo{nodo}_{fecha}.png")
-            plt.savefig(filename, bbox_inches='tight')
-            plt.close()
-
-    conn.close()
+def foto_tk(img):
+    from PIL import ImageTk
+    return ImageTk.PhotoImage(img)
 
 
+def imagen_rgb(rgb, size):
+    # Rejilla coloreada (filas, columnas, 3) -> imagen PIL del tamano del mapa, suavizada.
+    from PIL import Image
+    return Image.fromarray(rgb).resize(size, Image.BILINEAR)
 
 
 def cargar_imagen(ruta, size=ICONO_TAMANO):
+    # Los iconos se escalan una vez y se guardan como PNG, que Tk lee sin PIL. Solo se vuelve
+    # a decodificar el original si cambia su mtime.
     try:
-        ruta_base = os.path.dirname(os.path.abspath(__file__))
-        ruta_completa = os.path.join(ruta_base, "img", ruta)
-        img = Image.open(ruta_completa)
-        img = img.resize(size, Image.LANCZOS)
-        return ImageTk.PhotoImage(img)
+        ruta_completa = os.path.join(RUTA_IMG, ruta)
+        mtime_ns = os.stat(ruta_completa).st_mtime_ns
+        cacheada = ruta_escalada(ruta_completa, mtime_ns, size, RUTA_ICONOS)
+        if not os.path.exists(cacheada):
+            imagen_escalada(ruta_completa, size, mtime_ns, RUTA_ICONOS)
+        return tk.PhotoImage(file=cacheada)
     except Exception as e:
         print("Error al cargar imagen", ruta, ":", e)
-        img = Image.new("RGB", size, color="gray")
-        return ImageTk.PhotoImage(img)
+        foto = tk.PhotoImage(width=size[0], height=size[1])
+        foto.put("gray", to=(0, 0, size[0], size[1]))
+        return foto
 
 
 class CompararNodos(tk.Frame):
     def __init__(self, controller):
+        import matplotlib.pyplot as plt
+        from matplotlib import dates as mdates
+        from graficas_vivas import GraficaViva, LienzoTk
+
         super().__init__(controller)
         self.controller = controller
         tk.Label(self, text="Comparacion entre Nodos", font=("Arial", 28)).pack(pady=20)
+        self.estado = tk.Label(self, text="", font=("Arial", 20))
+        self.estado.pack()
 
+        self.nodos = cargar_nodos()
+        self.pendiente = True
         self.fig, self.ax = plt.subplots(figsize=(14, 8))
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self)
+        self.canvas = LienzoTk(self.fig, self, controller.tareas)
         self.canvas.get_tk_widget().pack()
+        self.viva = GraficaViva(self.canvas, bucket_minutos=5, al_cambiar_dia=self.titular)
 
-        self.mostrar_comparacion()
+        self.ax.xaxis.set_major_locator(mdates.HourLocator(interval=2))
+        self.ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+        self.ax.set_xlabel("Hora")
+        self.ax.set_ylabel("Temperatura (C)")
+        self.ax.grid(True)
+        self.fig.autofmt_xdate()
+
+        colores = plt.cm.tab20.colors
+        for i, nodo in enumerate(self.nodos):
+            estilo = "-" if i < len(colores) else "--"
+            self.viva.agregar_linea(self.ax, nodo, "temperatura", estilo, label=f"Nodo {nodo}",
+                                    color=colores[i % len(colores)])
+        self.ax.legend(ncol=max(1, len(self.nodos) // 10), fontsize="small")
+        self.refrescar()
 
         tk.Button(self, text="Volver", font=("Arial", 28),
                   command=lambda: controller.mostrar_frame(MenuPrincipal)).pack(pady=20)
 
+    def al_mostrar(self):
+        if self.pendiente:
+            self.mostrar_comparacion()
+
     def mostrar_comparacion(self):
-        self.ax.clear()
-        colores = ['red', 'blue', 'green', 'orange']
-        for nodo in range(1, 5):
-            datos = sorted(obtener_datos(nodo), key=lambda x: x[0])
-            if datos:
-                hoy = datetime.date.today()
-                horas_str, temp, _ = zip(*datos)
-                horas_dt = [datetime.datetime.strptime(f"{hoy} {h}", "%Y-%m-%d %H:%M") for h in horas_str]
-                self.ax.plot(horas_dt, temp, label=f"Nodo {nodo}", color=colores[nodo - 1])
+        self.pendiente = True
+        self.estado.config(text="Cargando...")
+        self.controller.tareas.enviar("comparacion", self.consultar_dia, self.viva.nodos(),
+                                      al_terminar=partial(self.canvas.cuando_libre, self.dibujar_dia), grupo=self)
 
-        self.ax.set_title("Comparacion de Temperaturas", fontsize=24)
-        self.ax.set_xlabel("Hora")
-        self.ax.set_ylabel("Temperatura (C)")
-        self.ax.legend()
-        self.ax.grid(True)
-        self.fig.autofmt_xdate()
-        self.canvas.draw()
+    def consultar_dia(self, nodos):
+        dia = ultimo_dia_con_datos() or datetime.date.today()
+        return dia, self.viva.consultar(*rango_dia(dia), nodos, self.viva.bucket_minutos)
+
+    def dibujar_dia(self, resultado):
+        dia, datos = resultado
+        self.titular(dia)
+        self.viva.mostrar(datos)
+        self.estado.config(text="")
+        self.pendiente = False
+
+    def titular(self, dia):
+        self.ax.set_title(f"Comparacion de Temperaturas - {dia}", fontsize=24)
+
+    def refrescar(self):
+        peticion = self.viva.peticion_sondeo()
+        tareas = self.controller.tareas
+        if peticion and self.winfo_ismapped() and not tareas.ocupado("comparacion"):
+            aplicar = partial(self.canvas.cuando_libre, self.viva.aplicar_cambios)
+            tareas.enviar("comparacion", peticion, al_terminar=aplicar, grupo=self)
+        self.after(5000, self.refrescar)
 
 
 
@@ -200,8 +233,18 @@ class InterfazSensores(tk.Tk):
         self.configure(background="white")
         self.bind("<Escape>", lambda event: self.destroy())
 
+        preparar_bd()
+        self.tareas = PlanificadorTareas(self)
         self.frames = {}
+        self.frame_actual = None
         self.mostrar_frame(MenuPrincipal)
+        # Primero se pinta el menu; la exportacion de ayer y los modulos pesados esperan a que Tk quede ocioso.
+        self.after_idle(self.after, 100, self.tareas_de_arranque)
+
+    def tareas_de_arranque(self):
+        self.tareas.enviar("exportar_ayer", verificar_y_guardar_dia_anterior,
+                           al_fallar=lambda e: print("Error al guardar las graficas de ayer:", e))
+        self.tareas.enviar("diferidos", importar_diferidos)
 
     def mostrar_frame(self, frame_class):
         if frame_class not in self.frames:
@@ -210,8 +253,20 @@ class InterfazSensores(tk.Tk):
         
         for frame in self.frames.values():
             frame.place_forget()
+
+        # Lo que pidio la pantalla anterior ya no se va a ver: se cancela.
+        frame = self.frames[frame_class]
+        if self.frame_actual is not None and self.frame_actual is not frame:
+            self.tareas.cancelar_grupo(self.frame_actual)
+        self.frame_actual = frame
         
-        self.frames[frame_class].place(relx=0.5, rely=0.5, anchor="center")
+        frame.place(relx=0.5, rely=0.5, anchor="center")
+        if hasattr(frame, "al_mostrar"):
+            frame.al_mostrar()
+
+    def destroy(self):
+        self.tareas.cerrar()
+        super().destroy()
 
 class MenuPrincipal(tk.Frame):
     def __init__(self, controller):
@@ -255,73 +310,112 @@ class DatosTiempoReal(tk.Frame):
         frame_zonas = tk.Frame(self)
         frame_zonas.pack()
         
+        self.nodos = cargar_nodos()
+        self.ultimas_lecturas = UltimasLecturas()
+        self.reglas = cargar_reglas()
+        self.lecturas_dibujadas = None
+        filas, columnas = dimensiones_rejilla(len(self.nodos))
+        # La rejilla original era de 2x2 celdas de 200 px; se conserva el mismo ancho total.
+        self.lado = max(60, 400 // columnas)
+        self.fuente = max(8, self.lado // 10)
+
         frame_temperatura = tk.Frame(frame_zonas)
         frame_temperatura.grid(row=0, column=0, padx=10, pady=10)
-        self.canvas_temp = []
-        self.labels_temp = []
-        
-        for i in range(2):
-            for j in range(2):
-                nodo = i*2 + j + 1
-                canvas = tk.Canvas(frame_temperatura, width=200, height=200, bg="white")
-                canvas.grid(row=i, column=j, padx=5, pady=5)
-                self.canvas_temp.append(canvas)
-                
-                label = tk.Label(frame_temperatura, text="", font=("Arial", 12))
-                label.grid(row=i+2, column=j)
-                self.labels_temp.append(label)
-        
-        tk.Label(frame_temperatura, text="Zonas de Temperatura", font=("Arial", 20)).grid(row=4, column=0, columnspan=2)
+        self.canvas_temp, self.labels_temp = self.crear_rejilla(frame_temperatura, columnas)
+        tk.Label(frame_temperatura, text="Zonas de Temperatura", font=("Arial", 20)).grid(row=2 * filas, column=0, columnspan=columnas)
+
         frame_humedad = tk.Frame(frame_zonas)
         frame_humedad.grid(row=0, column=1, padx=10, pady=10)
-        self.canvas_hum = []
-        self.labels_hum = []
-        
-        for i in range(2):
-            for j in range(2):
-                nodo = i*2 + j + 1
-                canvas = tk.Canvas(frame_humedad, width=200, height=200, bg="white")
-                canvas.grid(row=i, column=j, padx=5, pady=5)
-                self.canvas_hum.append(canvas)
-                
-                label = tk.Label(frame_humedad, text="", font=("Arial", 12))
-                label.grid(row=i+2, column=j)
-                self.labels_hum.append(label)
-        
-        tk.Label(frame_humedad, text="Zonas de Humedad", font=("Arial", 20)).grid(row=4, column=0, columnspan=2)
+        self.canvas_hum, self.labels_hum = self.crear_rejilla(frame_humedad, columnas)
+        tk.Label(frame_humedad, text="Zonas de Humedad", font=("Arial", 20)).grid(row=2 * filas, column=0, columnspan=columnas)
         legend_frame = tk.Frame(self)
         legend_frame.pack(pady=10)
-        tk.Label(legend_frame, text="Temperatura: Verde = Ideal (18-25 C), Rojo = Alta (>25 C), Azul = Baja (<18 C)", 
+        tk.Label(legend_frame, text=texto_leyenda("Temperatura", " C", self.reglas, "temperatura", self.nodos),
                 font=("Arial", 20)).pack()
-        tk.Label(legend_frame, text="Humedad: Verde = Ideal (40-70%), Rojo = Alta (>70%), Azul = Baja (<40%)", 
+        tk.Label(legend_frame, text=texto_leyenda("Humedad", "%", self.reglas, "humedad", self.nodos),
                 font=("Arial", 20)).pack()
+        # Alertas abiertas por el motor del receptor (tabla alertas_activas).
+        self.label_alertas = tk.Label(self, text="", font=("Arial", 16), fg="red", justify="left")
+        self.label_alertas.pack()
         
-        tk.Button(self, text="Volver", font=("Arial", 24), padx=30, pady=20,
-                command=lambda: controller.mostrar_frame(MenuPrincipal)).pack(pady=10)        
-        self.actualizar_mapa()
+        botones = tk.Frame(self)
+        botones.pack(pady=10)
+        tk.Button(botones, text="Ver plano", font=("Arial", 24), padx=30, pady=20,
+                  command=lambda: controller.mostrar_frame(MapaCalor)).pack(side="left", padx=20)
+        tk.Button(botones, text="Volver", font=("Arial", 24), padx=30, pady=20,
+                  command=lambda: controller.mostrar_frame(MenuPrincipal)).pack(side="left", padx=20)
+        self.after(5000, self.actualizar_mapa)
+
+    def crear_rejilla(self, master, columnas):
+        canvases = {}
+        labels = {}
+        for indice, nodo in enumerate(self.nodos):
+            i, j = divmod(indice, columnas)
+            canvas = tk.Canvas(master, width=self.lado, height=self.lado, bg="white")
+            canvas.grid(row=2 * i, column=j, padx=5, pady=5)
+            canvases[nodo] = canvas
+
+            label = tk.Label(master, text="Cargando...", font=("Arial", max(8, self.fuente // 2 + 2)))
+            label.grid(row=2 * i + 1, column=j)
+            labels[nodo] = label
+        return canvases, labels
+
+    def al_mostrar(self):
+        self.pedir_lecturas()
+
+    def pedir_lecturas(self):
+        if not self.controller.tareas.ocupado("mapa"):
+            self.controller.tareas.enviar("mapa", self.ultimas_lecturas.obtener_con_alertas,
+                                          al_terminar=self.pintar_mapa, grupo=self)
+
     def actualizar_mapa(self):
-        for nodo in range(1, 5):
-            datos = obtener_datos(nodo)
+        if self.winfo_ismapped():
+            self.pedir_lecturas()
+        self.after(5000, self.actualizar_mapa)
+
+    def pintar_mapa(self, resultado):
+        ultimos, alertas = resultado
+        if ultimos is self.lecturas_dibujadas:
+            # Sin transacciones nuevas desde el ultimo refresco: no hay nada que redibujar.
+            return
+        self.lecturas_dibujadas = ultimos
+        self.mostrar_alertas(alertas)
+
+        lado, centro = self.lado, self.lado // 2
+        for nodo in self.nodos:
+            datos = ultimos.get(nodo)
             if datos:
-                hora, temp, hum = datos[0]                
-                color_temp = "green" if 18 <= temp <= 25 else "red" if temp > 25 else "blue"
-                color_hum = "green" if 40 <= hum <= 70 else "red" if hum > 70 else "blue"
+                marca_tiempo, temp, hum = datos
+                hora = formatear_hora(marca_tiempo)
+                color_temp = color_rango(temp, self.reglas.rango(nodo, "temperatura"))
+                color_hum = color_rango(hum, self.reglas.rango(nodo, "humedad"))
+                # Borde amarillo mientras el nodo tenga alguna alerta abierta.
+                borde = {"outline": "yellow", "width": 6} if nodo in alertas else {}
                 
-                self.canvas_temp[nodo-1].delete("all")
-                self.canvas_temp[nodo-1].create_rectangle(0, 0, 200, 200, fill=color_temp)
-                self.canvas_temp[nodo-1].create_text(100, 100, text=f"Nodo {nodo}\n{temp}  C", 
-                                                    font=("Arial", 20), fill="white")
-                self.labels_temp[nodo-1].config(text=f"Ultima actualizacion: {hora}")
+                self.canvas_temp[nodo].delete("all")
+                self.canvas_temp[nodo].create_rectangle(0, 0, lado, lado, fill=color_temp, **borde)
+                self.canvas_temp[nodo].create_text(centro, centro, text=f"Nodo {nodo}\n{temp}  C", 
+                                                   font=("Arial", self.fuente), fill="white")
+                self.labels_temp[nodo].config(text=f"Ultima actualizacion: {hora}")
                 
-                self.canvas_hum[nodo-1].delete("all")
-                self.canvas_hum[nodo-1].create_rectangle(0, 0, 200, 200, fill=color_hum)
-                self.canvas_hum[nodo-1].create_text(100, 100, text=f"Nodo {nodo}\n{hum}%", 
-                                                  font=("Arial", 20), fill="white")
-                self.labels_hum[nodo-1].config(text=f"Ultima actualizacion: {hora}")
-        
-        self.after(5000, self.actualizar_mapa)
+                self.canvas_hum[nodo].delete("all")
+                self.canvas_hum[nodo].create_rectangle(0, 0, lado, lado, fill=color_hum, **borde)
+                self.canvas_hum[nodo].create_text(centro, centro, text=f"Nodo {nodo}\n{hum}%", 
+                                                  font=("Arial", self.fuente), fill="white")
+                self.labels_hum[nodo].config(text=f"Ultima actualizacion: {hora}")
+
+    def mostrar_alertas(self, alertas, maximo=6):
+        lineas = [f"Nodo {nodo}: {mensaje} (desde {datetime.datetime.fromtimestamp(desde):%H:%M})"
+                  for nodo, abiertas in sorted(alertas.items()) for _, desde, mensaje in abiertas]
+        if len(lineas) > maximo:
+            lineas = lineas[:maximo] + [f"... y {len(lineas) - maximo} alertas mas"]
+        self.label_alertas.config(text="\n".join(lineas))
 class Graficas(tk.Frame):
     def __init__(self, controller):
+        import matplotlib.pyplot as plt
+        from matplotlib import dates as mdates
+        from graficas_vivas import GraficaViva, LienzoTk
+
         super().__init__(controller)
         self.controller = controller
 
@@ -344,92 +438,332 @@ class Graficas(tk.Frame):
 
         tk.Label(control_frame, text="Seleccionar nodo:", font=("Arial", 28)).pack(side="left")
 
-        self.nodo_var = tk.IntVar(value=1)
-        for i in range(1, 5):
-            tk.Radiobutton(control_frame, text=f"Nodo {i}", variable=self.nodo_var,
-                          value=i, font=("Arial", 32), command=self.mostrar_grafica).pack(side="left", padx=10)
+        nodos = cargar_nodos()
+        self.nodo_var = tk.IntVar(value=nodos[0] if nodos else 1)
+        nodos_frame = tk.Frame(control_frame)
+        nodos_frame.pack(side="left")
+        columnas = min(len(nodos), 10) or 1
+        fuente = 32 if len(nodos) <= 4 else 18
+        for indice, i in enumerate(nodos):
+            tk.Radiobutton(nodos_frame, text=f"Nodo {i}", variable=self.nodo_var,
+                          value=i, font=("Arial", fuente), command=self.mostrar_grafica).grid(
+                              row=indice // columnas, column=indice % columnas, padx=10)
 
         tk.Label(self, text="Graficas de Sensores", font=("Arial", 22)).pack(pady=10)
+        self.estado = tk.Label(self, text="", font=("Arial", 20))
+        self.estado.pack()
 
+        self.pendiente = True
         self.fig, self.ax = plt.subplots(figsize=(14, 8))
-        self.canvas = FigureCanvasTkAgg(self.fig, master=self)
+        self.ax2 = self.ax.twinx()
+        self.canvas = LienzoTk(self.fig, self, controller.tareas)
         self.canvas.get_tk_widget().pack(pady=20)
+        self.viva = GraficaViva(self.canvas, bucket_minutos=self.intervalo_var.get(), al_cambiar_dia=self.titular)
+
+        self.ax.set_xlabel("Hora", fontsize=15)
+        self.ax.set_ylabel("Temperatura (C)", color="red", fontsize=18)
+        self.ax2.set_ylabel("Humedad (%)", color="blue", fontsize=18)
+
+        self.ax.tick_params(axis='y', labelsize=18, labelcolor="red")
+        self.ax2.tick_params(axis='y', labelsize=18, labelcolor="blue")
+        self.ax.tick_params(axis='x', labelsize=18, labelrotation=45)
+
+        self.ax.xaxis.set_major_locator(mdates.HourLocator(interval=2))
+        self.ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
+        self.ax.grid(True)
 
         button_frame = tk.Frame(self)
         button_frame.pack(pady=10)
 
         tk.Button(button_frame, text="Guardar Grafica", font=("Arial", 34),
-                 command=guardar_grafica).pack(side="left", padx=20)
+                 command=self.guardar).pack(side="left", padx=20)
         tk.Button(button_frame, text="Volver", font=("Arial", 34),
                   command=lambda: controller.mostrar_frame(MenuPrincipal)).pack(side="left", padx=20)
 
-        self.mostrar_grafica()
+        self.fig.autofmt_xdate()
+        self.refrescar()
+
+    def al_mostrar(self):
+        if self.pendiente:
+            self.mostrar_grafica()
 
     def set_intervalo(self, valor):
         self.intervalo_var.set(valor)
         self.mostrar_grafica()
         
     def mostrar_grafica(self):
-        from matplotlib import dates as mdates
         nodo = self.nodo_var.get()
         intervalo = self.intervalo_var.get()
-        datos_crudos = sorted(obtener_datos(nodo), key=lambda x: x[0])
-
-        if datos_crudos:
-            hoy = datetime.date.today()
-            datos_filtrados = []
-            ultima_hora = None
-
-            for hora_str, temp, hum in datos_crudos:
-                try:
-                    dt = datetime.datetime.strptime(f"{hoy} {hora_str}", "%Y-%m-%d %H:%M")
-                except:
-                    continue
-
-                if ultima_hora is None or (dt - ultima_hora).total_seconds() >= intervalo * 60:
-                    datos_filtrados.append((dt, temp, hum))
-                    ultima_hora = dt
-
-            if not datos_filtrados:
-                self.ax.clear()
-                self.ax.set_title("No hay datos suficientes con ese intervalo", fontsize=20)
-                self.canvas.draw()
-                return
-
-            horas_dt, temperaturas, humedades = zip(*datos_filtrados)
-
-            self.fig.clf()
-            self.ax = self.fig.add_subplot(111)
-            self.ax2 = self.ax.twinx()
-
-            self.ax.plot(horas_dt, temperaturas, 'ro-', label=f"Temperatura Nodo {nodo} (C)")
-            self.ax2.plot(horas_dt, humedades, 'bo-', label=f"Humedad Nodo {nodo} (%)")
-
-            self.ax.set_xlabel("Hora", fontsize=15)
-            self.ax.set_ylabel("Temperatura (C)", color="red", fontsize=18)
-            self.ax2.set_ylabel("Humedad (%)", color="blue", fontsize=18)
-
-            self.ax.tick_params(axis='y', labelsize=18, labelcolor="red")
-            self.ax2.tick_params(axis='y', labelsize=18, labelcolor="blue")
-            self.ax.tick_params(axis='x', labelsize=18, labelrotation=45)
+        self.viva.bucket_minutos = intervalo
+        self.canvas.cuando_libre(self.cambiar_lineas, nodo)
+
+        self.pendiente = True
+        self.pedida = time.perf_counter()
+        self.estado.config(text="Cargando...")
+        self.controller.tareas.enviar("graficas", self.consultar_dia, nodo, intervalo,
+                                      al_terminar=partial(self.canvas.cuando_libre, self.dibujar_dia), grupo=self)
+
+    def cambiar_lineas(self, nodo):
+        # Los ejes se conservan; solo se sustituyen las lineas del nodo mostrado.
+        self.viva.quitar_lineas()
+        self.viva.agregar_linea(self.ax, nodo, "temperatura", 'ro-', banda="red",
+                                label=f"Temperatura Nodo {nodo} (C)")
+        self.viva.agregar_linea(self.ax2, nodo, "humedad", 'bo-', banda="blue",
+                                label=f"Humedad Nodo {nodo} (%)")
+
+        lineas_1, etiquetas_1 = self.ax.get_legend_handles_labels()
+        lineas_2, etiquetas_2 = self.ax2.get_legend_handles_labels()
+        self.ax.legend(lineas_1 + lineas_2, etiquetas_1 + etiquetas_2, loc='upper left')
+
+    def consultar_dia(self, nodo, intervalo):
+        # Dia en curso o, si el nodo no ha reportado hoy, el ultimo dia con datos.
+        dia = ultimo_dia_con_datos(nodo) or datetime.date.today()
+        return nodo, dia, self.viva.consultar(*rango_dia(dia), [nodo], intervalo)
+
+    def dibujar_dia(self, resultado):
+        _, dia, datos = resultado
+        self.viva.mostrar(datos)
+        self.titular(dia)
+        self.estado.config(text="")
+        self.pendiente = False
+        if metricas.ACTIVAS:
+            # El dibujo se hace en el planificador: se mide cuando llega a la pantalla.
+            self.after_idle(self.canvas.cuando_libre, self.medir_latencia, self.pedida)
+
+    def medir_latencia(self, pedida):
+        LATENCIA_GRAFICA.observar(time.perf_counter() - pedida, "mostrar")
+
+    def titular(self, dia):
+        if self.viva.tiene_datos():
+            self.ax.set_title(f"Datos del nodo {self.nodo_var.get()} - {dia}", fontsize=28)
+        else:
+            self.ax.set_title("No hay datos disponibles", fontsize=20)
 
-            self.ax.set_title(f"Datos del nodo {nodo} - {datetime.date.today()}", fontsize=28)
+    def refrescar(self):
+        peticion = self.viva.peticion_sondeo()
+        tareas = self.controller.tareas
+        if peticion and self.winfo_ismapped() and not tareas.ocupado("graficas"):
+            aplicar = partial(self.canvas.cuando_libre, self.viva.aplicar_cambios)
+            tareas.enviar("graficas", peticion, al_terminar=aplicar, grupo=self)
+        self.after(5000, self.refrescar)
+
+    def guardar(self):
+        # Sin grupo: la exportacion sigue aunque se cambie de pantalla.
+        self.estado.config(text="Guardando graficas...")
+        self.controller.tareas.enviar("exportar", guardar_grafica, al_terminar=self.guardada,
+                                      al_fallar=self.error_guardar)
+
+    def guardada(self, resultado):
+        generadas, omitidas = resultado
+        self.estado.config(text=f"Graficas guardadas: {len(generadas)} nuevas, {omitidas} sin cambios")
+
+    def error_guardar(self, error):
+        print("Error al guardar graficas:", error)
+        self.estado.config(text="Error al guardar graficas")
+ 
 
-            self.ax.xaxis.set_major_locator(mdates.MinuteLocator(interval=intervalo))
-            self.ax.xaxis.set_major_formatter(mdates.DateFormatter("%H:%M"))
 
-            lineas_1, etiquetas_1 = self.ax.get_legend_handles_labels()
-            lineas_2, etiquetas_2 = self.ax2.get_legend_handles_labels()
-            self.ax.legend(lineas_1 + lineas_2, etiquetas_1 + etiquetas_2, loc='upper left')
+class MapaCalor(tk.Frame):
+    # Plano del invernadero con temperatura y humedad interpoladas entre los nodos. En vivo se
+    # refresca con las ultimas lecturas; "Reproducir dia" prepara en el planificador todos los
+    # cuadros del ultimo dia con datos y aqui solo se escalan y se pegan en la misma PhotoImage.
+    def __init__(self, controller):
+        from mapa_calor import Interpolador
 
-            self.ax.grid(True)
-            self.fig.autofmt_xdate()
+        super().__init__(controller)
+        self.controller = controller
+        tk.Label(self, text="Plano del Invernadero", font=("Arial", 28)).pack(pady=10)
+
+        self.reglas = cargar_reglas()
+        self.plano = cargar_plano(cargar_nodos())
+        self.interpolador = Interpolador(self.plano, list(self.plano.posiciones))
+        # El alto de cada mapa sigue la proporcion del plano.
+        self.tamano = (ANCHO_MAPA, max(1, round(ANCHO_MAPA * self.interpolador.filas / self.interpolador.columnas)))
+        self.ultimas_lecturas = UltimasLecturas()
+        self.lecturas_dibujadas = None
+        self.dia = None
+        self.cuadro = None
+        self.reproduciendo = False
+        self.id_avance = None
+
+        frame_mapas = tk.Frame(self)
+        frame_mapas.pack()
+        self.canvas = {}
+        self.imagenes = {}
+        self.fotos = {}
+        self.textos = {}
+        for columna, (campo, titulo) in enumerate((("temperatura", "Temperatura (C)"), ("humedad", "Humedad (%)"))):
+            canvas = tk.Canvas(frame_mapas, width=self.tamano[0], height=self.tamano[1], bg="white",
+                               highlightthickness=0)
+            canvas.grid(row=0, column=columna, padx=10, pady=5)
+            tk.Label(frame_mapas, text=titulo, font=("Arial", 20)).grid(row=1, column=columna)
+            self.canvas[campo] = canvas
+            self.imagenes[campo] = canvas.create_image(0, 0, anchor="nw")
+            self.textos[campo] = self.crear_marcas(canvas)
+
+        self.estado = tk.Label(self, text="Cargando...", font=("Arial", 20))
+        self.estado.pack(pady=5)
+        self.posicion = tk.Scale(self, from_=0, to=0, orient="horizontal", length=2 * ANCHO_MAPA,
+                                 showvalue=False, command=lambda valor: self.mostrar_cuadro(int(valor)))
+        self.posicion.pack()
+
+        controles = tk.Frame(self)
+        controles.pack(pady=10)
+        tk.Button(controles, text="En vivo", font=("Arial", 24),
+                  command=self.en_vivo).pack(side="left", padx=15)
+        tk.Button(controles, text="Reproducir dia", font=("Arial", 24),
+                  command=self.reproducir).pack(side="left", padx=15)
+        self.boton_pausa = tk.Button(controles, text="Pausa", font=("Arial", 24), state="disabled",
+                                     command=self.pausar)
+        self.boton_pausa.pack(side="left", padx=15)
+        tk.Button(controles, text="Volver", font=("Arial", 24),
+                  command=lambda: controller.mostrar_frame(DatosTiempoReal)).pack(side="left", padx=15)
+        self.after(5000, self.actualizar)
+
+    def crear_marcas(self, canvas):
+        factor = self.tamano[0] / self.interpolador.columnas
+        textos = {}
+        for nodo in self.interpolador.nodos:
+            x, y = (coordenada * factor for coordenada in self.interpolador.celda(nodo, self.plano))
+            canvas.create_oval(x - 4, y - 4, x + 4, y + 4, fill="black", outline="white")
+            textos[nodo] = canvas.create_text(x, y - 6, text=f"{nodo}", anchor="s", font=("Arial", 11, "bold"))
+        return textos
+
+    def al_mostrar(self):
+        if self.dia is None:
+            self.pedir_lecturas()
+
+    def pedir_lecturas(self):
+        if not self.controller.tareas.ocupado("mapa_calor"):
+            self.controller.tareas.enviar("mapa_calor", self.ultimas_lecturas.obtener_con_alertas,
+                                          al_terminar=self.pintar_lecturas, grupo=self)
+
+    def actualizar(self):
+        if self.winfo_ismapped() and self.dia is None:
+            self.pedir_lecturas()
+        self.after(5000, self.actualizar)
+
+    def pintar_lecturas(self, resultado):
+        from mapa_calor import MARGENES, colorear, rango_finito
+
+        ultimos, _ = resultado
+        if ultimos is self.lecturas_dibujadas or self.dia is not None:
+            return
+        self.lecturas_dibujadas = ultimos
+        for campo, indice in (("temperatura", 1), ("humedad", 2)):
+            valores = self.interpolador.vector({nodo: datos[indice] for nodo, datos in ultimos.items()})
+            rango = rango_finito(self.reglas.rango(None, campo), valores)
+            self.pintar(campo, colorear(self.interpolador.interpolar(valores), rango, MARGENES[campo]), valores)
+        self.estado.config(text="En vivo")
+
+    def pintar(self, campo, rgb, valores):
+        img = imagen_rgb(rgb, self.tamano)
+        if campo in self.fotos:
+            # paste reutiliza la imagen de Tk: no se crea ni se destruye nada por cuadro.
+            self.fotos[campo].paste(img)
         else:
-            self.ax.clear()
-            self.ax.set_title("No hay datos disponibles", fontsize=20)
-
-        self.canvas.draw()
- 
+            self.fotos[campo] = foto_tk(img)
+            self.canvas[campo].itemconfig(self.imagenes[campo], image=self.fotos[campo])
+        canvas = self.canvas[campo]
+        for nodo, valor in zip(self.interpolador.nodos, valores.tolist()):
+            canvas.itemconfig(self.textos[campo][nodo], text=f"{nodo}: {valor:.1f}" if valor == valor else f"{nodo}: --")
+
+    def preparar_dia(self, bucket_minutos):
+        # En un hilo del planificador: la consulta, la interpolacion de todos los cuadros (un
+        # producto de matrices por campo) y el color. Se quitan los cuadros sin ningun dato.
+        import numpy as np
+        from mapa_calor import MARGENES, colorear, matriz_del_dia, rango_finito
+        from series import cargar_series
+
+        dia = ultimo_dia_con_datos() or datetime.date.today()
+        desde, hasta = rango_dia(dia)
+        nodos = self.interpolador.nodos
+        series = cargar_series(desde, hasta, bucket_minutos, nodos)
+        paso = bucket_minutos * 60
+        inicio = int(np.datetime64(desde, "s").astype(np.int64))
+        matrices = {campo: matriz_del_dia(series, nodos, inicio, paso, 86400 // paso, campo)
+                    for campo in ("temperatura", "humedad")}
+        con_datos = np.flatnonzero(~np.isnan(matrices["temperatura"]).all(axis=1))
+        if not len(con_datos):
+            return None
+        cuadros = slice(con_datos[0], con_datos[-1] + 1)
+        resultado = {"dia": dia, "marcas": inicio + np.arange(86400 // paso)[cuadros] * paso}
+        for campo, matriz in matrices.items():
+            matriz = matriz[cuadros]
+            rango = rango_finito(self.reglas.rango(None, campo), matriz)
+            resultado[campo] = (matriz, colorear(self.interpolador.interpolar_serie(matriz), rango, MARGENES[campo]))
+        return resultado
+
+    def reproducir(self):
+        self.detener()
+        self.estado.config(text="Preparando el dia...")
+        self.controller.tareas.enviar("mapa_dia", self.preparar_dia, BUCKET_REPRODUCCION,
+                                      al_terminar=self.empezar, al_fallar=self.error_dia, grupo=self)
+
+    def empezar(self, dia):
+        if dia is None:
+            self.estado.config(text="No hay datos para reproducir")
+            return
+        self.dia = dia
+        self.cuadro = None
+        self.posicion.config(to=len(dia["marcas"]) - 1)
+        self.mostrar_cuadro(0)
+        self.seguir()
+
+    def seguir(self):
+        self.reproduciendo = True
+        self.boton_pausa.config(state="normal", text="Pausa")
+        self.id_avance = self.after(PERIODO_CUADRO_MS, self.avanzar)
+
+    def detener(self):
+        self.reproduciendo = False
+        self.boton_pausa.config(text="Seguir")
+        if self.id_avance is not None:
+            self.after_cancel(self.id_avance)
+            self.id_avance = None
+
+    def avanzar(self):
+        self.id_avance = None
+        if self.dia is None or not self.winfo_ismapped() or self.cuadro + 1 >= len(self.dia["marcas"]):
+            self.detener()
+            return
+        inicio = time.perf_counter()
+        self.mostrar_cuadro(self.cuadro + 1)
+        # El tiempo de pintar se descuenta del periodo para mantener el ritmo.
+        transcurrido = int((time.perf_counter() - inicio) * 1000)
+        self.id_avance = self.after(max(1, PERIODO_CUADRO_MS - transcurrido), self.avanzar)
+
+    def mostrar_cuadro(self, cuadro):
+        if self.dia is None or cuadro == self.cuadro:
+            return
+        self.cuadro = cuadro
+        for campo in ("temperatura", "humedad"):
+            matriz, rgb = self.dia[campo]
+            self.pintar(campo, rgb[cuadro], matriz[cuadro])
+        self.posicion.set(cuadro)
+        # Las marcas siguen la convencion de lecturas: hora local contada como UTC.
+        hora = time.strftime("%H:%M", time.gmtime(int(self.dia["marcas"][cuadro])))
+        self.estado.config(text=f"{self.dia['dia']} {hora}")
+
+    def pausar(self):
+        if self.reproduciendo:
+            self.detener()
+        elif self.dia is not None:
+            if self.cuadro + 1 >= len(self.dia["marcas"]):
+                self.mostrar_cuadro(0)
+            self.seguir()
+
+    def en_vivo(self):
+        self.detener()
+        self.dia = None
+        self.lecturas_dibujadas = None
+        self.boton_pausa.config(state="disabled", text="Pausa")
+        self.posicion.config(to=0)
+        self.pedir_lecturas()
+
+    def error_dia(self, error):
+        print("Error al preparar el dia:", error)
+        self.estado.config(text="Error al preparar el dia")
 
 
 class ImagenesGuardadas(tk.Frame):
@@ -437,11 +771,31 @@ class ImagenesGuardadas(tk.Frame):
         super().__init__(controller)
         self.controller = controller
         tk.Label(self, text="Imagenes Guardadas", font=("Arial", 26)).pack(pady=20)
-        
+
+        self.indice = IndiceGraficas(RUTA_GRAFICAS)
+        self.fotos = CacheLRU(8)
         self.index = 0
+        self.lista_imagenes = []
+
+        filtro_frame = tk.Frame(self)
+        filtro_frame.pack()
+        tk.Label(filtro_frame, text="Nodo:", font=("Arial", 22)).pack(side="left", padx=10)
+        self.nodo_var = tk.StringVar(value="Todos")
+        self.combo_nodo = ttk.Combobox(filtro_frame, textvariable=self.nodo_var, values=["Todos"],
+                                       state="readonly", font=("Arial", 22), width=8)
+        self.combo_nodo.pack(side="left", padx=10)
+        tk.Label(filtro_frame, text="Fecha:", font=("Arial", 22)).pack(side="left", padx=10)
+        self.fecha_var = tk.StringVar(value="Todas")
+        self.combo_fecha = ttk.Combobox(filtro_frame, textvariable=self.fecha_var, values=["Todas"],
+                                        state="readonly", font=("Arial", 22), width=12)
+        self.combo_fecha.pack(side="left", padx=10)
+        self.combo_nodo.bind("<<ComboboxSelected>>", lambda event: self.aplicar_filtro())
+        self.combo_fecha.bind("<<ComboboxSelected>>", lambda event: self.aplicar_filtro())
+
+        self.estado = tk.Label(self, text="", font=("Arial", 20))
+        self.estado.pack()
         self.imagen_label = tk.Label(self)
         self.imagen_label.pack()
-        self.actualizar_lista_imagenes()
 
         
         control_frame = tk.Frame(self)
@@ -456,33 +810,74 @@ class ImagenesGuardadas(tk.Frame):
         
         tk.Button(self, text="Volver", font=("Arial", 32), 
                  command=lambda: controller.mostrar_frame(MenuPrincipal)).pack(pady=10)
-        if self.lista_imagenes:
-            self.mostrar_imagen()
-        else:
-            self.imagen_label.config(text="No hay imagenes guardadas", font=("Arial", 24))
+
+    def al_mostrar(self):
+        self.actualizar_lista_imagenes()
     
     def actualizar_lista_imagenes(self):
-        self.lista_imagenes = [f for f in os.listdir("graficas") if f.endswith(('.png', '.jpg', '.jpeg'))]
-        self.lista_imagenes.sort(reverse=True)  
+        self.estado.config(text="Cargando...")
+        self.controller.tareas.enviar("lista_imagenes", sincronizar, self.indice, TAMANO_VISOR, RUTA_CACHE,
+                                      al_terminar=self.mostrar_lista, grupo=self)
+
+    def mostrar_lista(self, cambio):
+        self.combo_nodo.config(values=["Todos"] + [str(nodo) for nodo in self.indice.nodos()])
+        self.combo_fecha.config(values=["Todas"] + self.indice.fechas())
+        self.aplicar_filtro()
+
+    def aplicar_filtro(self):
+        # El filtro se resuelve con el indice en memoria, sin volver a listar el directorio.
+        nodo = self.nodo_var.get()
+        fecha = self.fecha_var.get()
+        self.lista_imagenes = self.indice.filtrar(None if nodo == "Todos" else int(nodo),
+                                                  None if fecha == "Todas" else fecha)
         self.index = 0
         if self.lista_imagenes:
             self.mostrar_imagen()
         else:
-            self.imagen_label.config(text="No hay imagenes guardadas", font=("Arial", 24))
+            self.estado.config(text="")
+            self.imagen_label.config(image="", text="No hay imagenes guardadas", font=("Arial", 24))
+
+    def pedir_imagen(self, clave, grafica, al_terminar, al_fallar=None):
+        return self.controller.tareas.enviar(clave, imagen_escalada, self.indice.ruta(grafica), TAMANO_VISOR,
+                                             grafica.mtime_ns, RUTA_CACHE, al_terminar=al_terminar,
+                                             al_fallar=al_fallar, grupo=self)
     
     def mostrar_imagen(self):
         if self.lista_imagenes:
-            ruta_imagen = os.path.join("graficas", self.lista_imagenes[self.index])
-            try:
-                img = Image.open(ruta_imagen)
-                img = img.resize((1150, 800), Image.LANCZOS)
-                self.imagen_tk = ImageTk.PhotoImage(img)
-                self.imagen_label.config(image=self.imagen_tk)
-                
-            except Exception as e:
-                print(f"Error al cargar imagen: {e}")
-                self.imagen_label.config(text=f"Error al cargar imagen: {self.lista_imagenes[self.index]}", 
-                                       font=("Arial", 24))
+            grafica = self.lista_imagenes[self.index]
+            foto = self.fotos.obtener(grafica)
+            if foto is not None:
+                self.poner_foto(foto)
+                return
+            self.estado.config(text="Cargando...")
+            self.pedir_imagen("imagen", grafica, lambda img: self.poner_imagen(grafica, img),
+                              lambda e: self.error_imagen(grafica.nombre, e))
+
+    def poner_imagen(self, grafica, img):
+        # El PhotoImage se crea en el hilo de Tk y se guarda en la cache LRU.
+        foto = foto_tk(img)
+        self.fotos.guardar(grafica, foto)
+        self.poner_foto(foto)
+
+    def poner_foto(self, foto):
+        self.imagen_tk = foto
+        self.imagen_label.config(image=foto, text="")
+        self.estado.config(text="")
+        self.precargar()
+
+    def precargar(self):
+        # Las vecinas se preparan en segundo plano para que Anterior/Siguiente sean inmediatos.
+        for paso in (1, -1):
+            vecina = self.lista_imagenes[(self.index + paso) % len(self.lista_imagenes)]
+            if vecina not in self.fotos:
+                self.pedir_imagen(f"precarga{paso}", vecina,
+                                  lambda img, g=vecina: self.fotos.guardar(g, foto_tk(img)))
+
+    def error_imagen(self, nombre, error):
+        print(f"Error al cargar imagen: {error}")
+        self.estado.config(text="")
+        self.imagen_label.config(image="", text=f"Error al cargar imagen: {nombre}", font=("Arial", 24))
+
     def anterior_imagen(self):
         if self.lista_imagenes:
             self.index = (self.index - 1) % len(self.lista_imagenes)
@@ -494,7 +889,10 @@ class ImagenesGuardadas(tk.Frame):
             self.mostrar_imagen()
 
 if __name__ == "__main__":
-    verificar_y_guardar_dia_anterior() 
-    app = InterfazSensores()
-    app.mainloop()
+    parser = argparse.ArgumentParser(description="Interfaz de los sensores del invernadero.")
+    metricas.agregar_argumentos(parser)
+    args = parser.parse_args()
+    with metricas.sesion(args):
+        app = InterfazSensores()
+        app.mainloop()
 
@@ -0,0 +1,116 @@
+import math
+
+import numpy as np
+
+# Interpolacion por inverso de la distancia (IDW) de las lecturas de los nodos sobre una rejilla
+# del plano. Los pesos de cada celda a cada nodo dependen solo de las posiciones, asi que se
+# calculan una vez por plano: un refresco es un producto matriz-vector y un dia entero, un
+# producto de matrices.
+CELDAS = 160
+POTENCIA = 2
+# Fuera del rango ideal el color pasa de verde a azul o a rojo en este margen.
+MARGENES = {"temperatura": 5.0, "humedad": 15.0}
+AZUL = (30, 60, 220)
+VERDE = (30, 170, 60)
+ROJO = (220, 40, 30)
+GRIS = (160, 160, 160)
+
+
+class Interpolador:
+    def __init__(self, plano, nodos, celdas=CELDAS, potencia=POTENCIA):
+        self.nodos = [nodo for nodo in nodos if nodo in plano.posiciones]
+        # celdas en el lado mayor del plano; el otro lado conserva la proporcion.
+        self.escala = celdas / max(plano.ancho, plano.alto)
+        self.columnas = max(1, round(plano.ancho * self.escala))
+        self.filas = max(1, round(plano.alto * self.escala))
+        posiciones = np.array([plano.posiciones[nodo] for nodo in self.nodos], dtype=np.float64).reshape(-1, 2)
+        xs = (np.arange(self.columnas) + 0.5) / self.escala
+        ys = (np.arange(self.filas) + 0.5) / self.escala
+        x, y = np.meshgrid(xs, ys)
+        distancias2 = ((x.reshape(-1, 1) - posiciones[:, 0]) ** 2 + (y.reshape(-1, 1) - posiciones[:, 1]) ** 2)
+        # Sobre d^2 se evita la raiz; una celda sobre un nodo toma practicamente su valor.
+        pesos = 1.0 / np.maximum(distancias2, 1e-9) ** (potencia / 2)
+        self.pesos = (pesos / pesos.sum(axis=1, keepdims=True)).astype(np.float32)
+
+    def vector(self, valores):
+        # {nodo: valor} -> vector en el orden de self.nodos, NaN donde no hay lectura.
+        return np.array([valores.get(nodo, math.nan) for nodo in self.nodos], dtype=np.float32)
+
+    def interpolar(self, valores):
+        return self.interpolar_serie(np.asarray(valores, dtype=np.float32).reshape(1, -1))[0]
+
+    def interpolar_serie(self, matriz):
+        # matriz (instantes, nodos) -> (instantes, filas, columnas). Un nodo sin dato en un
+        # instante se quita de la media de ese instante: el numerador usa 0 en su lugar y el
+        # denominador suma solo los pesos de los nodos presentes. Dos productos de matrices
+        # para todo el dia, tenga los huecos que tenga.
+        matriz = np.asarray(matriz, dtype=np.float32)
+        if not self.nodos:
+            return np.full((len(matriz), self.filas, self.columnas), np.nan, dtype=np.float32)
+        presentes = ~np.isnan(matriz)
+        if presentes.all():
+            salida = matriz @ self.pesos.T
+        else:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                salida = (np.where(presentes, matriz, 0) @ self.pesos.T) / (presentes.astype(np.float32) @ self.pesos.T)
+        return salida.reshape(len(matriz), self.filas, self.columnas)
+
+    def celda(self, nodo, plano):
+        # Posicion del nodo en pixeles de la rejilla.
+        x, y = plano.posiciones[nodo]
+        return x * self.escala, y * self.escala
+
+
+def paleta(rango, margen, colores=256):
+    # Tabla de colores de minimo - margen a maximo + margen: azul por debajo del rango ideal,
+    # verde dentro y rojo por encima.
+    minimo, maximo = rango
+    puntos = [minimo - margen, minimo, maximo, maximo + margen]
+    valores = np.linspace(puntos[0], puntos[-1], colores)
+    tabla = np.array([AZUL, VERDE, VERDE, ROJO], dtype=np.float32)
+    return np.stack([np.interp(valores, puntos, tabla[:, canal]) for canal in range(3)], axis=1).astype(np.uint8)
+
+
+def rango_finito(rango, valores):
+    # Sin regla de rango (infinitos) se usa el de los propios valores.
+    minimo, maximo = rango
+    if math.isfinite(minimo) and math.isfinite(maximo):
+        return rango
+    valores = np.asarray(valores)
+    if np.isnan(valores).all():
+        return 0.0, 1.0
+    return float(np.nanmin(valores)), float(np.nanmax(valores))
+
+
+def colorear(rejilla, rango, margen):
+    # rejilla (..., filas, columnas) -> uint8 (..., filas, columnas, 3). NaN queda en gris.
+    tabla = paleta(rango, margen)
+    minimo, maximo = rango[0] - margen, rango[1] + margen
+    escala = (len(tabla) - 1) / max(maximo - minimo, 1e-6)
+    with np.errstate(invalid="ignore"):
+        indices = np.clip((rejilla - minimo) * escala, 0, len(tabla) - 1)
+    huecos = np.isnan(rejilla)
+    rgb = tabla[np.where(huecos, 0, indices).astype(np.uint8)]
+    rgb[huecos] = GRIS
+    return rgb
+
+
+def matriz_del_dia(series, nodos, inicio, paso, cuadros, campo):
+    # Series por nodo (series.cargar_series) -> matriz (cuadros, nodos) alineada en cubetas de
+    # `paso` segundos desde `inicio`; NaN donde un nodo no tiene dato.
+    matriz = np.full((cuadros, len(nodos)), np.nan, dtype=np.float32)
+    for j, nodo in enumerate(nodos):
+        serie = series.get(nodo)
+        if serie is None or not len(serie.marcas):
+            continue
+        indices = (serie.marcas.astype(np.int64) - inicio) // paso
+        validos = (indices >= 0) & (indices < cuadros)
+        matriz[indices[validos], j] = np.asarray(getattr(serie, campo))[validos]
+    # Los huecos de un nodo repiten su valor anterior, como el arrastre de lecturas.
+    for j in range(len(nodos)):
+        columna = matriz[:, j]
+        definidos = np.flatnonzero(~np.isnan(columna))
+        if len(definidos):
+            origen = np.maximum.accumulate(np.where(~np.isnan(columna), np.arange(cuadros), definidos[0]))
+            columna[definidos[0]:] = columna[origen[definidos[0]:]]
+    return matriz
@@ -0,0 +1,287 @@
+import bisect
+import contextlib
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+
+# Contadores, medidores e histogramas del proceso. Desactivadas (lo normal) los metodos de
+# registro son una funcion vacia y medir() devuelve un contexto que no hace nada; activar()
+# los sustituye por los que acumulan. Los contadores que ya llevan las clases (recibidas,
+# filas_escritas...) se leen con `funcion` al exportar y no cuestan nada en el camino caliente.
+ACTIVAS = False
+REGISTRO = {}
+# Limites superiores de las cubetas de latencia, en segundos.
+LATENCIAS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _nada(*_, **__):
+    pass
+
+
+class _SinMedida:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        return False
+
+
+SIN_MEDIDA = _SinMedida()
+
+
+def _sin_medida(etiqueta=None):
+    return SIN_MEDIDA
+
+
+def _etiquetas(**pares):
+    texto = ",".join(f'{clave}="{valor}"' for clave, valor in pares.items() if clave)
+    return "{" + texto + "}" if texto else ""
+
+
+class Metrica:
+    # Con `etiqueta` (p. ej. "nodo") cada valor va por separado; `funcion`, si se da, devuelve
+    # el valor (o {etiqueta: valor}) en el momento de exportar.
+    tipo = None
+
+    def __init__(self, nombre, ayuda, etiqueta=None, funcion=None):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiqueta = etiqueta
+        self.funcion = funcion
+        self.valores = {}
+        self.conectar(ACTIVAS)
+
+    def conectar(self, activa):
+        pass
+
+    def leer(self):
+        if self.funcion is None:
+            return dict(self.valores)
+        valor = self.funcion()
+        return valor if isinstance(valor, dict) else {None: valor}
+
+    def exportar(self):
+        for etiqueta, valor in sorted(self.leer().items(), key=lambda par: str(par[0])):
+            yield f"{self.nombre}{_etiquetas(**{self.etiqueta or '': etiqueta})} {valor}"
+
+    def resumen(self):
+        valores = self.leer()
+        return valores.get(None) if self.etiqueta is None else {str(e): v for e, v in valores.items()}
+
+
+class Contador(Metrica):
+    tipo = "counter"
+
+    def conectar(self, activa):
+        self.inc = self._inc if activa else _nada
+
+    def _inc(self, n=1, etiqueta=None):
+        self.valores[etiqueta] = self.valores.get(etiqueta, 0) + n
+
+
+class Medidor(Metrica):
+    tipo = "gauge"
+
+    def conectar(self, activa):
+        self.fijar = self._fijar if activa else _nada
+
+    def _fijar(self, valor, etiqueta=None):
+        self.valores[etiqueta] = valor
+
+
+class Histograma(Metrica):
+    tipo = "histogram"
+
+    def __init__(self, nombre, ayuda, etiqueta=None, limites=LATENCIAS):
+        self.limites = limites
+        super().__init__(nombre, ayuda, etiqueta)
+
+    def conectar(self, activa):
+        self.observar = self._observar if activa else _nada
+        self.medir = self._medir if activa else _sin_medida
+
+    def _observar(self, valor, etiqueta=None):
+        # [cuenta por cubeta (la ultima, +Inf), suma, total]
+        datos = self.valores.get(etiqueta)
+        if datos is None:
+            datos = self.valores[etiqueta] = [[0] * (len(self.limites) + 1), 0.0, 0]
+        datos[0][bisect.bisect_left(self.limites, valor)] += 1
+        datos[1] += valor
+        datos[2] += 1
+
+    @contextlib.contextmanager
+    def _medir(self, etiqueta=None):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._observar(time.perf_counter() - inicio, etiqueta)
+
+    def exportar(self):
+        for etiqueta, (cubetas, suma, total) in sorted(self.valores.items(), key=lambda par: str(par[0])):
+            propia = {self.etiqueta or "": etiqueta}
+            acumulado = 0
+            for limite, cuenta in zip(self.limites + ("+Inf",), cubetas):
+                acumulado += cuenta
+                yield f"{self.nombre}_bucket{_etiquetas(**propia, le=limite)} {acumulado}"
+            yield f"{self.nombre}_sum{_etiquetas(**propia)} {suma}"
+            yield f"{self.nombre}_count{_etiquetas(**propia)} {total}"
+
+    def cuantil(self, etiqueta, q):
+        # Limite superior de la cubeta que contiene el cuantil q.
+        cubetas, _, total = self.valores[etiqueta]
+        objetivo = q * total
+        acumulado = 0
+        for limite, cuenta in zip(self.limites + (float("inf"),), cubetas):
+            acumulado += cuenta
+            if acumulado >= objetivo:
+                return limite
+        return float("inf")
+
+    def resumen(self):
+        resumen = {str(etiqueta): {"n": total, "media": suma / total, "p50": self.cuantil(etiqueta, 0.5),
+                                   "p95": self.cuantil(etiqueta, 0.95)}
+                   for etiqueta, (_, suma, total) in self.valores.items() if total}
+        return resumen.get("None") if self.etiqueta is None else resumen
+
+
+def _registrar(clase, nombre, *args, **kwargs):
+    # Idempotente: volver a registrar un nombre devuelve la misma metrica y, si se da,
+    # actualiza su funcion (p. ej. un motor nuevo que sustituye al anterior).
+    metrica = REGISTRO.get(nombre)
+    if metrica is None:
+        metrica = REGISTRO[nombre] = clase(nombre, *args, **kwargs)
+    elif kwargs.get("funcion") is not None:
+        metrica.funcion = kwargs["funcion"]
+    return metrica
+
+
+def contador(nombre, ayuda, etiqueta=None, funcion=None):
+    return _registrar(Contador, nombre, ayuda, etiqueta, funcion=funcion)
+
+
+def medidor(nombre, ayuda, etiqueta=None, funcion=None):
+    return _registrar(Medidor, nombre, ayuda, etiqueta, funcion=funcion)
+
+
+def histograma(nombre, ayuda, etiqueta=None, limites=LATENCIAS):
+    return _registrar(Histograma, nombre, ayuda, etiqueta, limites=limites)
+
+
+def activar():
+    global ACTIVAS
+    ACTIVAS = True
+    for metrica in REGISTRO.values():
+        metrica.conectar(True)
+
+
+def texto_prometheus():
+    lineas = []
+    for metrica in REGISTRO.values():
+        lineas.append(f"# HELP {metrica.nombre} {metrica.ayuda}")
+        lineas.append(f"# TYPE {metrica.nombre} {metrica.tipo}")
+        lineas.extend(metrica.exportar())
+    return "\n".join(lineas) + "\n"
+
+
+def instantanea():
+    return {nombre: metrica.resumen() for nombre, metrica in REGISTRO.items()}
+
+
+class VolcadoMetricas:
+    # Cada `periodo` segundos: un .prom (texto Prometheus, reemplazado de forma atomica, para el
+    # textfile collector de node_exporter) o una linea JSON anadida a cualquier otro archivo.
+    def __init__(self, ruta, periodo=60.0):
+        self.ruta = ruta
+        self.periodo = periodo
+        self._detener = threading.Event()
+        self._hilo = None
+
+    def volcar(self):
+        if self.ruta.endswith(".prom"):
+            temporal = self.ruta + ".tmp"
+            with open(temporal, "w", encoding="utf-8") as f:
+                f.write(texto_prometheus())
+            os.replace(temporal, self.ruta)
+        else:
+            with open(self.ruta, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"t": round(time.time(), 3), **instantanea()}) + "\n")
+
+    def _bucle(self):
+        while not self._detener.wait(self.periodo):
+            self.volcar()
+
+    def iniciar(self):
+        self._hilo = threading.Thread(target=self._bucle, name="volcado-metricas", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+        self.volcar()
+
+
+# cProfile solo ve el hilo que lo activa: con --profile cada hilo propio llama a
+# perfilar_hilo() al empezar y todos los perfiles se juntan al final.
+_perfilando = False
+_perfiles = []
+
+
+def perfilar_hilo():
+    if _perfilando:
+        perfil = cProfile.Profile()
+        _perfiles.append(perfil)
+        perfil.enable()
+
+
+@contextlib.contextmanager
+def perfilar(ruta, lineas=25):
+    global _perfilando
+    if not ruta:
+        yield
+        return
+    _perfilando = True
+    principal = cProfile.Profile()
+    _perfiles.append(principal)
+    principal.enable()
+    try:
+        yield
+    finally:
+        principal.disable()
+        _perfilando = False
+        salida = io.StringIO()
+        estadisticas = pstats.Stats(*_perfiles, stream=salida)
+        estadisticas.dump_stats(ruta)
+        estadisticas.sort_stats("cumulative").print_stats(lineas)
+        print(f"Perfil de {len(_perfiles)} hilos guardado en {ruta}")
+        print(salida.getvalue())
+        _perfiles.clear()
+
+
+def agregar_argumentos(parser):
+    parser.add_argument("--metricas", metavar="RUTA",
+                        help="activar las metricas y volcarlas a RUTA (.prom: texto Prometheus; si no, lineas JSON)")
+    parser.add_argument("--periodo-metricas", type=float, default=60.0, metavar="S")
+    parser.add_argument("--profile", metavar="RUTA", help="guardar las estadisticas de cProfile de la sesion en RUTA")
+
+
+@contextlib.contextmanager
+def sesion(args):
+    # Para main(): metricas y perfil segun los argumentos de agregar_argumentos.
+    volcado = None
+    if args.metricas:
+        activar()
+        volcado = VolcadoMetricas(args.metricas, args.periodo_metricas)
+        volcado.iniciar()
+    try:
+        with perfilar(args.profile):
+            yield
+    finally:
+        if volcado is not None:
+            volcado.detener()
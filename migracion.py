@@ -0,0 +1,121 @@
+import argparse
+import sqlite3
+import time
+
+# Vista con el formato anterior de sensores (marca_tiempo TEXT, valores REAL) sobre lecturas.
+SQL_VISTA = """
+    CREATE VIEW sensores AS
+    SELECT datetime(ts, 'unixepoch') AS marca_tiempo, nodo,
+           temperatura / 100.0 AS temperatura, humedad / 100.0 AS humedad, arrastrado
+    FROM lecturas
+"""
+
+# Durante la migracion la vista une lo ya copiado con lo que queda en la tabla antigua,
+# asi agregados.reconstruir y el relleno de ultimas_lecturas siempre ven el historial completo.
+SQL_VISTA_MIGRACION = SQL_VISTA + """
+    UNION ALL
+    SELECT marca_tiempo, nodo, temperatura, humedad, arrastrado
+    FROM sensores_v1
+    WHERE marca_tiempo < (SELECT valor FROM estado_ingesta WHERE clave = 'migracion_hasta')
+"""
+
+# Se copia por grupos completos de marca_tiempo, de la mas reciente a la mas antigua, para que
+# las graficas del dia en curso tengan datos cuanto antes. OR IGNORE: lo que el escritor ya
+# guardo en lecturas tiene prioridad.
+SQL_COPIAR = """
+    INSERT OR IGNORE INTO lecturas (nodo, ts, temperatura, humedad, arrastrado)
+    SELECT nodo, CAST(strftime('%s', marca_tiempo) AS INTEGER),
+           CAST(round(temperatura * 100) AS INTEGER), CAST(round(humedad * 100) AS INTEGER), arrastrado
+    FROM sensores_v1
+    WHERE marca_tiempo >= ? AND marca_tiempo < ?
+"""
+
+SQL_ESTADO = """
+    INSERT INTO estado_ingesta (clave, valor) VALUES ('migracion_hasta', ?)
+    ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor
+"""
+
+
+def tipo_de(conn, nombre):
+    fila = conn.execute("SELECT type FROM sqlite_master WHERE name = ?", (nombre,)).fetchone()
+    return fila[0] if fila else None
+
+
+def preparar(conn):
+    # Se llama desde inicializar_bd, con lecturas y estado_ingesta ya creadas.
+    if tipo_de(conn, "sensores") == "view":
+        return
+    with conn:
+        # IMMEDIATE: si la interfaz y el receptor arrancan a la vez, solo uno renombra la tabla.
+        conn.execute("BEGIN IMMEDIATE")
+        tipo = tipo_de(conn, "sensores")
+        if tipo is None:
+            conn.execute(SQL_VISTA)
+        elif tipo == "table":
+            columnas = {fila[1] for fila in conn.execute("PRAGMA table_info(sensores)")}
+            if "arrastrado" not in columnas:
+                conn.execute("ALTER TABLE sensores ADD COLUMN arrastrado INTEGER NOT NULL DEFAULT 0")
+            conn.execute("ALTER TABLE sensores RENAME TO sensores_v1")
+            conn.execute(SQL_ESTADO, ("9999",))
+            conn.execute(SQL_VISTA_MIGRACION)
+            print("Esquema anterior detectado: el historial se copiara a lecturas en segundo plano.")
+
+
+def pendiente(conn):
+    return tipo_de(conn, "sensores_v1") == "table"
+
+
+def migrar_lote(conn, lote=20000):
+    # Devuelve (filas copiadas, terminada). Cada lote es una transaccion corta.
+    fila = conn.execute("SELECT valor FROM estado_ingesta WHERE clave = 'migracion_hasta'").fetchone()
+    if fila is None or not pendiente(conn):
+        return 0, True
+    hasta = fila[0]
+    limite = conn.execute("SELECT marca_tiempo FROM sensores_v1 WHERE marca_tiempo < ? "
+                          "ORDER BY marca_tiempo DESC LIMIT 1 OFFSET ?", (hasta, lote - 1)).fetchone()
+    desde = limite[0] if limite else ""
+    with conn:
+        copiadas = conn.execute(SQL_COPIAR, (desde, hasta)).rowcount
+        if limite is None:
+            conn.execute("DROP VIEW sensores")
+            conn.execute("DROP TABLE sensores_v1")
+            conn.execute(SQL_VISTA)
+            conn.execute("DELETE FROM estado_ingesta WHERE clave = 'migracion_hasta'")
+        else:
+            conn.execute(SQL_ESTADO, (desde,))
+    return copiadas, limite is None
+
+
+def migrar(conn, lote=200000):
+    total = 0
+    inicio = time.perf_counter()
+    terminada = False
+    while not terminada:
+        copiadas, terminada = migrar_lote(conn, lote)
+        total += copiadas
+        print(f"{total} filas copiadas ({time.perf_counter() - inicio:.1f} s)")
+    return total
+
+
+def main():
+    from escritor_bd import inicializar_bd
+
+    parser = argparse.ArgumentParser(description="Copia el historial de sensores (TEXT) a lecturas (enteros).")
+    parser.add_argument("--db", default="datos_sensores.db")
+    parser.add_argument("--lote", type=int, default=200000)
+    parser.add_argument("--vacuum", action="store_true", help="compactar el archivo al terminar")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    inicializar_bd(conn)
+    if pendiente(conn):
+        migrar(conn, args.lote)
+    else:
+        print("No hay nada que migrar.")
+    if args.vacuum:
+        conn.execute("VACUUM")
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+import json
+import math
+import os
+import sqlite3
+from collections import namedtuple
+
+RUTA_BASE = os.path.dirname(os.path.abspath(__file__))
+RUTA_CONFIG = os.path.join(RUTA_BASE, "nodos.json")
+
+# Posiciones de los nodos sobre el plano del invernadero, en metros desde la esquina superior izquierda.
+Plano = namedtuple("Plano", ["ancho", "alto", "posiciones"])
+
+
+def leer_config(ruta_config=RUTA_CONFIG):
+    # nodos.json: {"nodos": [1, 2, 3]} o {"nodos": [{"id": 1, ...}, ...]}
+    if not os.path.exists(ruta_config):
+        return None
+    with open(ruta_config, encoding="utf-8") as f:
+        config = json.load(f)
+    return sorted(int(n["id"]) if isinstance(n, dict) else int(n) for n in config.get("nodos", []))
+
+
+def descubrir_nodos(cursor):
+    # Salta de nodo en nodo sobre la clave (nodo, ts) de lecturas en lugar de recorrer toda la tabla.
+    # ultimas_lecturas cubre los nodos cuyo historial aun no se ha migrado.
+    cursor.execute("""
+        WITH RECURSIVE n(nodo) AS (
+            SELECT MIN(nodo) FROM lecturas
+            UNION ALL
+            SELECT (SELECT MIN(nodo) FROM lecturas WHERE nodo > n.nodo) FROM n WHERE n.nodo IS NOT NULL
+        )
+        SELECT nodo FROM n WHERE nodo IS NOT NULL
+        UNION
+        SELECT nodo FROM ultimas_lecturas
+    """)
+    return [fila[0] for fila in cursor.fetchall()]
+
+
+def cargar_nodos(db_file="datos_sensores.db", ruta_config=RUTA_CONFIG):
+    nodos = leer_config(ruta_config)
+    if nodos:
+        return nodos
+
+    try:
+        conn = sqlite3.connect(db_file)
+        try:
+            return descubrir_nodos(conn.cursor())
+        finally:
+            conn.close()
+    except sqlite3.OperationalError as e:
+        print("No se pudieron descubrir los nodos:", e)
+        return []
+
+
+def dimensiones_rejilla(cantidad):
+    columnas = max(1, math.ceil(math.sqrt(cantidad)))
+    filas = max(1, math.ceil(cantidad / columnas))
+    return filas, columnas
+
+
+def cargar_plano(nodos, ruta_config=RUTA_CONFIG):
+    # nodos.json: {"plano": {"ancho": 40, "alto": 12}, "nodos": [{"id": 1, "x": 2.5, "y": 3}, ...]}
+    # Sin posiciones se reparte a los nodos en la misma rejilla que DatosTiempoReal, con celdas de 1 m.
+    config = {}
+    if os.path.exists(ruta_config):
+        with open(ruta_config, encoding="utf-8") as f:
+            config = json.load(f)
+    posiciones = {int(n["id"]): (float(n["x"]), float(n["y"]))
+                  for n in config.get("nodos", []) if isinstance(n, dict) and "x" in n and "y" in n}
+    if posiciones:
+        sin_posicion = sorted(set(nodos) - set(posiciones))
+        if sin_posicion:
+            print("Nodos sin posicion en nodos.json, no salen en el plano:", sin_posicion)
+        plano = config.get("plano", {})
+        ancho = float(plano.get("ancho", max(x for x, _ in posiciones.values()) + 1))
+        alto = float(plano.get("alto", max(y for _, y in posiciones.values()) + 1))
+        return Plano(ancho, alto, {nodo: posiciones[nodo] for nodo in nodos if nodo in posiciones})
+
+    filas, columnas = dimensiones_rejilla(len(nodos))
+    return Plano(float(columnas), float(filas),
+                 {nodo: (indice % columnas + 0.5, indice // columnas + 0.5) for indice, nodo in enumerate(nodos)})
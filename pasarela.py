@@ -0,0 +1,346 @@
+import argparse
+import asyncio
+import queue
+import socket
+import struct
+import threading
+import time
+import traceback
+
+import metricas
+from tramas import Trama, trama_valida
+
+# Protocolo receptor -> pasarela. Un mensaje es una cabecera seguida de `cantidad` registros,
+# todo little endian. Por TCP los mensajes van seguidos; por UDP, uno por datagrama.
+CABECERA = struct.Struct("<2sBHH")  # magia, version, receptor, cantidad
+REGISTRO = struct.Struct("<dHHffBB")  # recibida, nodo, secuencia, temperatura, humedad, banderas, arranque
+MAGIA = b"SP"
+VERSION = 2
+BANDERA_ANTENA = 1
+BANDERA_SECUENCIA = 2
+PUERTO = 5005
+# Lo que cabe en un datagrama sin fragmentar en una red Ethernet.
+MAX_REGISTROS_UDP = (1400 - CABECERA.size) // REGISTRO.size
+
+
+def codificar(receptor, tramas):
+    # tramas: (trama, recibida) en el orden en que se leyeron de la radio.
+    datos = bytearray(CABECERA.size + REGISTRO.size * len(tramas))
+    CABECERA.pack_into(datos, 0, MAGIA, VERSION, receptor, len(tramas))
+    offset = CABECERA.size
+    for trama, recibida in tramas:
+        banderas = BANDERA_ANTENA if trama.antena else 0
+        if trama.secuencia is not None:
+            banderas |= BANDERA_SECUENCIA
+        REGISTRO.pack_into(datos, offset, recibida, trama.nodo, trama.secuencia or 0,
+                           trama.temperatura, trama.humedad, banderas, trama.arranque or 0)
+        offset += REGISTRO.size
+    return bytes(datos)
+
+
+def leer_cabecera(datos):
+    magia, version, receptor, cantidad = CABECERA.unpack_from(datos)
+    if magia != MAGIA or version != VERSION:
+        raise ValueError(f"cabecera desconocida {bytes(datos[:CABECERA.size])!r}")
+    return receptor, cantidad
+
+
+def decodificar_registros(datos):
+    tramas = []
+    for recibida, nodo, secuencia, temperatura, humedad, banderas, arranque in REGISTRO.iter_unpack(datos):
+        if trama_valida(temperatura, humedad):
+            con_secuencia = banderas & BANDERA_SECUENCIA
+            tramas.append((Trama(nodo, temperatura, humedad, bool(banderas & BANDERA_ANTENA),
+                                 secuencia if con_secuencia else None, arranque if con_secuencia else None),
+                           recibida))
+    return tramas
+
+
+class ClientePasarela:
+    # Lado receptor: sustituye al Acumulador local. Las tramas se juntan y se envian en un
+    # mensaje por tick o al llenar el lote. Si la pasarela no responde se conservan hasta
+    # max_pendientes y se reintenta en el siguiente tick.
+    def __init__(self, host, receptor, puerto=PUERTO, udp=False, max_pendientes=10000):
+        self.direccion = (host, puerto)
+        self.receptor = receptor
+        self.udp = udp
+        self.max_lote = MAX_REGISTROS_UDP if udp else 1000
+        self.max_pendientes = max_pendientes
+        self.pendientes = []
+        self.sock = None
+        self.enviadas = 0
+        self.perdidas = 0
+
+    def _conectar(self):
+        if self.udp:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        else:
+            self.sock = socket.create_connection(self.direccion, timeout=2)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def al_recibir(self, trama, recibida):
+        self.pendientes.append((trama, recibida))
+        if len(self.pendientes) >= self.max_lote:
+            self.enviar()
+
+    def al_tick(self):
+        self.enviar()
+
+    def enviar(self):
+        if not self.pendientes:
+            return
+        try:
+            if self.sock is None:
+                self._conectar()
+            # Cada lote enviado sale de pendientes: tras un fallo solo se reintenta lo que falta.
+            while self.pendientes:
+                lote = self.pendientes[:self.max_lote]
+                datos = codificar(self.receptor, lote)
+                if self.udp:
+                    self.sock.sendto(datos, self.direccion)
+                else:
+                    self.sock.sendall(datos)
+                del self.pendientes[:len(lote)]
+                self.enviadas += len(lote)
+        except OSError as e:
+            print("No se pudo enviar a la pasarela:", e)
+            self.cerrar_socket()
+            sobrantes = len(self.pendientes) - self.max_pendientes
+            if sobrantes > 0:
+                self.perdidas += sobrantes
+                del self.pendientes[:sobrantes]
+            return
+
+    def cerrar_socket(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def cerrar(self):
+        self.enviar()
+        self.cerrar_socket()
+
+
+class _ProtocoloUDP(asyncio.DatagramProtocol):
+    def __init__(self, pasarela):
+        self.pasarela = pasarela
+
+    def datagram_received(self, datos, direccion):
+        try:
+            receptor, cantidad = leer_cabecera(datos)
+        except (ValueError, struct.error) as e:
+            self.pasarela.invalidos += 1
+            print("Datagrama invalido de", direccion, e)
+            return
+        if len(datos) != CABECERA.size + cantidad * REGISTRO.size:
+            self.pasarela.invalidos += 1
+            return
+        # Sin control de flujo en UDP: si la cola esta llena el lote se pierde.
+        self.pasarela.entregar(receptor, decodificar_registros(memoryview(datos)[CABECERA.size:]))
+
+
+class Pasarela:
+    # Recibe las tramas ya decodificadas de varios receptores (recepcion.py --pasarela) por TCP
+    # y UDP en un bucle asyncio. Los lotes pasan por una cola a un hilo escritor que entrega cada
+    # trama a `al_recibir(trama, recibida)`, igual que MotorRecepcion; con el Acumulador, las
+    # tramas oidas por varios receptores se descartan por (nodo, secuencia).
+    def __init__(self, al_recibir, al_tick=None, tam_cola=1024, periodo_tick=0.5):
+        self.al_recibir = al_recibir
+        self.al_tick = al_tick
+        self.periodo_tick = periodo_tick
+        self.cola = queue.Queue(maxsize=tam_cola)
+        self._detener = threading.Event()
+        self._hilo = None
+        self._loop = None
+        self._fallo = None
+        self.servidores = []
+        self.error = None
+
+        self.mensajes = 0
+        self.recibidas = 0
+        self.invalidos = 0
+        self.descartadas = 0
+        self.procesadas = 0
+        self.por_receptor = {}
+
+    def contar(self, receptor, tramas):
+        self.mensajes += 1
+        self.recibidas += len(tramas)
+        self.por_receptor[receptor] = self.por_receptor.get(receptor, 0) + len(tramas)
+
+    def entregar(self, receptor, tramas):
+        self.contar(receptor, tramas)
+        try:
+            self.cola.put_nowait(tramas)
+        except queue.Full:
+            self.descartadas += len(tramas)
+
+    async def atender_tcp(self, reader, writer):
+        direccion = writer.get_extra_info("peername")
+        print("Receptor conectado:", direccion)
+        loop = asyncio.get_running_loop()
+        try:
+            while self.error is None:
+                receptor, cantidad = leer_cabecera(await reader.readexactly(CABECERA.size))
+                tramas = decodificar_registros(await reader.readexactly(cantidad * REGISTRO.size))
+                self.contar(receptor, tramas)
+                try:
+                    self.cola.put_nowait(tramas)
+                except queue.Full:
+                    # En TCP la cola llena frena la lectura y, con ella, al receptor: el put
+                    # bloqueante espera en un hilo del executor y esta conexion no lee mas
+                    # hasta que el hilo escritor hace sitio. Las demas siguen atendidas.
+                    await loop.run_in_executor(None, self.cola.put, tramas)
+        except asyncio.IncompleteReadError:
+            pass
+        except (ValueError, struct.error) as e:
+            self.invalidos += 1
+            print("Mensaje invalido de", direccion, e)
+        except ConnectionError as e:
+            print("Conexion perdida con", direccion, e)
+        finally:
+            writer.close()
+            print("Receptor desconectado:", direccion)
+
+    async def servir(self, host="0.0.0.0", puerto=PUERTO, udp=True):
+        # Devuelve el puerto usado (con puerto=0 lo elige el sistema); UDP escucha en el mismo.
+        if self._loop is None:
+            self._loop = asyncio.get_running_loop()
+            self._fallo = asyncio.Event()
+        servidor = await asyncio.start_server(self.atender_tcp, host, puerto)
+        self.servidores.append(servidor)
+        puerto = servidor.sockets[0].getsockname()[1]
+        if udp:
+            transporte, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: _ProtocoloUDP(self), local_addr=(host, puerto))
+            self.servidores.append(transporte)
+        return puerto
+
+    def cerrar_servidores(self):
+        # Desde el bucle asyncio.
+        for servidor in self.servidores:
+            servidor.close()
+        self.servidores = []
+
+    async def esperar(self):
+        # Solo vuelve si falla el hilo escritor: cierra los servidores y relanza el error para
+        # que el proceso termine y lo reinicie el servicio, como MotorRecepcion.esperar.
+        if self.error is None:
+            await self._fallo.wait()
+        self.cerrar_servidores()
+        raise RuntimeError("el hilo escritor de la pasarela se detuvo por un error") from self.error
+
+    def _bucle_escritor(self):
+        metricas.perfilar_hilo()
+        try:
+            self._escribir()
+        except Exception as e:
+            print("Error en el hilo escritor, se detiene la pasarela:", e)
+            traceback.print_exc()
+            self.error = e
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._fallo.set)
+            # Hasta detener() se descarta lo que llegue: ningun put de las conexiones TCP queda
+            # bloqueado y el bucle asyncio puede cerrar.
+            while not self._detener.is_set():
+                try:
+                    self.descartadas += len(self.cola.get(timeout=self.periodo_tick))
+                except queue.Empty:
+                    pass
+
+    def _escribir(self):
+        proximo_tick = time.monotonic()
+        while True:
+            try:
+                tramas = self.cola.get(timeout=self.periodo_tick)
+            except queue.Empty:
+                tramas = None
+
+            if tramas:
+                for trama, recibida in tramas:
+                    self.al_recibir(trama, recibida)
+                self.procesadas += len(tramas)
+
+            if self.al_tick and time.monotonic() >= proximo_tick:
+                self.al_tick()
+                proximo_tick = time.monotonic() + self.periodo_tick
+
+            if tramas is None and self._detener.is_set() and self.cola.empty():
+                break
+
+    def registrar_metricas(self):
+        metricas.contador("invernadero_pasarela_tramas_total", "Tramas recibidas por receptor", "receptor",
+                          funcion=lambda: dict(self.por_receptor))
+        metricas.contador("invernadero_pasarela_invalidos_total", "Mensajes con cabecera o longitud invalida",
+                          funcion=lambda: self.invalidos)
+        metricas.contador("invernadero_pasarela_descartadas_total", "Tramas perdidas por cola llena",
+                          funcion=lambda: self.descartadas)
+        metricas.medidor("invernadero_cola_pasarela", "Lotes esperando al hilo escritor", funcion=self.cola.qsize)
+
+    def iniciar(self):
+        self.registrar_metricas()
+        self._detener.clear()
+        self.error = None
+        self._hilo = threading.Thread(target=self._bucle_escritor, name="escritor-pasarela", daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        if self._hilo is not None:
+            self._hilo.join()
+            self._hilo = None
+
+    def estadisticas(self):
+        return {
+            "mensajes": self.mensajes,
+            "recibidas": self.recibidas,
+            "invalidos": self.invalidos,
+            "descartadas": self.descartadas,
+            "procesadas": self.procesadas,
+            "en_cola": self.cola.qsize(),
+            "por_receptor": dict(self.por_receptor),
+        }
+
+
+def main():
+    from alertas import MotorAlertas, cargar_reglas
+    from escritor_bd import EscritorSensores
+    from nodos import cargar_nodos
+    from recepcion import Acumulador
+
+    parser = argparse.ArgumentParser(description="Pasarela de ingesta para varios receptores.")
+    parser.add_argument("--db", default="datos_sensores.db")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--sin-udp", action="store_true")
+    metricas.agregar_argumentos(parser)
+    args = parser.parse_args()
+
+    escritor = EscritorSensores(args.db)
+    acumulador = Acumulador(escritor, cargar_nodos(args.db), verboso=False, alertas=MotorAlertas(cargar_reglas()))
+    pasarela = Pasarela(acumulador.al_recibir, al_tick=acumulador.al_tick)
+    pasarela.iniciar()
+
+    async def servir():
+        puerto = await pasarela.servir(args.host, args.puerto, udp=not args.sin_udp)
+        print(f"Pasarela escuchando en {args.host}:{puerto} ({'TCP' if args.sin_udp else 'TCP y UDP'})")
+        try:
+            await pasarela.esperar()
+        finally:
+            pasarela.cerrar_servidores()
+
+    # La sesion abarca la parada: el hilo escritor termina antes de volcar metricas y perfil.
+    with metricas.sesion(args):
+        try:
+            asyncio.run(servir())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            pasarela.detener()
+            print(f"Estadisticas de la pasarela: {pasarela.estadisticas()}")
+            print(f"Secuencias: {acumulador.estadisticas()}")
+            escritor.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,90 +1,244 @@
+import argparse
 import time
-import sqlite3
-import re
-from RF24 import RF24, RF24_PA_LOW, RF24_1MBPS  
 
-CE_PIN = 22  
-CSN_PIN = 0  
+import metricas
+from alertas import MotorAlertas, cargar_reglas
+from escritor_bd import EscritorSensores
+from nodos import cargar_nodos
+from pasarela import PUERTO, ClientePasarela
+from receptor import MotorRecepcion
+from tramas import DecodificadorTramas
+
+CE_PIN = 22
+CSN_PIN = 0
+IRQ_PIN = 24
 db_file = "datos_sensores.db"
-radio = RF24(CE_PIN, CSN_PIN)
-
-if not radio.begin():
-    exit()
-
-radio.setPALevel(RF24_PA_LOW)
-radio.setDataRate(RF24_1MBPS)
-radio.setChannel(100)  
-radio.openReadingPipe(1, b"00001")
-radio.startListening()
-
-def inicializar_bd():
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
-    cursor.execute("PRAGMA journal_mode=WAL;")
-    cursor.execute('''CREATE TABLE IF NOT EXISTS sensores (
-                        marca_tiempo TEXT,
-                        nodo INTEGER,
-                        temperatura REAL,
-                        humedad REAL,
-                        PRIMARY KEY (marca_tiempo, nodo))''')
-    conn.commit()
-    conn.close()
-
-def guardar_datos(marca_tiempo, datos_nodos, ultimos_datos):
-    conn = sqlite3.connect(db_file)
-    cursor = conn.cursor()
-
-    for nodo in range(0, 5):  
-        if datos_nodos.get(nodo):  
+INTERVALO_GUARDADO = 60
+# Secuencias anteriores a la mas alta que aun se reconocen como repetidas.
+VENTANA_SECUENCIAS = 64
+MASCARA_VENTANA = (1 << VENTANA_SECUENCIAS) - 1
+
+
+def configurar_radio():
+    # Importacion local: la pasarela usa Acumulador en equipos sin radio.
+    from RF24 import RF24, RF24_PA_LOW, RF24_1MBPS
+
+    radio = RF24(CE_PIN, CSN_PIN)
+
+    if not radio.begin():
+        exit()
+
+    radio.setPALevel(RF24_PA_LOW)
+    radio.setDataRate(RF24_1MBPS)
+    radio.setChannel(100)
+    radio.openReadingPipe(1, b"00001")
+    radio.startListening()
+    return radio
+
+def filas_intervalo(marca_tiempo, datos_nodos, ultimos_datos, nodos=()):
+    # Una fila por nodo; si el nodo no envio nada se repite su ultimo valor marcado como arrastrado.
+    filas = []
+    for nodo in sorted(set(nodos) | ultimos_datos.keys() | datos_nodos.keys()):
+        if datos_nodos.get(nodo):
             temperatura, humedad = datos_nodos[nodo]
-            ultimos_datos[nodo] = (temperatura, humedad)  
-        elif ultimos_datos.get(nodo):  
+            ultimos_datos[nodo] = (temperatura, humedad)
+            arrastrado = 0
+        elif ultimos_datos.get(nodo):
             temperatura, humedad = ultimos_datos[nodo]
-        else:  
+            arrastrado = 1
+        else:
             print(f"No hay datos para el nodo {nodo} en la marca de tiempo {marca_tiempo}")
             continue
-
-        cursor.execute("""
-            INSERT INTO sensores (marca_tiempo, nodo, temperatura, humedad)
-            VALUES (?, ?, ?, ?)
-            ON CONFLICT(marca_tiempo, nodo) DO UPDATE SET
-            temperatura = excluded.temperatura,
-            humedad = excluded.humedad
-        """, (marca_tiempo, nodo, temperatura, humedad))
-
-    conn.commit()
-    conn.close()
-    print(f"Datos guardados en BD para la marca de tiempo: {marca_tiempo}")
-
-inicializar_bd()
-
-datos_nodos = {}  
-ultimos_datos = {}  
-
-try:
-    while True:
-        if radio.available():
-            received_text = radio.read(32).decode('utf-8', errors='ignore').strip()
-            print(f"Mensaje recibido: {received_text}")
-
-            match = re.search(r"NODO (\d+)\s+T:\s*([\d.]+)\s*C\s+H:\s*([\d.]+)%", received_text)
-            if match:
-                nodo = int(match.group(1))
-                temperatura = float(match.group(2))
-                humedad = float(match.group(3))
-                datos_nodos[nodo] = (temperatura, humedad)
-
-        tiempo_actual = time.localtime()
-        minutos = tiempo_actual.tm_min
-        segundos = tiempo_actual.tm_sec
-
-        if minutos % 1 == 0 and segundos == 0:
-            marca_tiempo = time.strftime("%Y-%m-%d %H:%M:%S", tiempo_actual)
-            guardar_datos(marca_tiempo, datos_nodos, ultimos_datos)
-            datos_nodos = {}
-            print(f"Esperando datos para el nuevo intervalo...")
-
-        time.sleep(1)
-
-except KeyboardInterrupt:
-    print("Finalizando receptor.")
+        filas.append((marca_tiempo, nodo, temperatura, humedad, arrastrado))
+    return filas
+
+class Acumulador:
+    # Vive en el hilo escritor. Cada trama se anade al registro tramas_recibidas con su hora de
+    # recepcion y se asigna al intervalo que la contiene. Los cortes se programan con el reloj
+    # monotono, asi que un tick tardio o un salto del reloj del sistema no hace perder intervalos:
+    # en cada corte se cierran todos los intervalos ya terminados.
+    def __init__(self, escritor, nodos=(), intervalo=INTERVALO_GUARDADO, verboso=True, alertas=None):
+        self.escritor = escritor
+        self.verboso = verboso
+        # alertas.MotorAlertas opcional: ve cada trama sin esperar al cierre del intervalo.
+        self.alertas = alertas
+        if alertas is not None:
+            alertas.restaurar(escritor.alertas_activas())
+        self.nodos = nodos
+        self.intervalo = intervalo
+        self.intervalos = {}
+        self.ultimos_datos = {}
+        self.secuencias = {}
+        self.duplicadas = 0
+        self.perdidas = 0
+        self.reinicios = 0
+        self.perdidas_nodo = {}
+        metricas.contador("invernadero_tramas_duplicadas_total", "Tramas repetidas por varias antenas o receptores",
+                          funcion=lambda: self.duplicadas)
+        metricas.medidor("invernadero_tramas_perdidas", "Huecos en la secuencia de cada nodo", "nodo",
+                         funcion=lambda: dict(self.perdidas_nodo))
+
+        ahora = time.time()
+        ultimo_corte = escritor.leer_estado("ultimo_corte")
+        if ultimo_corte is None:
+            self.siguiente = int(ahora // intervalo)
+        else:
+            self.siguiente = int(ultimo_corte // intervalo)
+            self.recuperar(ultimo_corte)
+        self.programar_corte(ahora)
+
+    def recuperar(self, ultimo_corte):
+        # Tramas registradas pero no consolidadas antes de la ultima parada.
+        tramas = self.escritor.tramas_desde(ultimo_corte)
+        for recibida, nodo, secuencia, temperatura, humedad, _, arranque in tramas:
+            if secuencia is not None:
+                self.secuencias[nodo] = (secuencia, 1, arranque)
+            self.intervalos.setdefault(int(recibida // self.intervalo), {})[nodo] = (temperatura, humedad)
+        if tramas:
+            print(f"Recuperadas {len(tramas)} tramas sin consolidar desde "
+                  f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(ultimo_corte))}")
+
+    def programar_corte(self, ahora):
+        fin_actual = (int(ahora // self.intervalo) + 1) * self.intervalo
+        self.plazo = time.monotonic() + (fin_actual - ahora)
+
+    def es_duplicada(self, nodo, secuencia, arranque=None):
+        # Por nodo se guarda la secuencia mas alta y un mapa de bits de las VENTANA_SECUENCIAS
+        # anteriores, asi se reconoce la misma trama aunque llegue desordenada por otra antena
+        # u otro receptor. Cada comprobacion es O(1).
+        if secuencia is None:
+            return False
+        estado = self.secuencias.get(nodo)
+        if estado is None:
+            self.secuencias[nodo] = (secuencia, 1, arranque)
+            return False
+        ultima, vistas, arranque_previo = estado
+        # La secuencia vuelve a 0 en cada reinicio del nodo: con otro byte de arranque la ventana
+        # anterior ya no vale, aunque la secuencia nueva caiga dentro de ella.
+        if arranque and arranque_previo and arranque != arranque_previo:
+            self.reinicios += 1
+            self.secuencias[nodo] = (secuencia, 1, arranque)
+            return False
+        arranque = arranque or arranque_previo
+        avance = (secuencia - ultima) % 65536
+        if avance == 0:
+            return True
+        if avance < 32768:
+            if avance > 1:
+                self.perdidas += avance - 1
+                self.perdidas_nodo[nodo] = self.perdidas_nodo.get(nodo, 0) + avance - 1
+            self.secuencias[nodo] = (secuencia, ((vistas << avance) | 1) & MASCARA_VENTANA, arranque)
+            return False
+        retraso = 65536 - avance
+        if retraso < VENTANA_SECUENCIAS:
+            bit = 1 << retraso
+            if vistas & bit:
+                return True
+            # Llego tarde una que se habia contado como perdida.
+            self.perdidas -= 1
+            self.perdidas_nodo[nodo] = self.perdidas_nodo.get(nodo, 0) - 1
+            self.secuencias[nodo] = (ultima, vistas | bit, arranque)
+            return False
+        # Un retroceso grande es un nodo reiniciado sin byte de arranque: se acepta y se sigue
+        # desde ahi.
+        self.secuencias[nodo] = (secuencia, 1, arranque)
+        return False
+
+    def al_recibir(self, trama, recibida=None):
+        if recibida is None:
+            recibida = time.time()
+        if self.es_duplicada(trama.nodo, trama.secuencia, trama.arranque):
+            self.duplicadas += 1
+            return
+        temperatura, humedad = round(trama.temperatura, 2), round(trama.humedad, 2)
+        if self.verboso:
+            print(f"Mensaje recibido: NODO {trama.nodo} T: {temperatura} C H: {humedad}%")
+        self.escritor.registrar_tramas([(recibida, trama.nodo, trama.secuencia, temperatura, humedad,
+                                         int(trama.antena), trama.arranque)])
+        if self.alertas is not None:
+            eventos = self.alertas.evaluar(trama.nodo, trama.temperatura, trama.humedad, recibida)
+            if eventos:
+                self.escritor.registrar_eventos(eventos)
+                for evento in eventos:
+                    print(f"Alerta {evento.estado}: nodo {evento.nodo} {evento.mensaje}")
+        # Si el reloj retrocedio, la trama va al intervalo abierto y no a uno ya cerrado.
+        indice = max(int(recibida // self.intervalo), self.siguiente)
+        self.intervalos.setdefault(indice, {})[trama.nodo] = (temperatura, humedad)
+
+    def al_tick(self):
+        self.escritor.revisar()
+        self.escritor.mantener()
+        if time.monotonic() < self.plazo:
+            return
+        ahora = time.time()
+        actual = int(ahora // self.intervalo)
+        while self.siguiente < actual:
+            # Al ponerse al dia tras una parada, los intervalos sin ninguna trama se saltan:
+            # no se inventan filas para el tiempo en que el receptor no estuvo escuchando.
+            if self.siguiente in self.intervalos or self.siguiente == actual - 1:
+                self.cerrar_intervalo(self.siguiente)
+            self.siguiente += 1
+        self.programar_corte(ahora)
+
+    def cerrar_intervalo(self, indice):
+        # La fila lleva la marca del fin del intervalo, como antes.
+        corte = (indice + 1) * self.intervalo
+        marca_tiempo = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(corte))
+        datos_nodos = self.intervalos.pop(indice, {})
+        # El corte se registra antes que las filas para que ambos vayan en la misma transaccion.
+        self.escritor.guardar_estado("ultimo_corte", corte)
+        self.escritor.agregar(filas_intervalo(marca_tiempo, datos_nodos, self.ultimos_datos, self.nodos))
+        print(f"Datos agregados al lote de BD para la marca de tiempo: {marca_tiempo}")
+
+    def estadisticas(self):
+        return {"duplicadas": self.duplicadas, "perdidas": self.perdidas, "reinicios": self.reinicios}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Receptor nRF24 de los nodos del invernadero.")
+    parser.add_argument("--pasarela", metavar="HOST[:PUERTO]",
+                        help="reenviar las tramas a una pasarela en lugar de escribir la BD local")
+    parser.add_argument("--receptor", type=int, default=1, help="identificador de este receptor en la pasarela")
+    parser.add_argument("--udp", action="store_true", help="enviar a la pasarela por UDP")
+    parser.add_argument("--silencioso", action="store_true", help="no imprimir cada trama recibida")
+    metricas.agregar_argumentos(parser)
+    args = parser.parse_args()
+
+    radio = configurar_radio()
+    decodificador = DecodificadorTramas()
+    metricas.contador("invernadero_tramas_por_formato_total", "Payloads por formato (invalido: no se pudo decodificar)",
+                      "formato", funcion=lambda: dict(decodificador.contadores))
+    if args.pasarela:
+        host, _, puerto = args.pasarela.partition(":")
+        escritor = acumulador = None
+        cliente = ClientePasarela(host, args.receptor, int(puerto or PUERTO), udp=args.udp)
+        al_recibir, al_tick = cliente.al_recibir, cliente.al_tick
+    else:
+        escritor = EscritorSensores(db_file)
+        acumulador = Acumulador(escritor, cargar_nodos(db_file), verboso=not args.silencioso,
+                                alertas=MotorAlertas(cargar_reglas()))
+        cliente = None
+        al_recibir, al_tick = acumulador.al_recibir, acumulador.al_tick
+    motor = MotorRecepcion(radio, decodificador, al_recibir, al_tick=al_tick, irq_pin=IRQ_PIN)
+
+    with metricas.sesion(args):
+        motor.iniciar()
+        try:
+            motor.esperar()
+        except KeyboardInterrupt:
+            motor.detener()
+            print(f"Estadisticas de recepcion: {motor.estadisticas()}")
+            print(f"Tramas por formato: {decodificador.contadores}")
+            if acumulador is not None:
+                print(f"Secuencias: {acumulador.estadisticas()}")
+            print("Finalizando receptor.")
+        finally:
+            # Las filas pendientes del ultimo lote se confirman (o se envian) antes de salir.
+            if escritor is not None:
+                escritor.cerrar()
+            if cliente is not None:
+                cliente.cerrar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+import queue
+import threading
+import time
+import traceback
+
+import metricas
+
+TAMANO_PAYLOAD = 32
+
+
+class MotorRecepcion:
+    # Hilo lector: vacia la FIFO del nRF24 en cada despertar y encola las tramas.
+    # Hilo escritor: consume la cola y entrega cada trama a `al_recibir(trama, recibida)`,
+    # donde `recibida` es la hora (time.time()) en que se leyo de la FIFO.
+    # Sin IRQ se sondea: con 0.3 ms por trama en el aire, una rafaga llena la FIFO de 3 niveles
+    # en menos de 1 ms, asi que el sondeo no puede dormir mas que eso aunque no llegue nada.
+    def __init__(self, radio, decodificar, al_recibir, al_tick=None, irq_pin=None, irq_externa=False,
+                 tam_cola=1024, intervalo_min=0.0005, intervalo_max=0.001, espera_irq=0.05, periodo_tick=0.5):
+        self.radio = radio
+        self.decodificar = decodificar
+        self.al_recibir = al_recibir
+        self.al_tick = al_tick
+        self.irq_pin = irq_pin
+        self.irq_externa = irq_externa
+        self.intervalo_min = intervalo_min
+        self.intervalo_max = intervalo_max
+        self.espera_irq = espera_irq
+        self.periodo_tick = periodo_tick
+
+        self.cola = queue.Queue(maxsize=tam_cola)
+        self._irq = threading.Event()
+        self._detener = threading.Event()
+        self._usa_irq = False
+        self._hilos = []
+        self.error = None
+
+        self.recibidas = 0
+        self.decodificadas = 0
+        self.invalidas = 0
+        self.descartadas = 0
+        self.procesadas = 0
+
+    def notificar_irq(self, *_):
+        self._irq.set()
+
+    def _configurar_irq(self):
+        # Con irq_externa otro componente llama a notificar_irq (p. ej. la radio simulada).
+        if self.irq_externa:
+            return True
+        if self.irq_pin is None:
+            return False
+        try:
+            import RPi.GPIO as GPIO
+        except ImportError:
+            print("RPi.GPIO no disponible, se sondea la radio cada milisegundo (mas CPU que con el pin IRQ).")
+            return False
+
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(self.irq_pin, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        GPIO.add_event_detect(self.irq_pin, GPIO.FALLING, callback=self.notificar_irq)
+        if hasattr(self.radio, "maskIRQ"):
+            # Solo interesa RX_DR; TX_DS y MAX_RT quedan enmascaradas.
+            self.radio.maskIRQ(True, True, False)
+        return True
+
+    def _liberar_irq(self):
+        if self._usa_irq and not self.irq_externa:
+            import RPi.GPIO as GPIO
+            GPIO.remove_event_detect(self.irq_pin)
+
+    def vaciar_fifo(self):
+        leidas = 0
+        while self.radio.available():
+            payload = self.radio.read(TAMANO_PAYLOAD)
+            recibida = time.time()
+            leidas += 1
+            trama = self.decodificar(payload)
+            if trama is None:
+                self.invalidas += 1
+                continue
+            self.decodificadas += 1
+            try:
+                self.cola.put_nowait((trama, recibida))
+            except queue.Full:
+                self.descartadas += 1
+        if self._usa_irq and hasattr(self.radio, "whatHappened"):
+            self.radio.whatHappened()
+        self.recibidas += leidas
+        return leidas
+
+    def _bucle_lector(self):
+        metricas.perfilar_hilo()
+        intervalo = self.intervalo_min
+        while not self._detener.is_set():
+            if self._usa_irq:
+                # El timeout cubre flancos perdidos mientras se vaciaba la FIFO.
+                self._irq.wait(self.espera_irq)
+                self._irq.clear()
+                self.vaciar_fifo()
+                continue
+
+            if self.vaciar_fifo():
+                intervalo = self.intervalo_min
+            else:
+                intervalo = min(intervalo * 2, self.intervalo_max)
+            self._detener.wait(intervalo)
+
+    def _bucle_escritor(self):
+        metricas.perfilar_hilo()
+        try:
+            self._escribir()
+        except Exception as e:
+            # Sin escritor no se guarda nada: se para tambien el lector y esperar() relanza el
+            # error para que el proceso termine y lo reinicie el servicio, como antes del hilo.
+            print("Error en el hilo escritor, se detiene la recepcion:", e)
+            traceback.print_exc()
+            self.error = e
+            self._detener.set()
+            self._irq.set()
+
+    def _escribir(self):
+        proximo_tick = time.monotonic()
+        while True:
+            try:
+                trama, recibida = self.cola.get(timeout=self.periodo_tick)
+            except queue.Empty:
+                trama = None
+
+            if trama is not None:
+                self.al_recibir(trama, recibida)
+                self.procesadas += 1
+
+            if self.al_tick and time.monotonic() >= proximo_tick:
+                self.al_tick()
+                proximo_tick = time.monotonic() + self.periodo_tick
+
+            if trama is None and self._detener.is_set() and self.cola.empty():
+                break
+
+    def registrar_metricas(self):
+        metricas.contador("invernadero_tramas_leidas_total", "Payloads leidos de la FIFO de la radio",
+                          funcion=lambda: self.recibidas)
+        metricas.contador("invernadero_tramas_invalidas_total", "Payloads que no se pudieron decodificar",
+                          funcion=lambda: self.invalidas)
+        metricas.contador("invernadero_tramas_descartadas_total", "Tramas perdidas por cola llena",
+                          funcion=lambda: self.descartadas)
+        metricas.medidor("invernadero_cola_recepcion", "Tramas esperando al hilo escritor", funcion=self.cola.qsize)
+
+    def iniciar(self):
+        self.registrar_metricas()
+        self._usa_irq = self._configurar_irq()
+        self._detener.clear()
+        self.error = None
+        self._hilos = [
+            threading.Thread(target=self._bucle_lector, name="lector-radio", daemon=True),
+            threading.Thread(target=self._bucle_escritor, name="escritor-bd", daemon=True),
+        ]
+        for hilo in self._hilos:
+            hilo.start()
+
+    def detener(self):
+        self._detener.set()
+        self._irq.set()
+        for hilo in self._hilos:
+            hilo.join()
+        self._hilos = []
+        self._liberar_irq()
+
+    def esperar(self):
+        while any(hilo.is_alive() for hilo in self._hilos):
+            for hilo in self._hilos:
+                hilo.join(0.5)
+        if self.error is not None:
+            self._hilos = []
+            self._liberar_irq()
+            raise RuntimeError("el hilo escritor se detuvo por un error") from self.error
+
+    def estadisticas(self):
+        return {
+            "recibidas": self.recibidas,
+            "decodificadas": self.decodificadas,
+            "invalidas": self.invalidas,
+            "descartadas": self.descartadas,
+            "procesadas": self.procesadas,
+            "en_cola": self.cola.qsize(),
+        }
@@ -0,0 +1,214 @@
+import argparse
+import calendar
+import os
+import re
+import sqlite3
+import time
+
+import migracion
+
+# Las lecturas crudas con mas de DIAS_RETENCION dias pasan a un archivo por mes junto a la BD
+# (archivo/lecturas_YYYY-MM.db). En el archivo caliente quedan los agregados, que cubren todo
+# el historial, y lecturas de los ultimos dias.
+DIAS_RETENCION = 90
+# SQLite admite 10 bases adjuntas por conexion; se deja margen.
+MAX_ADJUNTOS = 8
+PATRON_ARCHIVO = re.compile(r"lecturas_(\d{4}-\d{2})\.db$")
+
+SQL_TABLA = """
+    CREATE TABLE IF NOT EXISTS {esquema}.lecturas (
+        nodo INTEGER,
+        ts INTEGER,
+        temperatura INTEGER,
+        humedad INTEGER,
+        arrastrado INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (nodo, ts)) WITHOUT ROWID
+"""
+
+# OR REPLACE: si un corte anterior se interrumpio entre copiar y borrar, el dia se vuelve a copiar.
+SQL_ARCHIVAR = """
+    INSERT OR REPLACE INTO archivo.lecturas (nodo, ts, temperatura, humedad, arrastrado)
+    SELECT nodo, ts, temperatura, humedad, arrastrado
+    FROM main.lecturas
+    WHERE nodo IN (SELECT nodo FROM main.ultimas_lecturas) AND ts >= ? AND ts < ?
+"""
+
+SQL_BORRAR = """
+    DELETE FROM main.lecturas
+    WHERE nodo IN (SELECT nodo FROM main.ultimas_lecturas) AND ts >= ? AND ts < ?
+"""
+
+SQL_FRONTERA = """
+    INSERT INTO estado_ingesta (clave, valor) VALUES ('archivado_hasta', ?)
+    ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor
+"""
+
+
+def hora_local():
+    # Segundos de la hora local contada como UTC, la misma convencion que lecturas.ts.
+    return calendar.timegm(time.localtime())
+
+
+def marca_de(ts):
+    return time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(ts))
+
+
+def mes_de(ts):
+    return time.strftime("%Y-%m", time.gmtime(ts))
+
+
+def inicio_mes(mes):
+    anio, numero = map(int, mes.split("-"))
+    return calendar.timegm((anio, numero, 1, 0, 0, 0))
+
+
+def fin_mes(mes):
+    anio, numero = map(int, mes.split("-"))
+    return calendar.timegm((anio + numero // 12, numero % 12 + 1, 1, 0, 0, 0))
+
+
+def ruta_archivos(db_file):
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), "archivo")
+
+
+def ruta_mes(db_file, mes):
+    return os.path.join(ruta_archivos(db_file), f"lecturas_{mes}.db")
+
+
+def meses_archivados(db_file):
+    try:
+        nombres = os.listdir(ruta_archivos(db_file))
+    except OSError:
+        return []
+    return sorted(coincidencia[1] for coincidencia in map(PATRON_ARCHIVO.match, nombres) if coincidencia)
+
+
+def frontera(conn):
+    # Las lecturas con ts < frontera estan en los archivos mensuales; None si nunca se archivo nada.
+    try:
+        fila = conn.execute("SELECT valor FROM estado_ingesta WHERE clave = 'archivado_hasta'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return fila[0] if fila else None
+
+
+def archivar_dia(conn, db_file, dias=DIAS_RETENCION):
+    # Mueve el dia mas antiguo que ya salio del periodo de retencion. Devuelve (filas, quedan_mas).
+    # Copia y borrado van en transacciones separadas: el archivo adjunto y el WAL principal no
+    # se confirman de forma atomica entre si, asi nunca se borra nada que no este ya copiado.
+    if migracion.pendiente(conn):
+        return 0, False
+    limite = (hora_local() // 86400 - dias) * 86400
+    # Primera lectura pendiente, saltando los dias sin datos. MIN(ts) por nodo usa la clave;
+    # un MIN(ts) global recorreria toda la tabla.
+    inicio = conn.execute("SELECT MIN((SELECT MIN(ts) FROM lecturas WHERE nodo = u.nodo AND ts >= ?)) "
+                          "FROM ultimas_lecturas u", (frontera(conn) or 0,)).fetchone()[0]
+    if inicio is None:
+        return 0, False
+    inicio = inicio // 86400 * 86400
+    fin = inicio + 86400
+    if fin > limite:
+        return 0, False
+
+    os.makedirs(ruta_archivos(db_file), exist_ok=True)
+    conn.execute("ATTACH DATABASE ? AS archivo", (ruta_mes(db_file, mes_de(inicio)),))
+    try:
+        conn.execute(SQL_TABLA.format(esquema="archivo"))
+        with conn:
+            movidas = conn.execute(SQL_ARCHIVAR, (inicio, fin)).rowcount
+        with conn:
+            conn.execute(SQL_BORRAR, (inicio, fin))
+            conn.execute(SQL_FRONTERA, (fin,))
+    finally:
+        conn.execute("DETACH DATABASE archivo")
+    return movidas, fin + 86400 <= limite
+
+
+def tramos(conn, db_file, ts_desde, ts_hasta):
+    # Recorre [ts_desde, ts_hasta) en tramos cronologicos. En los que caen antes de la frontera
+    # adjunta los archivos mensuales y tapa lecturas con una vista temporal que los une a la
+    # tabla caliente, asi las consultas de consultas.py sirven sin cambios.
+    corte = frontera(conn)
+    meses = []
+    if corte is not None and ts_desde < corte:
+        meses = [mes for mes in meses_archivados(db_file)
+                 if fin_mes(mes) > ts_desde and inicio_mes(mes) < min(ts_hasta, corte)]
+    if not meses:
+        yield ts_desde, ts_hasta
+        return
+
+    grupos = [meses[i:i + MAX_ADJUNTOS] for i in range(0, len(meses), MAX_ADJUNTOS)]
+    for i, grupo in enumerate(grupos):
+        ultimo = i == len(grupos) - 1
+        esquemas = []
+        try:
+            for mes in grupo:
+                esquema = f"archivo{len(esquemas)}"
+                conn.execute(f"ATTACH DATABASE ? AS {esquema}", (ruta_mes(db_file, mes),))
+                esquemas.append(esquema)
+            partes = [f"SELECT * FROM {esquema}.lecturas WHERE ts < {int(corte)}" for esquema in esquemas]
+            if ultimo:
+                partes.append(f"SELECT * FROM main.lecturas WHERE ts >= {int(corte)}")
+            conn.execute("CREATE TEMP VIEW lecturas AS " + " UNION ALL ".join(partes))
+            yield (max(ts_desde, inicio_mes(grupo[0])) if i else ts_desde,
+                   ts_hasta if ultimo else inicio_mes(grupos[i + 1][0]))
+        finally:
+            conn.execute("DROP VIEW IF EXISTS temp.lecturas")
+            for esquema in esquemas:
+                conn.execute(f"DETACH DATABASE {esquema}")
+
+
+def consultar_tramos(conn, db_file, sql, parametros):
+    # Un cursor por tramo, cada uno ordenado como pida sql; hay que consumirlo antes de pedir el siguiente.
+    for desde, hasta in tramos(conn, db_file, parametros["ts_desde"], parametros["ts_hasta"]):
+        yield conn.execute(sql, dict(parametros, ts_desde=desde, ts_hasta=hasta))
+
+
+def compactar(conn):
+    # Devuelve las paginas liberadas. Solo tiene efecto con auto_vacuum=INCREMENTAL; una BD creada
+    # antes lo adopta con el proximo VACUUM completo (python retencion.py --vacuum).
+    libres = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if not libres or conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        return 0
+    # execute() solo da un paso de la sentencia (una pagina); executescript la completa.
+    conn.executescript("PRAGMA incremental_vacuum;")
+    return libres - conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+
+def checkpoint(conn):
+    # TRUNCATE deja el WAL en cero bytes si ningun lector lo retiene; si no, se reintenta mas tarde.
+    ocupado, _, _ = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+    return not ocupado
+
+
+def main():
+    from escritor_bd import inicializar_bd
+
+    parser = argparse.ArgumentParser(description="Pasa las lecturas antiguas a archivos mensuales y compacta la BD.")
+    parser.add_argument("--db", default="datos_sensores.db")
+    parser.add_argument("--dias", type=int, default=DIAS_RETENCION, help="dias de lecturas crudas que se conservan")
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM completo; activa auto_vacuum incremental")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db)
+    inicializar_bd(conn)
+    inicio = time.perf_counter()
+    total = 0
+    quedan = True
+    while quedan:
+        movidas, quedan = archivar_dia(conn, args.db, args.dias)
+        total += movidas
+    print(f"{total} lecturas archivadas en {time.perf_counter() - inicio:.1f} s")
+    corte = frontera(conn)
+    if corte is not None:
+        print(f"Lecturas anteriores a {marca_de(corte)} en {ruta_archivos(args.db)}")
+    if args.vacuum:
+        conn.execute("VACUUM")
+    else:
+        print(f"{compactar(conn)} paginas liberadas")
+    checkpoint(conn)
+    conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+import sqlite3
+from collections import namedtuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+import retencion
+from agregados import nivel_para
+from consultas import (DB_FILE, LATENCIA_CONSULTA, SQL_COLUMNAS, Serie, construir_consulta, filtro_por_nodos,
+                       parametros_rango)
+
+# Ruta columnar para graficas y estadisticas: las filas de SQLite van directo a arreglos
+# NumPy (marcas datetime64[s], valores float32) sin pasar por datetime ni listas de tuplas.
+DTYPE_FILAS = np.dtype([("nodo", "i4"), ("ts", "i8"), ("temperatura", "f4"), ("humedad", "f4")])
+DTYPE_SERIE = np.dtype([("nodo", "i4"), ("ts", "i8"),
+                        ("temperatura", "f4"), ("temperatura_min", "f4"), ("temperatura_max", "f4"),
+                        ("humedad", "f4"), ("humedad_min", "f4"), ("humedad_max", "f4"),
+                        ("muestras", "i4")])
+
+Columnas = namedtuple("Columnas", ["marcas", "temperatura", "humedad"])
+
+
+def _leer(sql, parametros, dtype, db_file, crudas=False):
+    conn = sqlite3.connect(db_file)
+    try:
+        if not crudas:
+            return np.fromiter(conn.execute(sql, parametros), dtype=dtype)
+        # Lecturas crudas: un bloque por tramo de archivos mensuales (casi siempre solo uno).
+        partes = [np.fromiter(cursor, dtype=dtype)
+                  for cursor in retencion.consultar_tramos(conn, db_file, sql, parametros)]
+    finally:
+        conn.close()
+    if len(partes) == 1:
+        return partes[0]
+    filas = np.concatenate(partes)
+    return filas[np.lexsort((filas["ts"], filas["nodo"]))]
+
+
+def _por_nodo(filas):
+    # Las consultas vienen ordenadas por nodo: se corta donde cambia.
+    if not len(filas):
+        return {}
+    cortes = np.flatnonzero(np.diff(filas["nodo"])) + 1
+    return {int(grupo["nodo"][0]): grupo for grupo in np.split(filas, cortes)}
+
+
+def cargar_columnas(desde=None, hasta=None, nodos=None, db_file=DB_FILE):
+    parametros = parametros_rango(desde, hasta)
+    filtro_nodos = filtro_por_nodos(parametros, None if nodos is None else list(nodos))
+    filas = _leer(SQL_COLUMNAS.format(filtro_nodos=filtro_nodos), parametros, DTYPE_FILAS, db_file, crudas=True)
+    return {nodo: Columnas(grupo["ts"].astype("datetime64[s]"), grupo["temperatura"], grupo["humedad"])
+            for nodo, grupo in _por_nodo(filas).items()}
+
+
+def remuestrear(marcas, valores, bucket_minutos):
+    # marcas ordenadas; devuelve (inicio de cubeta, media, minimo, maximo, muestras).
+    paso = int(bucket_minutos) * 60
+    cubetas = marcas.astype("datetime64[s]").astype(np.int64) // paso
+    unicas, inicios, muestras = np.unique(cubetas, return_index=True, return_counts=True)
+    media = (np.add.reduceat(valores, inicios, dtype=np.float64) / muestras).astype(np.float32)
+    minimo = np.minimum.reduceat(valores, inicios)
+    maximo = np.maximum.reduceat(valores, inicios)
+    return (unicas * paso).astype("datetime64[s]"), media, minimo, maximo, muestras
+
+
+def adelgazar(marcas, intervalo_minutos):
+    # Indices del primer punto de cada ventana de `intervalo_minutos` contada desde la primera
+    # marca; equivale al filtro "un punto cada intervalo" que antes se hacia fila a fila.
+    if not len(marcas):
+        return np.empty(0, dtype=np.intp)
+    segundos = marcas.astype("datetime64[s]").astype(np.int64)
+    ventanas = (segundos - segundos[0]) // (int(intervalo_minutos) * 60)
+    return np.flatnonzero(np.r_[True, ventanas[1:] != ventanas[:-1]])
+
+
+def estadisticas_moviles(valores, ventana):
+    # Media, minimo y maximo de cada ventana deslizante; el resultado tiene len(valores) - ventana + 1.
+    if ventana < 1 or len(valores) < ventana:
+        vacio = np.empty(0, dtype=np.float32)
+        return vacio, vacio, vacio
+    acumulado = np.concatenate(([0.0], np.cumsum(valores, dtype=np.float64)))
+    media = ((acumulado[ventana:] - acumulado[:-ventana]) / ventana).astype(np.float32)
+    vistas = sliding_window_view(valores, ventana)
+    return media, vistas.min(axis=1), vistas.max(axis=1)
+
+
+def cargar_series(desde=None, hasta=None, bucket_minutos=1, nodos=None, db_file=DB_FILE):
+    with LATENCIA_CONSULTA.medir("columnas"):
+        return _cargar_series(desde, hasta, bucket_minutos, nodos, db_file)
+
+
+def _cargar_series(desde, hasta, bucket_minutos, nodos, db_file):
+    if nodos is not None:
+        nodos = list(nodos)
+        if not nodos:
+            return {}
+
+    if bucket_minutos > 1 and nivel_para(bucket_minutos) is None:
+        # Intervalos por debajo del agregado mas fino: se remuestrea la tabla cruda en NumPy.
+        series = {}
+        for nodo, columnas in cargar_columnas(desde, hasta, nodos, db_file).items():
+            marcas, temperatura, temperatura_min, temperatura_max, muestras = remuestrear(
+                columnas.marcas, columnas.temperatura, bucket_minutos)
+            _, humedad, humedad_min, humedad_max, _ = remuestrear(columnas.marcas, columnas.humedad, bucket_minutos)
+            series[nodo] = Serie(marcas, temperatura, temperatura_min, temperatura_max,
+                                 humedad, humedad_min, humedad_max, muestras)
+        return series
+
+    sql, parametros = construir_consulta(desde, hasta, bucket_minutos, nodos)
+    filas = _leer(sql, parametros, DTYPE_SERIE, db_file, crudas=nivel_para(bucket_minutos) is None)
+    return {nodo: Serie(grupo["ts"].astype("datetime64[s]"), *(grupo[campo] for campo in DTYPE_SERIE.names[2:]))
+            for nodo, grupo in _por_nodo(filas).items()}
+
+
+def cargar_serie(nodo, desde=None, hasta=None, bucket_minutos=1, db_file=DB_FILE):
+    serie = cargar_series(desde, hasta, bucket_minutos, [nodo], db_file).get(nodo)
+    if serie is None:
+        vacio = np.empty(0, dtype=np.float32)
+        serie = Serie(np.empty(0, dtype="datetime64[s]"), vacio, vacio, vacio, vacio, vacio, vacio,
+                      np.empty(0, dtype=np.int32))
+    return serie
@@ -0,0 +1,332 @@
+import argparse
+import csv
+import datetime
+import hashlib
+import io
+import json
+import sqlite3
+import threading
+import time
+import traceback
+from collections import OrderedDict, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import metricas
+from agregados import NIVELES
+from consultas import (DB_FILE, UltimasLecturas, a_segundos, consultar_series, filtro_por_nodos,
+                       formatear_marca, parametros_rango, preparar_bd, ultimo_dia_con_datos)
+
+PUERTO = 8080
+# Segundos durante los que una respuesta se sirve sin volver a mirar PRAGMA data_version.
+TTL = 1.0
+MAX_ENTRADAS = 256
+# Cubetas por nodo que puede pedir /series; mas, y hay que pedir cubetas mayores.
+MAX_CUBETAS = 20000
+
+COLUMNAS_ULTIMAS = ["nodo", "marca", "temperatura", "humedad", "alertas"]
+COLUMNAS_SERIES = ["nodo", "marca", "temperatura", "temperatura_min", "temperatura_max",
+                   "humedad", "humedad_min", "humedad_max", "muestras"]
+COLUMNAS_RESUMEN = ["nodo", "muestras", "temperatura", "temperatura_min", "temperatura_max",
+                    "humedad", "humedad_min", "humedad_max", "ultima_marca"]
+
+# Resumen por nodo del rango, desde el nivel de agregados mas grueso alineado con sus extremos.
+SQL_RESUMEN = """
+    SELECT nodo, SUM(muestras),
+           SUM(temperatura_suma) / SUM(muestras), MIN(temperatura_min), MAX(temperatura_max),
+           SUM(humedad_suma) / SUM(muestras), MIN(humedad_min), MAX(humedad_max), MAX(ultima_marca)
+    FROM {tabla}
+    WHERE cubeta >= :desde AND cubeta < :hasta {filtro_nodos}
+    GROUP BY nodo
+    ORDER BY nodo
+"""
+
+Respuesta = namedtuple("Respuesta", ["version", "etag", "cuerpo", "tipo"])
+
+
+class ErrorPeticion(ValueError):
+    pass
+
+
+class CacheRespuestas:
+    # Respuestas ya serializadas por (ruta, parametros). Siguen valiendo mientras PRAGMA
+    # data_version no cambie, y data_version se consulta como mucho una vez cada `ttl`
+    # segundos: N clientes pidiendo lo mismo cuestan una consulta. Si varios piden a la vez
+    # algo que no esta, uno lo calcula y los demas esperan su resultado.
+    def __init__(self, db_file=DB_FILE, ttl=TTL, max_entradas=MAX_ENTRADAS):
+        self.conn = sqlite3.connect(db_file, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.ttl = ttl
+        self.max_entradas = max_entradas
+        self.version = None
+        self.comprobada = None
+        self.entradas = OrderedDict()
+        self.calculando = {}
+        self.aciertos = 0
+        self.fallos = 0
+
+    def version_actual(self):
+        with self.lock:
+            ahora = time.monotonic()
+            if self.comprobada is None or ahora - self.comprobada >= self.ttl:
+                self.version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+                self.comprobada = ahora
+            return self.version
+
+    def _vigente(self, clave, version):
+        # Con self.lock tomado.
+        entrada = self.entradas.get(clave)
+        if entrada is not None and entrada.version == version:
+            self.entradas.move_to_end(clave)
+            self.aciertos += 1
+            return entrada
+        return None
+
+    def obtener(self, clave, calcular):
+        # calcular() -> (cuerpo en bytes, tipo de contenido)
+        version = self.version_actual()
+        with self.lock:
+            entrada = self._vigente(clave, version)
+            if entrada is not None:
+                return entrada
+            cerrojo = self.calculando.setdefault(clave, threading.Lock())
+        with cerrojo:
+            with self.lock:
+                entrada = self._vigente(clave, version)
+                if entrada is not None:
+                    return entrada
+            try:
+                cuerpo, tipo = calcular()
+            except Exception:
+                with self.lock:
+                    self.calculando.pop(clave, None)
+                raise
+            entrada = Respuesta(version, '"' + hashlib.sha1(cuerpo).hexdigest()[:20] + '"', cuerpo, tipo)
+            with self.lock:
+                self.fallos += 1
+                self.entradas[clave] = entrada
+                self.entradas.move_to_end(clave)
+                while len(self.entradas) > self.max_entradas:
+                    self.entradas.popitem(last=False)
+                self.calculando.pop(clave, None)
+        return entrada
+
+    def cerrar(self):
+        self.conn.close()
+
+
+def serializar(columnas, filas, formato):
+    if formato == "csv":
+        salida = io.StringIO()
+        escritor = csv.writer(salida, lineterminator="\n")
+        escritor.writerow(columnas)
+        for fila in filas:
+            escritor.writerow("; ".join(valor) if isinstance(valor, list) else valor for valor in fila)
+        return salida.getvalue().encode("utf-8"), "text/csv; charset=utf-8"
+    cuerpo = json.dumps({"columnas": columnas, "filas": filas}, separators=(",", ":"), ensure_ascii=False)
+    return cuerpo.encode("utf-8"), "application/json"
+
+
+def redondear(valor):
+    return None if valor is None else round(valor, 2)
+
+
+def leer_nodos(texto):
+    if not texto:
+        return None
+    try:
+        return sorted({int(nodo) for nodo in texto.split(",") if nodo.strip()})
+    except ValueError:
+        raise ErrorPeticion(f"nodos invalidos: {texto!r}")
+
+
+def leer_marca(texto, nombre):
+    try:
+        marca = datetime.datetime.fromisoformat(texto)
+    except ValueError:
+        marca = None
+    # Con menos de 4 cifras strftime no rellena el ano y la marca deja de ser ISO.
+    if marca is None or marca.year < 1000:
+        raise ErrorPeticion(f"{nombre} debe ser 'YYYY-MM-DD' o 'YYYY-MM-DD HH:MM:SS': {texto!r}")
+    return formatear_marca(marca)
+
+
+class ServicioDatos:
+    # Lo que hay detras de cada ruta, sin HTTP. Cada metodo devuelve (columnas, filas); las
+    # filas se serializan una vez y se guardan en la cache ya como bytes.
+    def __init__(self, db_file=DB_FILE, ttl=TTL):
+        preparar_bd(db_file)
+        self.db_file = db_file
+        self.cache = CacheRespuestas(db_file, ttl)
+        self.ultimas = UltimasLecturas(db_file)
+        self.rutas = {"/ultimas": self.ultimas_lecturas, "/series": self.series, "/resumen": self.resumen}
+        metricas.contador("invernadero_api_aciertos_total", "Respuestas servidas desde la cache",
+                          funcion=lambda: self.cache.aciertos)
+        metricas.contador("invernadero_api_consultas_total", "Respuestas que hubo que calcular",
+                          funcion=lambda: self.cache.fallos)
+
+    def responder(self, ruta, consulta):
+        # -> Respuesta. Lanza KeyError si la ruta no existe y ErrorPeticion si los parametros no valen.
+        funcion = self.rutas[ruta]
+        parametros = {clave: valores[-1] for clave, valores in parse_qs(consulta).items()}
+        formato = parametros.pop("formato", "json")
+        if formato not in ("json", "csv"):
+            raise ErrorPeticion(f"formato desconocido: {formato!r}")
+        argumentos = self.argumentos(ruta, parametros)
+        clave = (ruta, formato, tuple(sorted(argumentos.items())))
+        return self.cache.obtener(clave, lambda: serializar(*funcion(**argumentos), formato))
+
+    def argumentos(self, ruta, parametros):
+        # Se normalizan antes de formar la clave, para que ?nodos=2,1 y ?nodos=1,2 compartan entrada.
+        argumentos = {}
+        if ruta == "/ultimas":
+            return argumentos
+        if "desde" in parametros or "hasta" in parametros:
+            if "desde" not in parametros or "hasta" not in parametros:
+                raise ErrorPeticion("desde y hasta van juntos")
+            argumentos["desde"] = leer_marca(parametros["desde"], "desde")
+            argumentos["hasta"] = leer_marca(parametros["hasta"], "hasta")
+            if argumentos["desde"] > argumentos["hasta"]:
+                raise ErrorPeticion("desde no puede ser posterior a hasta")
+        else:
+            # Se resuelve al calcular la respuesta, para que un acierto de cache no consulte nada.
+            argumentos["desde"] = argumentos["hasta"] = None
+        nodos = leer_nodos(parametros.get("nodos"))
+        argumentos["nodos"] = tuple(nodos) if nodos is not None else None
+        if ruta == "/series":
+            try:
+                argumentos["bucket"] = int(parametros.get("bucket", 1))
+            except ValueError:
+                argumentos["bucket"] = 0
+            if argumentos["bucket"] < 1:
+                raise ErrorPeticion(f"bucket debe ser un numero de minutos mayor que 0: {parametros['bucket']!r}")
+        return argumentos
+
+    def ultimas_lecturas(self):
+        lecturas, alertas = self.ultimas.obtener_con_alertas()
+        filas = [[nodo, marca, redondear(temperatura), redondear(humedad),
+                  [mensaje for _, _, mensaje in alertas.get(nodo, ())]]
+                 for nodo, (marca, temperatura, humedad) in sorted(lecturas.items())]
+        return COLUMNAS_ULTIMAS, filas
+
+    def rango(self, desde, hasta):
+        if desde is None:
+            # Por defecto, el ultimo dia con datos, como la interfaz.
+            dia = ultimo_dia_con_datos(db_file=self.db_file) or datetime.date.today()
+            return f"{dia} 00:00:00", f"{dia + datetime.timedelta(days=1)} 00:00:00"
+        return desde, hasta
+
+    def series(self, desde=None, hasta=None, nodos=None, bucket=1):
+        desde, hasta = self.rango(desde, hasta)
+        cubetas = (a_segundos(hasta) - a_segundos(desde)) // (bucket * 60)
+        if cubetas > MAX_CUBETAS:
+            raise ErrorPeticion(f"{cubetas} cubetas por nodo; el maximo es {MAX_CUBETAS}, usa un bucket mayor")
+        filas = []
+        for nodo, serie in sorted(consultar_series(desde, hasta, bucket, nodos, self.db_file).items()):
+            for marca, *valores, muestras in zip(*serie):
+                filas.append([nodo, marca.strftime("%Y-%m-%d %H:%M:%S"), *map(redondear, valores), muestras])
+        return COLUMNAS_SERIES, filas
+
+    def resumen(self, desde=None, hasta=None, nodos=None):
+        parametros = parametros_rango(*self.rango(desde, hasta))
+        segundos = (parametros["ts_desde"], parametros["ts_hasta"])
+        minutos = max(m for m in NIVELES if m == min(NIVELES) or all(s % (m * 60) == 0 for s in segundos))
+        sql = SQL_RESUMEN.format(tabla=NIVELES[minutos], filtro_nodos=filtro_por_nodos(parametros, nodos))
+        conn = sqlite3.connect(self.db_file)
+        try:
+            filas = [[nodo, muestras, *map(redondear, valores), ultima]
+                     for nodo, muestras, *valores, ultima in conn.execute(sql, parametros)]
+        finally:
+            conn.close()
+        return COLUMNAS_RESUMEN, filas
+
+    def cerrar(self):
+        self.cache.cerrar()
+        self.ultimas.cerrar()
+
+
+class ManejadorHTTP(BaseHTTPRequestHandler):
+    # self.server.servicio es el ServicioDatos.
+    protocol_version = "HTTP/1.1"
+    verboso = False
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        if url.path == "/metricas":
+            # Sin cache ni ETag: cambia en cada peticion.
+            return self.enviar(200, metricas.texto_prometheus().encode("utf-8"), "text/plain; version=0.0.4")
+        try:
+            respuesta = self.server.servicio.responder(url.path.rstrip("/") or "/", url.query)
+        except KeyError:
+            return self.enviar_error(404, f"ruta desconocida: {url.path}; hay {', '.join(self.server.servicio.rutas)}")
+        except ErrorPeticion as e:
+            return self.enviar_error(400, str(e))
+        except Exception as e:
+            # Un fallo inesperado se registra y el cliente recibe un 500, no una conexion cortada.
+            print(f"Error atendiendo {self.path}:", e)
+            traceback.print_exc()
+            return self.enviar_error(500, f"error interno: {e}")
+
+        etiquetas = {etiqueta.strip() for etiqueta in self.headers.get("If-None-Match", "").split(",")}
+        if respuesta.etag in etiquetas or "*" in etiquetas:
+            self.send_response(304)
+            self.send_header("ETag", respuesta.etag)
+            self.end_headers()
+            return
+        # El cliente puede guardar la respuesta, pero tiene que revalidarla con If-None-Match.
+        self.enviar(200, respuesta.cuerpo, respuesta.tipo, {"ETag": respuesta.etag, "Cache-Control": "no-cache"})
+
+    def enviar(self, estado, cuerpo, tipo, cabeceras=None):
+        self.send_response(estado)
+        self.send_header("Content-Type", tipo)
+        self.send_header("Content-Length", str(len(cuerpo)))
+        for nombre, valor in (cabeceras or {}).items():
+            self.send_header(nombre, valor)
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+    def enviar_error(self, estado, mensaje):
+        self.enviar(estado, json.dumps({"error": mensaje}, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def log_message(self, formato, *args):
+        if self.verboso:
+            super().log_message(formato, *args)
+
+
+def crear_servidor(servicio, host="127.0.0.1", puerto=PUERTO):
+    # Con puerto=0 lo elige el sistema: servidor.server_address[1].
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorHTTP)
+    servidor.daemon_threads = True
+    servidor.servicio = servicio
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="API HTTP de solo lectura con las lecturas de los sensores.")
+    parser.add_argument("--db", default=DB_FILE)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    parser.add_argument("--ttl", type=float, default=TTL, help="segundos entre consultas de data_version")
+    parser.add_argument("--verboso", action="store_true", help="registrar cada peticion")
+    metricas.agregar_argumentos(parser)
+    args = parser.parse_args()
+
+    ManejadorHTTP.verboso = args.verboso
+    servicio = ServicioDatos(args.db, args.ttl)
+    servidor = crear_servidor(servicio, args.host, args.puerto)
+    print(f"API escuchando en http://{args.host}:{servidor.server_address[1]} "
+          f"(rutas: {', '.join(servicio.rutas)}, /metricas; ?formato=csv para CSV)")
+    try:
+        with metricas.sesion(args):
+            servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        servidor.server_close()
+        cache = servicio.cache
+        print(f"Cache: {cache.aciertos} aciertos, {cache.fallos} consultas")
+        servicio.cerrar()
+
+
+if __name__ == "__main__":
+    main()
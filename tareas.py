@@ -0,0 +1,102 @@
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import metricas
+
+
+class Tarea:
+    def __init__(self, clave, grupo, al_terminar, al_fallar):
+        self.clave = clave
+        self.grupo = grupo
+        self.al_terminar = al_terminar
+        self.al_fallar = al_fallar
+        self.cancelada = False
+        self.futuro = None
+        self.enviada = time.perf_counter()
+
+    def cancelar(self):
+        self.cancelada = True
+        if self.futuro is not None:
+            self.futuro.cancel()
+
+
+class PlanificadorTareas:
+    # Consultas, lectura de imagenes y exportaciones se ejecutan en un pool de hilos.
+    # Los resultados vuelven al hilo de Tk por una cola que se vacia con after(), con un
+    # presupuesto de tiempo por pasada para no bloquear el bucle principal.
+    # Una tarea nueva con la misma clave deja obsoleta a la anterior: su resultado se descarta.
+    def __init__(self, root, hilos=2, periodo_ms=10, presupuesto_ms=8):
+        self.root = root
+        self.periodo_ms = periodo_ms
+        self.presupuesto = presupuesto_ms / 1000
+        self.pool = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="tareas",
+                                       initializer=metricas.perfilar_hilo)
+        self.resultados = queue.SimpleQueue()
+        self.activas = {}
+        self.completadas = 0
+        self.descartadas = 0
+        self.id_after = self.root.after(self.periodo_ms, self._drenar)
+
+    def enviar(self, clave, funcion, *args, al_terminar=None, al_fallar=None, grupo=None):
+        anterior = self.activas.get(clave)
+        if anterior is not None:
+            anterior.cancelar()
+        tarea = Tarea(clave, grupo, al_terminar, al_fallar)
+        self.activas[clave] = tarea
+        tarea.futuro = self.pool.submit(self._ejecutar, tarea, funcion, args)
+        return tarea
+
+    def ocupado(self, clave):
+        return clave in self.activas
+
+    def cancelar(self, clave):
+        tarea = self.activas.pop(clave, None)
+        if tarea is not None:
+            tarea.cancelar()
+
+    def cancelar_grupo(self, grupo):
+        for clave, tarea in list(self.activas.items()):
+            if tarea.grupo == grupo:
+                tarea.cancelar()
+                del self.activas[clave]
+
+    def _ejecutar(self, tarea, funcion, args):
+        # Hilo de trabajo: nunca toca widgets ni artistas de matplotlib.
+        if tarea.cancelada:
+            return
+        try:
+            self.resultados.put((tarea, funcion(*args), None))
+        except Exception as e:
+            self.resultados.put((tarea, None, e))
+
+    def _drenar(self):
+        limite = time.perf_counter() + self.presupuesto
+        while time.perf_counter() < limite:
+            try:
+                tarea, resultado, error = self.resultados.get_nowait()
+            except queue.Empty:
+                break
+            if tarea.cancelada or self.activas.get(tarea.clave) is not tarea:
+                self.descartadas += 1
+                continue
+            del self.activas[tarea.clave]
+            self.completadas += 1
+            try:
+                if error is None:
+                    if tarea.al_terminar:
+                        tarea.al_terminar(resultado)
+                elif tarea.al_fallar:
+                    tarea.al_fallar(error)
+                else:
+                    print(f"Error en la tarea {tarea.clave}:", error)
+            except Exception as e:
+                print(f"Error al aplicar el resultado de {tarea.clave}:", e)
+        self.id_after = self.root.after(self.periodo_ms, self._drenar)
+
+    def cerrar(self):
+        self.root.after_cancel(self.id_after)
+        for tarea in self.activas.values():
+            tarea.cancelar()
+        self.activas = {}
+        self.pool.shutdown(wait=False, cancel_futures=True)
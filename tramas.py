@@ -0,0 +1,98 @@
+import re
+import struct
+from collections import namedtuple
+
+# Mismo layout que DataPacket en Modulo_secundario.ino (#pragma pack(1), little endian).
+FORMATO_BINARIO = struct.Struct('<Bff?')
+TAMANO_BINARIO = FORMATO_BINARIO.size
+
+# Version 2: anade un numero de secuencia por nodo, un byte de version y un byte de arranque,
+# aleatorio en cada reinicio del nodo. La radio rellena con ceros hasta 32 bytes, asi que en una
+# trama v1 el byte de version siempre vale 0, y arranque 0 es un firmware que no lo envia.
+FORMATO_V2 = struct.Struct('<Bff?HBB')
+TAMANO_V2 = FORMATO_V2.size
+POSICION_VERSION = 12
+VERSION_V2 = 2
+# El mismo layout saltando el byte de version (x): unpack_from da ya los campos de Trama, en orden.
+CAMPOS_V2 = struct.Struct('<Bff?HxB')
+
+PREFIJO_TEXTO = b"NODO "
+PATRON_TEXTO = re.compile(rb"NODO (\d+)\s+T:\s*([\d.]+)\s*C\s+H:\s*([\d.]+)%")
+
+TEMP_MIN, TEMP_MAX = -40.0, 125.0
+HUM_MIN, HUM_MAX = 0.0, 100.0
+
+# Los float32 se entregan sin redondear; el redondeo se hace una vez por intervalo al guardar.
+# secuencia y arranque son None en las tramas v1 y en las de texto.
+Trama = namedtuple("Trama", ["nodo", "temperatura", "humedad", "antena", "secuencia", "arranque"],
+                   defaults=(None, None))
+_crear_trama = Trama._make
+_desempaquetar_v2 = CAMPOS_V2.unpack_from
+SIN_SECUENCIA = (None, None)
+
+
+def trama_valida(temperatura, humedad):
+    # Las comparaciones tambien descartan NaN e infinitos.
+    return TEMP_MIN <= temperatura <= TEMP_MAX and HUM_MIN <= humedad <= HUM_MAX
+
+
+def es_v2(payload, offset=0):
+    return len(payload) - offset >= TAMANO_V2 and payload[offset + POSICION_VERSION] == VERSION_V2
+
+
+def decodificar_binario(payload, offset=0):
+    if es_v2(payload, offset):
+        valores = CAMPOS_V2.unpack_from(payload, offset)
+    else:
+        valores = FORMATO_BINARIO.unpack_from(payload, offset) + SIN_SECUENCIA
+    if not trama_valida(valores[1], valores[2]):
+        return None
+    return _crear_trama(valores)
+
+
+def decodificar_texto(payload):
+    match = PATRON_TEXTO.search(payload)
+    if not match:
+        return None
+    return Trama(int(match.group(1)), float(match.group(2)), float(match.group(3)), True)
+
+
+def decodificar_lote(buffer):
+    # Desempaqueta tramas v1 contiguas (bytes, bytearray o memoryview) sin copiar.
+    vista = memoryview(buffer)
+    completas = len(vista) - len(vista) % TAMANO_BINARIO
+    return [_crear_trama(valores + SIN_SECUENCIA) for valores in FORMATO_BINARIO.iter_unpack(vista[:completas])
+            if TEMP_MIN <= valores[1] <= TEMP_MAX and HUM_MIN <= valores[2] <= HUM_MAX]
+
+
+class DecodificadorTramas:
+    # El texto "NODO n T: .. C H: ..%" solo se intenta para nodos con firmware antiguo.
+    def __init__(self):
+        self.contadores = {"binario": 0, "v2": 0, "texto": 0, "invalido": 0}
+
+    def __call__(self, payload):
+        # Primero el caso comun, la trama v2 de 32 bytes: un texto nunca lleva un 2 en POSICION_VERSION.
+        if len(payload) >= TAMANO_V2 and payload[POSICION_VERSION] == VERSION_V2:
+            valores = _desempaquetar_v2(payload)
+            formato = "v2"
+        # Solo se compara el prefijo completo si el primer byte es "N" (id 78 en binario).
+        elif len(payload) >= TAMANO_BINARIO and (payload[0] != 78 or payload[:5] != PREFIJO_TEXTO):
+            valores = FORMATO_BINARIO.unpack_from(payload) + SIN_SECUENCIA
+            formato = "binario"
+        else:
+            trama = decodificar_texto(bytes(payload))
+            self.contadores["invalido" if trama is None else "texto"] += 1
+            return trama
+
+        if TEMP_MIN <= valores[1] <= TEMP_MAX and HUM_MIN <= valores[2] <= HUM_MAX:
+            self.contadores[formato] += 1
+            return _crear_trama(valores)
+        self.contadores["invalido"] += 1
+        return None
+
+    def decodificar_lote(self, buffer):
+        tramas = decodificar_lote(buffer)
+        completas = len(buffer) // TAMANO_BINARIO
+        self.contadores["binario"] += len(tramas)
+        self.contadores["invalido"] += completas - len(tramas)
+        return tramas